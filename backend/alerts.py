@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import (
+    Boolean, Column, Float, Integer, MetaData, String, Table, case, create_engine, select, update,
+)
+
+from shared_cache import create_tables
+
+logger = logging.getLogger(__name__)
+
+ALERT_STORE_URL = os.getenv(
+    "ALERT_STORE_URL",
+    "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "alerts.db"),
+)
+# 価格を確認する間隔 (秒、0 の場合は定期確認を行わない)
+ALERT_POLL_INTERVAL = float(os.getenv("ALERT_POLL_INTERVAL", "60"))
+
+CONDITIONS = ("above", "below")
+
+metadata = MetaData()
+
+alerts_table = Table(
+    "alerts", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("symbol", String, nullable=False, index=True),
+    Column("target_price", Float, nullable=False),
+    Column("condition", String, nullable=False),
+    Column("active", Boolean, nullable=False, default=True, index=True),
+    Column("created_at", Float, nullable=False),
+    Column("triggered_at", Float),
+    Column("triggered_price", Float),
+)
+
+
+class _SortedBook:
+    """閾値の昇順に並べた (閾値, アラートID) の一覧"""
+
+    __slots__ = ("targets", "ids")
+
+    def __init__(self):
+        self.targets = []
+        self.ids = []
+
+    def add(self, target: float, alert_id: int):
+        i = bisect_right(self.targets, target)
+        self.targets.insert(i, target)
+        self.ids.insert(i, alert_id)
+
+    def remove(self, target: float, alert_id: int) -> bool:
+        i = bisect_left(self.targets, target)
+        while i < len(self.targets) and self.targets[i] == target:
+            if self.ids[i] == alert_id:
+                del self.targets[i]
+                del self.ids[i]
+                return True
+            i += 1
+        return False
+
+    def upto(self, price: float) -> list:
+        """閾値が price 以下のもの"""
+        return self.ids[:bisect_right(self.targets, price)]
+
+    def from_(self, price: float) -> list:
+        """閾値が price 以上のもの"""
+        return self.ids[bisect_left(self.targets, price):]
+
+    def pop_upto(self, price: float) -> list:
+        """閾値が price 以下のものを取り出す"""
+        i = bisect_right(self.targets, price)
+        if i == 0:
+            return []
+        hit = self.ids[:i]
+        del self.targets[:i]
+        del self.ids[:i]
+        return hit
+
+    def pop_from(self, price: float) -> list:
+        """閾値が price 以上のものを取り出す"""
+        i = bisect_left(self.targets, price)
+        if i == len(self.targets):
+            return []
+        hit = self.ids[i:]
+        del self.targets[i:]
+        del self.ids[i:]
+        return hit
+
+    def __len__(self):
+        return len(self.targets)
+
+
+class AlertBook:
+    """銘柄ごとに「上抜け」「下抜け」の板を持ち、価格が跨いだアラートだけを取り出す"""
+
+    def __init__(self):
+        self._above = {}
+        self._below = {}
+
+    def add(self, alert_id: int, symbol: str, target_price: float, condition: str):
+        books = self._above if condition == "above" else self._below
+        books.setdefault(symbol, _SortedBook()).add(target_price, alert_id)
+
+    def remove(self, alert_id: int, symbol: str, target_price: float, condition: str) -> bool:
+        books = self._above if condition == "above" else self._below
+        book = books.get(symbol)
+        return book is not None and book.remove(target_price, alert_id)
+
+    def evaluate(self, symbol: str, price: float) -> list:
+        """価格の更新で発火したアラートIDを返す (発火したものは板から取り除かれる)"""
+        triggered = []
+        above = self._above.get(symbol)
+        if above:
+            triggered.extend(above.pop_upto(price))
+        below = self._below.get(symbol)
+        if below:
+            triggered.extend(below.pop_from(price))
+        return triggered
+
+    def triggered(self, symbol: str, price: float) -> list:
+        """evaluate と同じアラートIDを板から取り除かずに返す"""
+        triggered = []
+        above = self._above.get(symbol)
+        if above:
+            triggered.extend(above.upto(price))
+        below = self._below.get(symbol)
+        if below:
+            triggered.extend(below.from_(price))
+        return triggered
+
+    def symbols(self) -> list:
+        return [s for s in set(self._above) | set(self._below)
+                if len(self._above.get(s, ())) or len(self._below.get(s, ()))]
+
+    def __len__(self):
+        return sum(len(b) for b in self._above.values()) + sum(len(b) for b in self._below.values())
+
+
+def _row_to_dict(row) -> dict:
+    return {
+        "id": row.id,
+        "symbol": row.symbol,
+        "target_price": row.target_price,
+        "condition": row.condition,
+        "active": row.active,
+        "created_at": row.created_at,
+        "triggered_at": row.triggered_at,
+        "triggered_price": row.triggered_price,
+    }
+
+
+class AlertEngine:
+    """アラートを永続化し、価格の更新に対して索引付きの板で評価する"""
+
+    def __init__(self, url: str = ALERT_STORE_URL):
+        if url.startswith("sqlite:///"):
+            path = url[len("sqlite:///"):]
+            if path and path != ":memory:":
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.engine = create_engine(url)
+        create_tables(self.engine, metadata)
+        self.book = AlertBook()
+        self._lock = threading.Lock()
+        self._details = {}  # id -> (symbol, target_price, condition)
+        self.refresh()
+
+    def refresh(self):
+        """ストアの有効なアラートから板を作り直す (他のワーカーが追加・削除した分を反映する)"""
+        book, details = AlertBook(), {}
+        with self.engine.connect() as conn:
+            for row in conn.execute(select(alerts_table).where(alerts_table.c.active.is_(True))):
+                book.add(row.id, row.symbol, row.target_price, row.condition)
+                details[row.id] = (row.symbol, row.target_price, row.condition)
+        with self._lock:
+            self.book, self._details = book, details
+
+    def _index(self, alert_id: int, symbol: str, target_price: float, condition: str):
+        self.book.add(alert_id, symbol, target_price, condition)
+        self._details[alert_id] = (symbol, target_price, condition)
+
+    def create(self, symbol: str, target_price: float, condition: str) -> dict:
+        if condition not in CONDITIONS:
+            raise ValueError(f"condition は {CONDITIONS} のいずれかを指定してください")
+        with self.engine.begin() as conn:
+            alert_id = conn.execute(alerts_table.insert().values(
+                symbol=symbol, target_price=target_price, condition=condition,
+                active=True, created_at=time.time(),
+            )).inserted_primary_key[0]
+            row = conn.execute(select(alerts_table).where(alerts_table.c.id == alert_id)).first()
+        with self._lock:
+            self._index(alert_id, symbol, target_price, condition)
+        return _row_to_dict(row)
+
+    def delete(self, alert_id: int) -> bool:
+        with self._lock:
+            details = self._details.pop(alert_id, None)
+            if details is not None:
+                self.book.remove(alert_id, *details)
+        with self.engine.begin() as conn:
+            deleted = conn.execute(alerts_table.delete().where(alerts_table.c.id == alert_id)).rowcount
+        return bool(deleted)
+
+    def list(self, active: bool = None, symbol: str = None) -> list:
+        query = select(alerts_table).order_by(alerts_table.c.id)
+        if active is not None:
+            query = query.where(alerts_table.c.active.is_(active))
+        if symbol is not None:
+            query = query.where(alerts_table.c.symbol == symbol)
+        with self.engine.connect() as conn:
+            return [_row_to_dict(row) for row in conn.execute(query)]
+
+    def symbols(self) -> list:
+        """有効なアラートがある銘柄"""
+        with self._lock:
+            return self.book.symbols()
+
+    def evaluate(self, quotes: dict) -> list:
+        """{銘柄: 価格} を評価し、発火したアラートを記録して返す"""
+        now = time.time()
+        fired = []
+        with self._lock:
+            for symbol, price in quotes.items():
+                for alert_id in self.book.triggered(symbol, price):
+                    fired.append((alert_id, self._details[alert_id], price))
+        if not fired:
+            return []
+        # 発火したアラートは1回の UPDATE でまとめて記録する。他のワーカーが先に発火させた
+        # (既に有効でない) アラートは更新されないので、実際に更新した行だけを返す
+        with self.engine.begin() as conn:
+            updated = set(conn.execute(
+                update(alerts_table)
+                .where(alerts_table.c.id.in_([alert_id for alert_id, _, _ in fired]),
+                       alerts_table.c.active.is_(True))
+                .values(active=False, triggered_at=now, triggered_price=case(
+                    {alert_id: price for alert_id, _, price in fired}, value=alerts_table.c.id,
+                ))
+                .returning(alerts_table.c.id)
+            ).scalars())
+        # 板から取り除くのは書き込みが確定した後だけ (失敗した場合はストアで有効なままなので残す)。
+        # 更新されなかった行もストアでは既に有効でないため、あわせて取り除く
+        with self._lock:
+            for alert_id, _, _ in fired:
+                details = self._details.pop(alert_id, None)
+                if details is not None:
+                    self.book.remove(alert_id, *details)
+        return [
+            {
+                "id": alert_id, "symbol": symbol, "target_price": target, "condition": condition,
+                "triggered_price": price, "triggered_at": now,
+            }
+            for alert_id, (symbol, target, condition), price in fired
+            if alert_id in updated
+        ]
+
+    def __len__(self):
+        return len(self._details)
+
+
+async def poll_alerts(engine: AlertEngine, fetch_quotes, run_io, interval: float = ALERT_POLL_INTERVAL,
+                      refresh: bool = False):
+    """有効なアラートのある銘柄の価格を1回の一括取得で確認し続ける
+
+    refresh=True の場合は毎回ストアから板を作り直す (複数ワーカーで1つのワーカーだけが確認する場合)。
+    """
+    while True:
+        try:
+            if refresh:
+                await run_io(engine.refresh)
+            symbols = engine.symbols()
+            if symbols:
+                quotes = await run_io(fetch_quotes, symbols)
+                triggered = await run_io(engine.evaluate, quotes)
+                for alert in triggered:
+                    logger.info("alert %s triggered: %s %s %s at %s", alert["id"], alert["symbol"],
+                                alert["condition"], alert["target_price"], alert["triggered_price"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("alert polling failed: %s", e)
+        await asyncio.sleep(interval)
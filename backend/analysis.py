@@ -0,0 +1,204 @@
+# エンドポイントから切り出したCPU処理 (プロセスプールで実行できるよう純粋関数として定義)
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import indicators
+import prediction_models
+import sentiment
+
+
+def _value_or_none(value):
+    return float(value) if not pd.isna(value) else None
+
+
+def build_stock_info(symbol: str, info: dict) -> dict:
+    """yfinance の info から基本情報のレスポンスを作成"""
+    return {
+        "symbol": symbol,
+        "name": info.get("longName", "N/A"),
+        "current_price": info.get("currentPrice", info.get("regularMarketPrice", 0)),
+        "previous_close": info.get("previousClose", 0),
+        "open": info.get("open", 0),
+        "day_high": info.get("dayHigh", 0),
+        "day_low": info.get("dayLow", 0),
+        "volume": info.get("volume", 0),
+        "market_cap": info.get("marketCap", 0),
+        "pe_ratio": info.get("trailingPE", 0),
+        "dividend_yield": info.get("dividendYield", 0),
+        "52week_high": info.get("fiftyTwoWeekHigh", 0),
+        "52week_low": info.get("fiftyTwoWeekLow", 0),
+    }
+
+
+def compute_technical_analysis(symbol: str, df: pd.DataFrame) -> dict:
+    """テクニカル指標とシグナルを計算"""
+    values = indicators.compute_indicators(df['High'], df['Low'], df['Close'])
+    latest = {name: series[-1] for name, series in values.items()}
+    previous = {name: series[-2] for name, series in values.items()}
+    return build_technical_result(symbol, latest, previous)
+
+
+def build_technical_result(symbol: str, latest, previous) -> dict:
+    """最新バーと1本前の指標値からトレンドとシグナルを判定"""
+    # トレンド判定
+    trend = "中立"
+    if latest['SMA_20'] > latest['SMA_50']:
+        trend = "上昇トレンド"
+    elif latest['SMA_20'] < latest['SMA_50']:
+        trend = "下降トレンド"
+
+    # シグナル判定
+    signals = []
+
+    # RSIシグナル
+    if latest['RSI'] < 30:
+        signals.append({"type": "買いシグナル", "indicator": "RSI", "value": float(latest['RSI']), "reason": "売られすぎ"})
+    elif latest['RSI'] > 70:
+        signals.append({"type": "売りシグナル", "indicator": "RSI", "value": float(latest['RSI']), "reason": "買われすぎ"})
+
+    # MACDシグナル
+    if latest['MACD'] > latest['MACD_signal'] and previous['MACD'] <= previous['MACD_signal']:
+        signals.append({"type": "買いシグナル", "indicator": "MACD", "value": float(latest['MACD']), "reason": "ゴールデンクロス"})
+    elif latest['MACD'] < latest['MACD_signal'] and previous['MACD'] >= previous['MACD_signal']:
+        signals.append({"type": "売りシグナル", "indicator": "MACD", "value": float(latest['MACD']), "reason": "デッドクロス"})
+
+    # ボリンジャーバンドシグナル
+    if latest['Close'] < latest['BB_lower']:
+        signals.append({"type": "買いシグナル", "indicator": "ボリンジャーバンド", "value": float(latest['Close']), "reason": "下限突破"})
+    elif latest['Close'] > latest['BB_upper']:
+        signals.append({"type": "売りシグナル", "indicator": "ボリンジャーバンド", "value": float(latest['Close']), "reason": "上限突破"})
+
+    return {
+        "symbol": symbol,
+        "trend": trend,
+        "indicators": {
+            "SMA_20": _value_or_none(latest['SMA_20']),
+            "SMA_50": _value_or_none(latest['SMA_50']),
+            "EMA_12": _value_or_none(latest['EMA_12']),
+            "EMA_26": _value_or_none(latest['EMA_26']),
+            "RSI": _value_or_none(latest['RSI']),
+            "MACD": _value_or_none(latest['MACD']),
+            "MACD_signal": _value_or_none(latest['MACD_signal']),
+            "BB_upper": _value_or_none(latest['BB_upper']),
+            "BB_middle": _value_or_none(latest['BB_middle']),
+            "BB_lower": _value_or_none(latest['BB_lower']),
+            "Stoch_K": _value_or_none(latest['Stoch_K']),
+            "Stoch_D": _value_or_none(latest['Stoch_D']),
+        },
+        "signals": signals,
+        "current_price": float(latest['Close']),
+        "updated_at": datetime.now().isoformat()
+    }
+
+
+def build_panel(frames: dict, column: str) -> np.ndarray:
+    """銘柄ごとの系列を末尾揃えで (銘柄 × 時点) のパネルにまとめる"""
+    length = max(len(df) for df in frames.values())
+    panel = np.full((len(frames), length), np.nan)
+    for i, df in enumerate(frames.values()):
+        values = df[column].to_numpy(dtype=float)
+        panel[i, length - len(values):] = values
+    return panel
+
+
+def compute_panel_technical(frames: dict) -> list:
+    """複数銘柄のテクニカル指標をパネル全体に対して一括で計算"""
+    frames = {symbol: df for symbol, df in frames.items() if len(df) >= 2}
+    if not frames:
+        return []
+    values = indicators.compute_indicators(
+        build_panel(frames, 'High'), build_panel(frames, 'Low'), build_panel(frames, 'Close')
+    )
+    return [
+        build_technical_result(
+            symbol,
+            {name: panel[i, -1] for name, panel in values.items()},
+            {name: panel[i, -2] for name, panel in values.items()},
+        )
+        for i, symbol in enumerate(frames)
+    ]
+
+
+def compute_prediction(symbol: str, df: pd.DataFrame, period: str = None) -> dict:
+    """線形回帰による簡易的な価格予測
+
+    当てはめたモデルは (銘柄, 期間) ごとに最終バーの日付と共に保持し、同じ最終バーへの
+    リクエストでは推論だけを行う。新しいバーが来た場合は差分だけで当てはめ直す。
+    """
+    if len(df) < 30:
+        raise ValueError("Insufficient data for prediction")
+
+    state, features, _ = prediction_models.model_cache.get(symbol, period or "", df)
+
+    # 入力が同じなので5日分とも同じ予測値になる (1回だけ推論する)
+    future_predictions = [state.predict(features)] * 5
+
+    current_price = float(df['Close'].iloc[-1])
+    avg_prediction = np.mean(future_predictions)
+
+    # 推奨判定
+    price_change_pct = ((avg_prediction - current_price) / current_price) * 100
+
+    if price_change_pct > 2:
+        recommendation = "買い推奨"
+        confidence = min(abs(price_change_pct) * 10, 80)
+    elif price_change_pct < -2:
+        recommendation = "売り推奨"
+        confidence = min(abs(price_change_pct) * 10, 80)
+    else:
+        recommendation = "様子見"
+        confidence = 50
+
+    return {
+        "symbol": symbol,
+        "current_price": current_price,
+        "predicted_prices": future_predictions,
+        "average_prediction": float(avg_prediction),
+        "price_change_percent": float(price_change_pct),
+        "recommendation": recommendation,
+        "confidence": float(confidence),
+        "note": "※この予測は参考情報であり、投資判断は自己責任でお願いします",
+        "updated_at": datetime.now().isoformat()
+    }
+
+
+def score_news(symbol: str, news: list, pipeline=None) -> dict:
+    """ニュース見出しのセンチメントを分析 (スコアは見出しごとにキャッシュされる)"""
+    items = news[:10]  # 最新10件
+    scores = (pipeline or sentiment.get_pipeline()).score(items)
+    news_list = []
+    for item, sentiment_score in zip(items, scores):
+        title = item.get('title', '')
+        if sentiment_score > 0.1:
+            label = "ポジティブ"
+        elif sentiment_score < -0.1:
+            label = "ネガティブ"
+        else:
+            label = "中立"
+
+        news_list.append({
+            "title": title,
+            "publisher": item.get('publisher', 'Unknown'),
+            "link": item.get('link', ''),
+            "published_at": datetime.fromtimestamp(item.get('providerPublishTime', 0)).isoformat(),
+            "sentiment": label,
+            "sentiment_score": float(sentiment_score)
+        })
+
+    # 全体的なセンチメント
+    avg_sentiment = np.mean([n['sentiment_score'] for n in news_list]) if news_list else 0
+
+    overall_sentiment = "中立"
+    if avg_sentiment > 0.1:
+        overall_sentiment = "ポジティブ"
+    elif avg_sentiment < -0.1:
+        overall_sentiment = "ネガティブ"
+
+    return {
+        "symbol": symbol,
+        "news": news_list,
+        "overall_sentiment": overall_sentiment,
+        "average_sentiment_score": float(avg_sentiment)
+    }
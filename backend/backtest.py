@@ -0,0 +1,217 @@
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import indicators
+
+# calculate_trading_signals の売買ルールを全バー・全銘柄に対して配列演算で評価するバックテスト
+#
+# 入力は (銘柄 × 時点) の配列。バー t の終値で判定したポジションを t+1 のリターンに適用する
+# (先読みなし)。パラメータごとの評価は numpy が GIL を解放するためスレッドで並列化する。
+
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+
+DEFAULT_PARAMS = {
+    "rsi_lower": 30.0,
+    "rsi_upper": 70.0,
+    "entry_score": 2,  # この値以上で買い (calculate_trading_signals の「買い」)
+    "exit_score": -2,  # この値以下で手仕舞い (「売り」)
+    "allow_short": False,
+    "cost": 0.0,  # 売買1回あたりの取引コスト (比率)
+}
+
+
+def prepare_indicators(high, low, close) -> dict:
+    """バックテストで使う指標を一括計算 (パラメータスイープの間で共有する)"""
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    macd_line, signal_line, _ = indicators.macd(close)
+    bb_upper, _, bb_lower = indicators.bollinger(close)
+    return {
+        "Close": close,
+        "RSI": indicators.rsi(close),
+        "MACD": macd_line,
+        "MACD_Signal": signal_line,
+        "SMA_5": indicators.sma(close, 5),
+        "SMA_20": indicators.sma(close, 20),
+        "SMA_50": indicators.sma(close, 50),
+        "BB_Upper": bb_upper,
+        "BB_Lower": bb_lower,
+    }
+
+
+def _previous(x: np.ndarray) -> np.ndarray:
+    prev = np.empty_like(x)
+    prev[..., 0] = np.nan
+    prev[..., 1:] = x[..., :-1]
+    return prev
+
+
+def signal_scores(ind: dict, rsi_lower: float = 30.0, rsi_upper: float = 70.0) -> np.ndarray:
+    """全バーについて calculate_trading_signals の buy_score - sell_score を計算"""
+    rsi, macd, signal = ind["RSI"], ind["MACD"], ind["MACD_Signal"]
+    close, sma_5, sma_20, sma_50 = ind["Close"], ind["SMA_5"], ind["SMA_20"], ind["SMA_50"]
+    prev_macd, prev_signal = _previous(macd), _previous(signal)
+
+    score = np.zeros(close.shape, dtype=np.int8)
+    # RSI
+    score += 2 * (rsi < rsi_lower)
+    score -= 2 * ((rsi > rsi_upper) & ~(rsi < rsi_lower))
+    # MACD のクロス
+    golden = (macd > signal) & (prev_macd <= prev_signal)
+    dead = (macd < signal) & (prev_macd >= prev_signal)
+    score += 3 * golden
+    score -= 3 * (dead & ~golden)
+    # 移動平均の並び
+    up = (sma_5 > sma_20) & (sma_20 > sma_50)
+    down = (sma_5 < sma_20) & (sma_20 < sma_50)
+    score += 2 * up
+    score -= 2 * (down & ~up)
+    # ボリンジャーバンド
+    below = close < ind["BB_Lower"]
+    above = close > ind["BB_Upper"]
+    score += 2 * below
+    score -= 2 * (above & ~below)
+    return score
+
+
+def _forward_fill(x: np.ndarray, fill: float = 0.0) -> np.ndarray:
+    """時間軸方向に NaN を直前の値で埋める (ループなし)"""
+    t = np.arange(x.shape[-1])
+    idx = np.where(np.isnan(x), 0, t)
+    np.maximum.accumulate(idx, axis=-1, out=idx)
+    out = np.take_along_axis(x, idx, axis=-1)
+    return np.where(np.isnan(out), fill, out)
+
+
+def positions(score: np.ndarray, entry_score: int = 2, exit_score: int = -2, allow_short: bool = False) -> np.ndarray:
+    """スコアからポジション (1: 買い, 0: ノーポジション, -1: 売り) を求める"""
+    change = np.full(score.shape, np.nan)
+    change[score <= exit_score] = -1.0 if allow_short else 0.0
+    change[score >= entry_score] = 1.0
+    return _forward_fill(change)
+
+
+def _growth(returns: np.ndarray):
+    """バーごとのリターンの累積 (対数リターンの累積, 全損したバー数の累積)
+
+    リターンは -1 (全損) で打ち止めにする。空売りで 100% 以上損をしても log1p が NaN にならず、
+    全損したバーは対数の代わりに回数で数える (-inf の引き算を避けるため)。
+    """
+    lost = returns <= -1.0
+    log_growth = np.cumsum(np.log1p(np.where(lost, 0.0, returns)), axis=1)
+    return log_growth, np.cumsum(lost, axis=1)
+
+
+def _trade_returns(pos: np.ndarray, gross: np.ndarray, cost: float = 0.0):
+    """ポジションの保有区間ごとの損益 (銘柄番号, 損益) を返す
+
+    損益には建てたときと手仕舞ったときの取引コストを含める (最終バーで保有中の取引は
+    手仕舞っていないので、建てたときのコストだけ)。
+    """
+    prev = _previous(pos)
+    prev[..., 0] = 0.0
+    # ポジションが変わったバーで直前の取引が終わり、新しい取引が始まる
+    change = pos != prev
+    n_symbols, n_bars = pos.shape
+    starts_r, starts_t = np.nonzero(change & (pos != 0))
+    ends_r, ends_t = np.nonzero(change & (prev != 0))
+    closed = np.ones(len(ends_r), dtype=bool)
+    # 最終バーで保有中の取引は最終バーまでの値で評価する
+    open_rows = np.nonzero(pos[:, -1] != 0)[0]
+    ends_r = np.concatenate([ends_r, open_rows])
+    ends_t = np.concatenate([ends_t, np.full(len(open_rows), n_bars - 1)])
+    closed = np.concatenate([closed, np.zeros(len(open_rows), dtype=bool)])
+    order = np.lexsort((ends_t, ends_r))
+    ends_t, closed = ends_t[order], closed[order]
+
+    # t で建てたポジションは t+1 から手仕舞うバーまでのリターンを受ける
+    log_growth, lost = (np.pad(x, ((0, 0), (1, 0))) for x in _growth(gross))
+    held_log = log_growth[starts_r, ends_t + 1] - log_growth[starts_r, starts_t + 1]
+    wiped = lost[starts_r, ends_t + 1] > lost[starts_r, starts_t + 1]
+    growth = np.where(wiped, 0.0, np.exp(held_log))
+    trade_cost = cost * np.abs(pos[starts_r, starts_t])
+    return starts_r, (1.0 - trade_cost) * growth * (1.0 - trade_cost * closed) - 1.0
+
+
+def run_backtest(ind: dict, rsi_lower: float = 30.0, rsi_upper: float = 70.0, entry_score: int = 2,
+                 exit_score: int = -2, allow_short: bool = False, cost: float = 0.0) -> dict:
+    """1組のパラメータで全銘柄を評価し、損益・勝率・最大ドローダウンを返す"""
+    close = ind["Close"]
+    score = signal_scores(ind, rsi_lower, rsi_upper)
+    pos = positions(score, entry_score, exit_score, allow_short)
+
+    returns = np.zeros_like(close)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns[:, 1:] = close[:, 1:] / close[:, :-1] - 1.0
+    returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+
+    held = _previous(pos)
+    held[:, 0] = 0.0
+    turnover = np.abs(pos - held)
+    gross = held * returns
+    log_equity, lost = _growth(gross - cost * turnover)
+    equity = np.where(lost > 0, 0.0, np.exp(log_equity))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drawdown = equity / np.maximum.accumulate(equity, axis=1) - 1.0
+
+    trade_rows, trade_pnl = _trade_returns(pos, gross, cost)
+    n_symbols = close.shape[0]
+    trades = np.bincount(trade_rows, minlength=n_symbols)
+    wins = np.bincount(trade_rows, weights=trade_pnl > 0, minlength=n_symbols)
+
+    with np.errstate(invalid="ignore"):
+        hit_rate = np.where(trades > 0, wins / np.maximum(trades, 1), np.nan)
+    return {
+        "total_return": equity[:, -1] - 1.0,
+        "max_drawdown": drawdown.min(axis=1),
+        "trades": trades,
+        "hit_rate": hit_rate,
+        "exposure": (held != 0).mean(axis=1),
+    }
+
+
+def parameter_grid(**space) -> list:
+    """各パラメータの候補リストから全組み合わせを作る"""
+    params = {**{k: [v] for k, v in DEFAULT_PARAMS.items()}, **space}
+    keys = list(params)
+    return [dict(zip(keys, values)) for values in itertools.product(*(params[k] for k in keys))]
+
+
+def sweep(ind: dict, grid: list, workers: int = BACKTEST_WORKERS) -> list:
+    """パラメータの組み合わせを並列に評価"""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(lambda params: run_backtest(ind, **params), grid))
+    return [{"params": params, **result} for params, result in zip(grid, results)]
+
+
+def summarize(symbols: list, result: dict) -> dict:
+    """JSON で返せる形に変換 (銘柄ごとの値と全体の集計)"""
+    def clean(x):
+        return None if np.isnan(x) else float(x)
+
+    total_trades = int(result["trades"].sum())
+    trade_weighted_hit = (
+        float(np.nansum(result["hit_rate"] * result["trades"]) / total_trades) if total_trades else None
+    )
+    return {
+        "params": result.get("params"),
+        "summary": {
+            "mean_return": clean(np.nanmean(result["total_return"])),
+            "median_return": clean(np.nanmedian(result["total_return"])),
+            "worst_drawdown": clean(np.nanmin(result["max_drawdown"])),
+            "hit_rate": trade_weighted_hit,
+            "trades": total_trades,
+        },
+        "symbols": {
+            symbol: {
+                "total_return": clean(result["total_return"][i]),
+                "max_drawdown": clean(result["max_drawdown"][i]),
+                "trades": int(result["trades"][i]),
+                "hit_rate": clean(result["hit_rate"][i]),
+                "exposure": clean(result["exposure"][i]),
+            }
+            for i, symbol in enumerate(symbols)
+        },
+    }
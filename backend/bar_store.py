@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import (
+    Column, Float, Integer, MetaData, String, Table, create_engine, select,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from providers import SingleFlight
+from shared_cache import create_tables
+
+BAR_STORE_URL = os.getenv(
+    "BAR_STORE_URL",
+    "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bars.db"),
+)
+# 末尾の再取得を行うまでの間隔 (秒)
+BAR_STORE_REFRESH = float(os.getenv("BAR_STORE_REFRESH", "60"))
+
+# 取得済み期間の比較に使う期間の長さ順
+_PERIOD_RANK = {p: i for i, p in enumerate(["1d", "5d", "1mo", "3mo", "6mo", "ytd", "1y", "2y", "5y", "10y", "max"])}
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+metadata = MetaData()
+
+bars = Table(
+    "bars", metadata,
+    Column("symbol", String, primary_key=True),
+    Column("interval", String, primary_key=True),
+    Column("ts", Integer, primary_key=True),  # UTCのエポック秒
+    Column("open", Float),
+    Column("high", Float),
+    Column("low", Float),
+    Column("close", Float),
+    Column("volume", Float),
+)
+
+coverage = Table(
+    "coverage", metadata,
+    Column("symbol", String, primary_key=True),
+    Column("interval", String, primary_key=True),
+    Column("period", String, nullable=False),  # 取得済みの最長期間
+    Column("tz", String),
+    Column("fetched_at", Float, nullable=False),
+)
+
+
+class BarStore:
+    """銘柄ごとの履歴を保持し、不足している末尾だけをプロバイダから取得するOHLCVストア"""
+
+    def __init__(self, url: str = BAR_STORE_URL, refresh: float = BAR_STORE_REFRESH):
+        if url.startswith("sqlite:///"):
+            path = url[len("sqlite:///"):]
+            if path and path != ":memory:":
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.engine = create_engine(url)
+        self.refresh = refresh
+        self._lock = threading.Lock()  # 書き込み (短い upsert) だけを直列にする
+        self._flights = SingleFlight()
+        create_tables(self.engine, metadata)
+
+    def _coverage(self, conn, symbol: str, interval: str):
+        return conn.execute(
+            select(coverage).where(coverage.c.symbol == symbol, coverage.c.interval == interval)
+        ).first()
+
+    def _write(self, conn, symbol: str, interval: str, df: pd.DataFrame):
+        if df.empty:
+            return
+        ts = df.index.tz_convert("UTC") if df.index.tz is not None else df.index.tz_localize("UTC")
+        rows = [
+            {
+                "symbol": symbol, "interval": interval, "ts": int(t),
+                "open": o, "high": h, "low": l, "close": c, "volume": v,
+            }
+            for t, o, h, l, c, v in zip(
+                ts.asi8 // 10**9,
+                df["Open"].to_numpy(float), df["High"].to_numpy(float),
+                df["Low"].to_numpy(float), df["Close"].to_numpy(float),
+                df["Volume"].to_numpy(float),
+            )
+        ]
+        stmt = sqlite_insert(bars)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["symbol", "interval", "ts"],
+                set_={k: stmt.excluded[k] for k in ("open", "high", "low", "close", "volume")},
+            ),
+            rows,
+        )
+
+    def _set_coverage(self, conn, symbol: str, interval: str, period: str, tz):
+        # 取得中に他のスレッドがより長い期間を書き込んでいれば、短い期間で上書きしない
+        current = self._coverage(conn, symbol, interval)
+        if current is not None and _PERIOD_RANK.get(current.period, -1) > _PERIOD_RANK.get(period, -1):
+            period = current.period
+        stmt = sqlite_insert(coverage).values(
+            symbol=symbol, interval=interval, period=period, tz=tz, fetched_at=time.time()
+        )
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["symbol", "interval"],
+                set_={"period": stmt.excluded.period, "tz": stmt.excluded.tz,
+                      "fetched_at": stmt.excluded.fetched_at},
+            )
+        )
+
+    def _read(self, conn, symbol: str, interval: str, tz) -> pd.DataFrame:
+        result = conn.execute(
+            select(bars.c.ts, bars.c.open, bars.c.high, bars.c.low, bars.c.close, bars.c.volume)
+            .where(bars.c.symbol == symbol, bars.c.interval == interval)
+            .order_by(bars.c.ts)
+        ).all()
+        df = pd.DataFrame(result, columns=["ts"] + OHLCV_COLUMNS)
+        index = pd.to_datetime(df.pop("ts"), unit="s", utc=True)
+        df.index = pd.DatetimeIndex(index.dt.tz_convert(tz) if tz else index, name="Date")
+        return df
+
+    def read_through(self, symbol: str, period: str, interval: str, fetch) -> pd.DataFrame:
+        """ストアから履歴を読み出す (不足分のみ fetch(symbol, interval, period=..., start=...) で取得)
+
+        ストアにない期間を要求された場合は全期間を取得し、それ以外は
+        最終バー以降の末尾だけを取得して追記する。プロバイダの呼び出しはロックと
+        トランザクションの外で行い、同じ (銘柄, 足種, 期間) の同時の呼び出しは1回にまとめる。
+        """
+        df, shared = self._flights.do(
+            (symbol, interval, period), lambda: self._read_through(symbol, period, interval, fetch)
+        )
+        return df.copy() if shared else df
+
+    def _read_through(self, symbol: str, period: str, interval: str, fetch) -> pd.DataFrame:
+        with self.engine.connect() as conn:
+            cov = self._coverage(conn, symbol, interval)
+            if cov is not None and _PERIOD_RANK.get(period, len(_PERIOD_RANK)) <= _PERIOD_RANK.get(cov.period, -1):
+                last_ts = conn.execute(
+                    select(bars.c.ts).where(bars.c.symbol == symbol, bars.c.interval == interval)
+                    .order_by(bars.c.ts.desc()).limit(1)
+                ).scalar()
+            else:
+                cov = None
+
+        if cov is None:
+            df = fetch(symbol, interval, period=period)
+            if df.empty:
+                return df
+            tz = str(df.index.tz) if df.index.tz is not None else None
+            with self._lock, self.engine.begin() as conn:
+                self._write(conn, symbol, interval, df)
+                self._set_coverage(conn, symbol, interval, period, tz)
+            return df[OHLCV_COLUMNS]
+
+        tz = cov.tz
+        if time.time() - cov.fetched_at > self.refresh and last_ts is not None:
+            start = pd.Timestamp(last_ts, unit="s", tz="UTC")
+            if tz:
+                start = start.tz_convert(tz)
+            # 最終バーは確定していない可能性があるため、その日から取り直す
+            tail = fetch(symbol, interval, start=start.strftime("%Y-%m-%d"))
+            with self._lock, self.engine.begin() as conn:
+                self._write(conn, symbol, interval, tail)
+                self._set_coverage(conn, symbol, interval, cov.period, tz)
+
+        with self.engine.connect() as conn:
+            return self._read(conn, symbol, interval, tz)
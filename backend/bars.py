@@ -0,0 +1,141 @@
+"""OHLCV と特徴量のコンパクトな保持形式
+
+DataFrame は列ごとの Series・インデックス・ブロック管理のオブジェクトを抱えるため、
+キャッシュに数万件を並べるとデータ本体以外のメモリが無視できない。ここでは
+時刻を整数のエポック秒、値を事前に確保した 2 次元配列 (列, 行) に持ち、メタデータは
+__slots__ に限定する。DataFrame への変換は API に返すときだけ行う。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+PRICE_COLUMNS = OHLCV_COLUMNS[:4]
+
+# キャッシュ内の価格の型。既定の float32 は価格の列が半分になる (1エントリあたり約 2/3)。
+# 読み出し時は float64 に戻すが、値は float32 に丸めたもの (有効桁約7桁、100ドルの株価で
+# 約 0.00001 ドルの誤差) になる。プロバイダの値をそのまま返す必要があれば float64 を指定する
+BAR_CACHE_DTYPE = np.dtype(os.getenv("BAR_CACHE_DTYPE", "float32"))
+
+_NS = 1_000_000_000
+
+
+def epoch_seconds(index: pd.DatetimeIndex) -> np.ndarray:
+    """DatetimeIndex を UTC のエポック秒 (int64) に変換"""
+    return index.as_unit("ns").asi8 // _NS
+
+
+def to_index(ts: np.ndarray, tz) -> pd.DatetimeIndex:
+    """エポック秒から DatetimeIndex を復元 (tz が None ならタイムゾーンなし)"""
+    index = pd.DatetimeIndex((ts * _NS).view("datetime64[ns]"), name="Date")
+    return index.tz_localize("UTC").tz_convert(tz) if tz else index
+
+
+class BarFrame:
+    """1銘柄・1期間の OHLCV
+
+    価格は BAR_CACHE_DTYPE の (4, 行) 配列、出来高は桁落ちを避けるため float64 で持つ。
+    """
+
+    __slots__ = ("ts", "prices", "volume", "tz")
+
+    def __init__(self, ts: np.ndarray, prices: np.ndarray, volume: np.ndarray, tz=None):
+        self.ts = ts
+        self.prices = prices
+        self.volume = volume
+        self.tz = tz
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dtype=None) -> "BarFrame":
+        """DataFrame から作成 (OHLCV 以外の列は捨て、ない列は NaN)"""
+        n = len(df)
+        prices = np.empty((len(PRICE_COLUMNS), n), dtype=dtype or BAR_CACHE_DTYPE)
+        for i, column in enumerate(PRICE_COLUMNS):
+            prices[i] = df[column].to_numpy(dtype=float) if column in df else np.nan
+        volume = df["Volume"].to_numpy(dtype=float, copy=True) if "Volume" in df else np.full(n, np.nan)
+        tz = str(df.index.tz) if df.index.tz is not None else None
+        return cls(epoch_seconds(df.index), prices, volume, tz)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return to_index(self.ts, self.tz)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ts.nbytes + self.prices.nbytes + self.volume.nbytes
+
+    def to_frame(self, start: int = 0) -> pd.DataFrame:
+        """start 行目以降を float64 の DataFrame として返す (呼び出し側で自由に変更してよい)"""
+        data = {column: self.prices[i, start:].astype(float) for i, column in enumerate(PRICE_COLUMNS)}
+        data["Volume"] = self.volume[start:].copy()
+        return pd.DataFrame(data, index=to_index(self.ts[start:], self.tz))
+
+
+class FeatureFrame:
+    """特徴量の列を事前に確保した (列, 行) の float64 配列
+
+    列は作成時に名前を付けて確保し、値は column(name) のビューへ直接書き込む。
+    """
+
+    __slots__ = ("ts", "tz", "values", "columns", "_positions")
+
+    def __init__(self, ts: np.ndarray, tz, columns: list):
+        self.ts = ts
+        self.tz = tz
+        self.columns = list(columns)
+        self._positions = {name: i for i, name in enumerate(self.columns)}
+        self.values = np.empty((len(self.columns), len(ts)))
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._positions
+
+    def column(self, name: str) -> np.ndarray:
+        """列のビュー (書き込むとこのフレームが変わる)"""
+        return self.values[self._positions[name]]
+
+    def __setitem__(self, name: str, values):
+        self.values[self._positions[name]] = values
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.column(name)
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return to_index(self.ts, self.tz)
+
+    @property
+    def end(self) -> pd.Timestamp:
+        """最終行の時刻"""
+        return self.index[-1]
+
+    def select(self, columns: list) -> np.ndarray:
+        """指定列を (行, 列) の配列として返す"""
+        return self.values[[self._positions[name] for name in columns]].T
+
+    def dropna(self) -> "FeatureFrame":
+        """いずれかの列が NaN の行を除いたフレーム (欠損がなければ自身を返す)
+
+        欠損が先頭の行 (指標の計算に必要な本数に満たない区間) だけの場合はコピーせずビューを返す。
+        """
+        keep = ~np.isnan(self.values).any(axis=0)
+        if keep.all():
+            return self
+        start = int(keep.argmax())
+        rows = slice(start, None) if keep[start:].all() else keep
+        frame = FeatureFrame.__new__(FeatureFrame)
+        frame.ts = self.ts[rows]
+        frame.tz = self.tz
+        frame.columns = self.columns
+        frame._positions = self._positions
+        frame.values = self.values[:, rows]
+        return frame
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.values.T, index=self.index, columns=self.columns)
@@ -0,0 +1,89 @@
+"""価格アラートの評価のベンチマーク (1ティックあたりの評価時間)
+
+全アラートを走査する素朴な方法と発火結果を照合した上で、銘柄ごとの閾値の板による
+評価時間を測定する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_alerts --alerts 100000 --symbols 1000 --ticks 10000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from alerts import AlertBook
+
+
+def synthetic_alerts(n_alerts: int, n_symbols: int, seed: int = 0):
+    """現在値の前後 ±20% に閾値を置いたアラート"""
+    rng = np.random.default_rng(seed)
+    prices = rng.uniform(10, 500, n_symbols)
+    symbol_idx = rng.integers(0, n_symbols, n_alerts)
+    targets = prices[symbol_idx] * rng.uniform(0.8, 1.2, n_alerts)
+    conditions = np.where(targets >= prices[symbol_idx], "above", "below")
+    symbols = [f"SYM{i}" for i in range(n_symbols)]
+    alerts = [
+        (i, symbols[s], float(t), str(c))
+        for i, (s, t, c) in enumerate(zip(symbol_idx, targets, conditions))
+    ]
+    return symbols, prices, alerts
+
+
+def scan(alerts: list, active: set, symbol: str, price: float) -> list:
+    """全アラートを走査する従来の方法 (照合用)"""
+    hit = [
+        alert_id for alert_id, s, target, condition in alerts
+        if alert_id in active and s == symbol
+        and (price >= target if condition == "above" else price <= target)
+    ]
+    active.difference_update(hit)
+    return hit
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=100_000)
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--ticks", type=int, default=10_000)
+    parser.add_argument("--check-ticks", type=int, default=200, help="全走査と照合するティック数")
+    args = parser.parse_args()
+
+    symbols, prices, alerts = synthetic_alerts(args.alerts, args.symbols)
+    book = AlertBook()
+    start = time.perf_counter()
+    for alert in alerts:
+        book.add(*alert)
+    print(f"indexed {len(book)} alerts in {time.perf_counter() - start:.3f}s")
+
+    # 価格のランダムウォーク (1ティックで ±0.5% 程度動く)
+    rng = np.random.default_rng(1)
+    ticks = [
+        (int(s), float(r))
+        for s, r in zip(rng.integers(0, args.symbols, args.ticks), rng.normal(0, 0.005, args.ticks))
+    ]
+
+    active = {alert[0] for alert in alerts}
+    check_book = AlertBook()
+    for alert in alerts:
+        check_book.add(*alert)
+    check_prices = prices.copy()
+    for s, r in ticks[:args.check_ticks]:
+        check_prices[s] *= 1 + r
+        expected = sorted(scan(alerts, active, symbols[s], check_prices[s]))
+        assert sorted(check_book.evaluate(symbols[s], check_prices[s])) == expected
+    print(f"parity OK over {args.check_ticks} ticks")
+
+    fired = 0
+    elapsed = []
+    for s, r in ticks:
+        prices[s] *= 1 + r
+        t0 = time.perf_counter()
+        fired += len(book.evaluate(symbols[s], prices[s]))
+        elapsed.append(time.perf_counter() - t0)
+    elapsed = np.array(elapsed) * 1e6
+    print(f"{args.ticks} ticks: fired={fired} remaining={len(book)} "
+          f"mean={elapsed.mean():.2f}us p99={np.percentile(elapsed, 99):.2f}us max={elapsed.max():.2f}us")
+
+
+if __name__ == "__main__":
+    main()
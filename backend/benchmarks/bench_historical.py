@@ -0,0 +1,90 @@
+"""/api/stock/historical のペイロード生成のベンチマーク
+
+従来の iterrows による行ごとの辞書の組み立てと、列単位で作る各形式について
+エンコードにかかる CPU 時間とペイロードサイズ (圧縮なし / gzip) を比較する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_historical --bars 1260 --points 500
+"""
+import argparse
+import gzip
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+import chart_data
+
+
+def synthetic_history(n_bars: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, n_bars)))
+    spread = close * rng.uniform(0.002, 0.02, n_bars)
+    return pd.DataFrame({
+        "Open": close + rng.normal(0, 0.5, n_bars) * spread,
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Volume": rng.integers(1_000_000, 50_000_000, n_bars),
+    }, index=pd.bdate_range(end="2024-01-01", periods=n_bars, tz="America/New_York"))
+
+
+def iterrows_payload(df: pd.DataFrame) -> bytes:
+    """従来の実装 (照合用)"""
+    data = []
+    for index, row in df.iterrows():
+        data.append({
+            "date": index.strftime("%Y-%m-%d"),
+            "open": float(row["Open"]),
+            "high": float(row["High"]),
+            "low": float(row["Low"]),
+            "close": float(row["Close"]),
+            "volume": int(row["Volume"])
+        })
+    return json.dumps({"symbol": "SYN", "period": "5y", "data": data}).encode()
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, default=1260, help="5年分の営業日はおよそ 1260 本")
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    df = synthetic_history(args.bars)
+    baseline, base_time = timed(lambda: iterrows_payload(df), args.repeat)
+    rows = chart_data.encode("SYN", "5y", chart_data.history_columns(df), "rows")
+    assert json.loads(rows)["data"] == json.loads(baseline)["data"], "rows 形式が従来の出力と一致しません"
+
+    print(f"{'variant':<22}{'ms':>9}{'speedup':>9}{'bytes':>10}{'gzip':>9}")
+    print(f"{'iterrows (before)':<22}{base_time * 1000:>9.2f}{1.0:>9.1f}{len(baseline):>10}{len(gzip.compress(baseline)):>9}")
+
+    variants = [(fmt, None, None) for fmt in ("rows", "columnar", "msgpack", "arrow")]
+    variants += [("columnar", args.points, "lttb"), ("columnar", args.points, "ohlc")]
+    for fmt, points, method in variants:
+        def build():
+            columns = chart_data.history_columns(df)
+            if points:
+                columns = chart_data.downsample(columns, points, method)
+            return chart_data.encode("SYN", "5y", columns, fmt)
+        try:
+            body, elapsed = timed(build, args.repeat)
+        except (ImportError, ValueError) as e:
+            print(f"{fmt:<22}skipped ({e})")
+            continue
+        name = f"{fmt} {method} {points}" if points else fmt
+        print(f"{name:<22}{elapsed * 1000:>9.2f}{base_time / elapsed:>9.1f}{len(body):>10}{len(gzip.compress(body)):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""指標エンジンのベンチマーク (ta ライブラリとの一致確認と速度比較)
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_indicators --symbols 500 --bars 1250
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import ta
+
+import indicators
+
+
+def synthetic_ohlc(n_symbols: int, n_bars: int, seed: int = 0):
+    """幾何ブラウン運動による擬似的な高値・安値・終値 (銘柄 × 時点)"""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.02, size=(n_symbols, n_bars))
+    close = 100 * np.exp(np.cumsum(returns, axis=1))
+    spread = np.abs(rng.normal(0, 0.01, size=close.shape)) * close
+    return close + spread, close - spread, close
+
+
+def ta_indicators(high, low, close) -> dict:
+    """technical_analysis で従来使っていた ta ライブラリによる計算"""
+    high, low, close = pd.Series(high), pd.Series(low), pd.Series(close)
+    macd = ta.trend.MACD(close)
+    bollinger = ta.volatility.BollingerBands(close)
+    stoch = ta.momentum.StochasticOscillator(high, low, close)
+    return {
+        "SMA_20": ta.trend.sma_indicator(close, window=20),
+        "SMA_50": ta.trend.sma_indicator(close, window=50),
+        "EMA_12": ta.trend.ema_indicator(close, window=12),
+        "EMA_26": ta.trend.ema_indicator(close, window=26),
+        "MACD": macd.macd(),
+        "MACD_signal": macd.macd_signal(),
+        "MACD_diff": macd.macd_diff(),
+        "RSI": ta.momentum.rsi(close, window=14),
+        "BB_upper": bollinger.bollinger_hband(),
+        "BB_middle": bollinger.bollinger_mavg(),
+        "BB_lower": bollinger.bollinger_lband(),
+        "Stoch_K": stoch.stoch(),
+        "Stoch_D": stoch.stoch_signal(),
+    }
+
+
+def check_parity(high, low, close):
+    """全指標が ta の結果と一致することを確認 (2次元入力の各行についても確認)"""
+    panel = indicators.compute_indicators(high, low, close)
+    for i in range(close.shape[0]):
+        expected = ta_indicators(high[i], low[i], close[i])
+        single = indicators.compute_indicators(high[i], low[i], close[i])
+        for name, series in expected.items():
+            np.testing.assert_allclose(single[name], series.to_numpy(), rtol=1e-9, atol=1e-9, err_msg=name)
+            np.testing.assert_allclose(panel[name][i], series.to_numpy(), rtol=1e-9, atol=1e-9, err_msg=name)
+
+    # 末尾揃えで先頭が NaN の系列 (一括分析のパネル) でも一致すること
+    short = close.shape[1] // 2
+    padded = [np.concatenate([np.full(short, np.nan), a[0, short:]]) for a in (high, low, close)]
+    expected = ta_indicators(high[0, short:], low[0, short:], close[0, short:])
+    result = indicators.compute_indicators(*padded)
+    for name, series in expected.items():
+        np.testing.assert_allclose(result[name][short:], series.to_numpy(), rtol=1e-9, atol=1e-9, err_msg=name)
+        assert np.isnan(result[name][:short]).all(), name
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=1250)
+    args = parser.parse_args()
+
+    high, low, close = synthetic_ohlc(args.symbols, args.bars)
+    check_parity(high[:5], low[:5], close[:5])
+    print("parity: OK (ta と一致)")
+
+    start = time.perf_counter()
+    for i in range(args.symbols):
+        ta_indicators(high[i], low[i], close[i])
+    ta_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indicators.compute_indicators(high, low, close)
+    engine_seconds = time.perf_counter() - start
+
+    print(f"{args.symbols} symbols x {args.bars} bars")
+    print(f"ta (銘柄ごと): {ta_seconds:.3f}s")
+    print(f"indicators (2次元一括): {engine_seconds:.3f}s")
+    print(f"speedup: {ta_seconds / engine_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
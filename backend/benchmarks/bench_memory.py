@@ -0,0 +1,116 @@
+"""バーキャッシュと特徴量の保持形式のメモリ・時間のベンチマーク
+
+キャッシュ 1 エントリ (銘柄・期間) あたりのメモリを、従来の DataFrame と bars.BarFrame
+(価格 float64 / float32) で tracemalloc により測り、数万エントリを持つ場合に換算する。
+あわせて列を1本ずつ追加する従来の prepare_data と、事前に確保した配列へ書き込む
+現在の実装の結果を照合し、所要時間を比較する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_memory --bars 252 --entries 2000 --target 20000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+import bars
+from benchmarks.bench_historical import synthetic_history
+
+
+def dataframe_prepare(data):
+    """従来の実装 (照合用、pandas で列を1本ずつ追加する)"""
+    data = data.fillna(method='ffill').fillna(method='bfill')
+    data['Returns'] = data['Close'].pct_change()
+    data['Volume_Change'] = data['Volume'].pct_change()
+    data['High_Low_Diff'] = data['High'] - data['Low']
+    data['Close_Open_Diff'] = data['Close'] - data['Open']
+    data['SMA_5'] = data['Close'].rolling(window=5).mean()
+    data['SMA_20'] = data['Close'].rolling(window=20).mean()
+    data['SMA_50'] = data['Close'].rolling(window=50).mean()
+    data['EMA_12'] = data['Close'].ewm(span=12).mean()
+    data['EMA_26'] = data['Close'].ewm(span=26).mean()
+    delta = data['Close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    data['RSI'] = 100 - (100 / (1 + gain / loss))
+    data['MACD'] = data['EMA_12'] - data['EMA_26']
+    data['MACD_Signal'] = data['MACD'].ewm(span=9).mean()
+    data['BB_Middle'] = data['Close'].rolling(window=20).mean()
+    data['BB_Std'] = data['Close'].rolling(window=20).std()
+    data['BB_Upper'] = data['BB_Middle'] + (data['BB_Std'] * 2)
+    data['BB_Lower'] = data['BB_Middle'] - (data['BB_Std'] * 2)
+    return data.dropna()
+
+
+def bytes_per_entry(make, sources: list) -> float:
+    """sources のそれぞれから作ったオブジェクトを全て保持したときの1件あたりのバイト数"""
+    for df in sources:
+        make(df)  # 元の DataFrame 側に作られるキャッシュ (列の Series など) を計測から除く
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [make(df) for df in sources]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used / len(sources)
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, default=252, help="1年分の営業日はおよそ 252 本")
+    parser.add_argument("--entries", type=int, default=2000, help="計測に使うエントリ数")
+    parser.add_argument("--target", type=int, default=20000, help="換算するキャッシュのエントリ数")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    # 従来のキャッシュはバーストアから読んだ DataFrame (インデックスも含めて各エントリが別物) を持っていた
+    sources = [synthetic_history(args.bars, seed=i).astype(float) for i in range(args.entries)]
+    layouts = {
+        "DataFrame": lambda df: df.copy(deep=True).set_axis(df.index.copy(), axis=0),
+        "BarFrame float64": lambda df: bars.BarFrame.from_frame(df, np.float64),
+        "BarFrame float32": lambda df: bars.BarFrame.from_frame(df, np.float32),
+    }
+    print(f"bar cache entry ({args.bars} bars), {args.entries} entries measured:")
+    baseline = None
+    for name, make in layouts.items():
+        per_entry = bytes_per_entry(make, sources)
+        baseline = baseline or per_entry
+        print(f"  {name:<18} {per_entry / 1024:8.2f} KiB/entry  {per_entry * args.target / 2**20:8.1f} MiB "
+              f"for {args.target} entries  ({per_entry / baseline:.2f}x)")
+
+    from ml_models import StockPricePredictor
+
+    df = synthetic_history(args.bars * 5)
+    predictor = StockPricePredictor("SYN")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        expected = dataframe_prepare(df.copy())
+        old = best_of(lambda: dataframe_prepare(df.copy()), args.repeat)
+    features = predictor.prepare_features(df)
+    assert list(features.index) == list(expected.index), "残る行が一致しません"
+    for column in features.columns:
+        np.testing.assert_allclose(features[column], expected[column].to_numpy(dtype=float), rtol=1e-9, atol=1e-9)
+    new = best_of(lambda: predictor.prepare_features(df), args.repeat)
+    frame = best_of(lambda: predictor.prepare_data(df), args.repeat)
+
+    print(f"prepare_data ({len(df)} bars, {len(features.columns)} columns):")
+    print(f"  DataFrame columns   {old * 1000:8.3f} ms")
+    print(f"  FeatureFrame        {new * 1000:8.3f} ms  ({old / new:.1f}x faster)")
+    print(f"  + to_frame()        {frame * 1000:8.3f} ms  ({old / frame:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""ポートフォリオのリスク指標のベンチマーク
+
+pandas の DataFrame.cov / rolling による計算と結果を照合した上で、終値の整列と
+行列演算によるリスク指標の計算時間を測定する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_portfolio --assets 500 --bars 1260
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import portfolio
+from benchmarks.bench_historical import synthetic_history
+
+
+def synthetic_frames(n_assets: int, n_bars: int) -> dict:
+    """一部の銘柄は途中から上場し、一部は休場日が欠けた系列にする"""
+    frames = {}
+    for i in range(n_assets):
+        df = synthetic_history(n_bars, seed=i)
+        if i % 10 == 1:
+            df = df.iloc[n_bars // 3:]
+        elif i % 10 == 2:
+            df = df.drop(df.index[::17])
+        frames[f"SYM{i}"] = df
+    return frames
+
+
+def pandas_reference(frames: dict, weights: np.ndarray, window: int):
+    closes = pd.DataFrame({s: df["Close"] for s, df in frames.items()}).ffill()
+    returns = closes.pct_change(fill_method=None).iloc[1:]
+    cov = returns.cov()
+    rp = returns.fillna(0.0) @ weights
+    rolling = rp.rolling(window).std() * np.sqrt(portfolio.TRADING_DAYS)
+    return cov.to_numpy(), rolling.to_numpy()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=1260, help="5年分の営業日はおよそ 1260 本")
+    parser.add_argument("--window", type=int, default=63)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    frames = synthetic_frames(args.assets, args.bars)
+    benchmark = synthetic_history(args.bars, seed=10**6)
+    weights = np.full(args.assets, 1.0 / args.assets)
+
+    dates, symbols, closes = portfolio.align_closes({**frames, "BENCH": benchmark})
+    result = portfolio.analyze(dates, symbols[:-1], closes[:, :-1], weights, closes[:, -1], window=args.window)
+
+    cov, rolling = pandas_reference(frames, weights, args.window)
+    ours = np.array(result["covariance"], dtype=float) / portfolio.TRADING_DAYS
+    assert np.allclose(ours, cov, rtol=1e-8, atol=1e-12, equal_nan=True), "共分散が一致しません"
+    ours_rolling = np.array([p["value"] for p in result["rolling"]["volatility"]])
+    assert np.allclose(ours_rolling, rolling[args.window - 1:], rtol=1e-6), "ローリングボラティリティが一致しません"
+
+    def timeit(fn):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    align = timeit(lambda: portfolio.align_closes({**frames, "BENCH": benchmark}))
+    risk = timeit(lambda: portfolio.analyze(dates, symbols[:-1], closes[:, :-1], weights, closes[:, -1],
+                                            window=args.window, matrices=False))
+    full = timeit(lambda: portfolio.analyze(dates, symbols[:-1], closes[:, :-1], weights, closes[:, -1],
+                                            window=args.window))
+    naive = timeit(lambda: pandas_reference(frames, weights, args.window))
+
+    print(f"{args.assets} assets x {args.bars} bars (parity with pandas cov/rolling OK)")
+    print(f"align closes:              {align * 1000:8.1f} ms")
+    print(f"risk metrics:              {risk * 1000:8.1f} ms")
+    print(f"risk metrics + matrices:   {full * 1000:8.1f} ms")
+    print(f"pandas cov + rolling:      {naive * 1000:8.1f} ms")
+    print(f"portfolio volatility {result['volatility']:.4f}, beta {result['beta']:.3f}, "
+          f"VaR95 {result['risk']['0.95']['historical_var']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
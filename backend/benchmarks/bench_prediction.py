@@ -0,0 +1,102 @@
+"""価格予測 (/api/stock/prediction) のベンチマーク
+
+毎回 StandardScaler + LinearRegression を当てはめる従来の方法と予測値を照合した上で、
+初回の当てはめ・同じ最終バーへの再リクエスト・新しいバーでの差分更新の所要時間を比較する。
+差分更新は期間の先頭が動かない場合 (period=max 等) に使われる。先頭が動くと残る行の RSI 等も
+変わるため、期間をずらした場合は全行で当てはめ直しになることも確かめる。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_prediction --bars 252 --repeat 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+import indicators
+import prediction_models
+from benchmarks.bench_historical import synthetic_history
+
+
+def sklearn_prediction(df) -> float:
+    """従来の実装の予測値 (照合用)"""
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import StandardScaler
+
+    df = df.copy()
+    df['Returns'] = df['Close'].pct_change()
+    close = df['Close'].to_numpy(dtype=float)
+    df['SMA_5'] = indicators.sma(close, 5)
+    df['SMA_20'] = indicators.sma(close, 20)
+    df['RSI'] = indicators.rsi(close, 14)
+    df['Volume_Change'] = df['Volume'].pct_change()
+    df = df.dropna()
+    X = df[['Returns', 'SMA_5', 'SMA_20', 'RSI', 'Volume_Change']].values
+    y = df['Close'].values
+    train_size = int(len(X) * 0.8)
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X[:train_size])
+    model = LinearRegression().fit(X_train, y[:train_size])
+    return float(model.predict(scaler.transform(X[-1:]))[0])
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, default=252, help="1年分の営業日はおよそ 252 本")
+    parser.add_argument("--days", type=int, default=30, help="差分更新を確かめる日数")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    full = synthetic_history(args.bars + args.days)
+    df = full.iloc[:args.bars]
+    cache = prediction_models.PredictionModelCache(prediction_models.PredictionModelStore("sqlite:///:memory:"))
+
+    expected = sklearn_prediction(df)
+    state, features, _ = cache.get("SYN", "1y", df)
+    assert abs(state.predict(features) - expected) < 1e-6 * abs(expected), "当てはめの結果が一致しません"
+
+    # 先頭を固定したまま1日ずつバーを足し、差分更新と全行での当てはめ直しの差を確かめる
+    drift = 0.0
+    incremental = []
+    for day in range(1, args.days + 1):
+        window = full.iloc[:args.bars + day]
+        start = time.perf_counter()
+        state, features, source = cache.get("SYN", "1y", window)
+        elapsed = time.perf_counter() - start
+        if source == "incremental":
+            incremental.append(elapsed)
+        reference = sklearn_prediction(window)
+        drift = max(drift, abs(state.predict(features) - reference) / abs(reference))
+
+    # 期間をずらした場合は差分更新せず、全行で当てはめ直した結果と一致する
+    sliding = prediction_models.PredictionModelCache(prediction_models.PredictionModelStore("sqlite:///:memory:"))
+    sliding.get("SYN", "1y", df)
+    shifted = full.iloc[1:args.bars + 1]
+    state, features, source = sliding.get("SYN", "1y", shifted)
+    assert source == "fit", "期間の先頭が動いた場合に差分更新されています"
+    assert abs(state.predict(features) - sklearn_prediction(shifted)) < 1e-6 * abs(expected)
+
+    baseline = best_of(lambda: sklearn_prediction(window), args.repeat)
+    cold = best_of(lambda: prediction_models.PredictionModelCache(
+        prediction_models.PredictionModelStore("sqlite:///:memory:")).get("SYN", "1y", window), max(1, args.repeat // 10))
+    hit = best_of(lambda: cache.get("SYN", "1y", window), args.repeat)
+
+    print(f"parity: |cached - sklearn| / price < 1e-6, max drift after {args.days} incremental days {drift:.2e}")
+    print(f"refit per request (sklearn): {baseline * 1000:8.3f} ms")
+    print(f"cold fit + store write:      {cold * 1000:8.3f} ms")
+    print(f"incremental update (median): {np.median(incremental) * 1000:8.3f} ms ({len(incremental)} updates)")
+    print(f"repeat request (cache hit):  {hit * 1000:8.3f} ms ({baseline / hit:.0f}x)")
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""スクリーナーのベンチマーク
+
+銘柄ごとに technical_analysis と calculate_trading_signals を実行して条件を評価する従来の方法と
+結果を照合した上で、スナップショットの再構築 (初回・新しいバーが1本増えた場合) と
+索引を使った絞り込みの所要時間を比較する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_screener --symbols 2000 --bars 252
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import analysis
+import indicators
+import market_data
+import screener
+from benchmarks.bench_historical import synthetic_history
+from ml_models import evaluate_trading_signals
+
+WHERE = "RSI < 45 and SMA_20 > SMA_50"
+
+
+def live_screen(frames: dict) -> dict:
+    """従来の方法: 銘柄ごとに指標とシグナルを計算してから条件を評価する"""
+    matched = {}
+    for symbol, df in frames.items():
+        result = analysis.compute_technical_analysis(symbol, df)
+        ind = result["indicators"]
+        values = indicators.compute_indicators(df["High"], df["Low"], df["Close"])
+        close = df["Close"].to_numpy(dtype=float)
+        sma_5 = indicators.sma(close, 5)
+
+        def features(i):
+            return {"Close": close[i], "RSI": values["RSI"][i], "MACD": values["MACD"][i],
+                    "MACD_Signal": values["MACD_signal"][i], "SMA_5": sma_5[i], "SMA_20": values["SMA_20"][i],
+                    "SMA_50": values["SMA_50"][i], "BB_Upper": values["BB_upper"][i], "BB_Lower": values["BB_lower"][i]}
+
+        signals = evaluate_trading_signals(features(-1), features(-2))
+        if ind["RSI"] is not None and ind["RSI"] < 45 and (ind["SMA_20"] or 0) > (ind["SMA_50"] or np.inf):
+            matched[symbol] = signals["buy_score"] - signals["sell_score"]
+    return matched
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--bars", type=int, default=252)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    full = {f"SYM{i}": synthetic_history(args.bars + 1, seed=i) for i in range(args.symbols)}
+    frames = {s: df.iloc[:-1] for s, df in full.items()}
+    symbols = list(frames)
+    path = os.path.join(tempfile.mkdtemp(), "screener.npz")
+    builder = screener.ScreenerBuilder(path=path, chunk_size=len(symbols))
+
+    def build(source):
+        market_data.get_history_batch = lambda chunk, period: {s: source[s] for s in chunk}
+        start = time.perf_counter()
+        stats = builder.rebuild(symbols)
+        return time.perf_counter() - start, stats
+
+    first, _ = build(frames)
+    incremental, stats = build(full)
+    assert stats["incremental"] == len(symbols), stats
+
+    start = time.perf_counter()
+    expected = live_screen(full)
+    live = time.perf_counter() - start
+
+    snapshot = screener.Snapshot.load(path)
+    result = snapshot.query(WHERE, sort="score", limit=len(symbols))
+    got = {r["symbol"]: r["score"] for r in result["results"]}
+    assert got == expected, "スクリーニング結果が一致しません"
+
+    def best_of(fn):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    query = best_of(lambda: snapshot.query(WHERE, sort="score", limit=50))
+    indexed = best_of(lambda: snapshot.query("RSI < 25", sort="RSI", descending=False, limit=50))
+    ranked = best_of(lambda: snapshot.query("", sort="change_pct", limit=50))
+
+    print(f"{args.symbols} symbols x {args.bars} bars, '{WHERE}' matched {len(expected)} (parity OK)")
+    print(f"live technical_analysis per symbol: {live * 1000:9.1f} ms")
+    print(f"initial snapshot build:             {first * 1000:9.1f} ms")
+    print(f"rebuild after one new bar:          {incremental * 1000:9.1f} ms")
+    print(f"query (2 conditions, top 50):       {query * 1000:9.3f} ms")
+    print(f"query (indexed range, top 50):      {indexed * 1000:9.3f} ms")
+    print(f"rank whole universe (top 50):       {ranked * 1000:9.3f} ms")
+    print(f"snapshot size: {os.path.getsize(path) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
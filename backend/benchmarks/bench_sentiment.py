@@ -0,0 +1,67 @@
+"""見出しセンチメントのスコアラーのベンチマーク (見出し数/秒)
+
+TextBlob と辞書ベースのベクトル化スコアラーの処理速度と、ポジティブ/中立/ネガティブの
+判定の一致率を測定する。キャッシュ済みの見出しを再評価する場合の速度も示す。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_sentiment --headlines 5000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from sentiment import LexiconScorer, SentimentCache, SentimentPipeline, TextBlobScorer
+
+_WORDS = (
+    "stock shares company earnings revenue quarter market investors analysts report guidance "
+    "growth record strong weak surprising disappointing great bad excellent poor higher lower "
+    "beats misses rally slump surge plunge upgrade downgrade risk concerns optimistic worried "
+    "best worst new old big small positive negative solid terrible amazing volatile not never"
+).split()
+
+
+def synthetic_headlines(n: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(6, 14, n)
+    return [" ".join(rng.choice(_WORDS, size=k)).capitalize() for k in lengths]
+
+
+def labels(scores: np.ndarray) -> np.ndarray:
+    return np.where(scores > 0.1, 1, np.where(scores < -0.1, -1, 0))
+
+
+def throughput(scorer, titles: list) -> tuple:
+    start = time.perf_counter()
+    scores = scorer.score(titles)
+    elapsed = time.perf_counter() - start
+    return scores, len(titles) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headlines", type=int, default=5000)
+    args = parser.parse_args()
+
+    titles = synthetic_headlines(args.headlines)
+    textblob_scores, textblob_rate = throughput(TextBlobScorer(), titles)
+    lexicon = LexiconScorer()
+    lexicon_scores, lexicon_rate = throughput(lexicon, titles)
+    agreement = float((labels(textblob_scores) == labels(lexicon_scores)).mean())
+
+    print(f"textblob: {textblob_rate:,.0f} headlines/s")
+    print(f"lexicon:  {lexicon_rate:,.0f} headlines/s ({lexicon_rate / textblob_rate:.1f}x), "
+          f"label agreement {agreement:.1%}, mean abs diff {np.abs(textblob_scores - lexicon_scores).mean():.3f}")
+
+    # 2回目以降は見出しのキャッシュから返る
+    pipeline = SentimentPipeline(TextBlobScorer(), SentimentCache(maxsize=len(titles)))
+    items = [{"title": t} for t in titles]
+    pipeline.score(items)
+    start = time.perf_counter()
+    pipeline.score(items)
+    cached_rate = len(items) / (time.perf_counter() - start)
+    print(f"cached:   {cached_rate:,.0f} headlines/s ({cached_rate / textblob_rate:.1f}x), {pipeline.stats()}")
+
+
+if __name__ == "__main__":
+    main()
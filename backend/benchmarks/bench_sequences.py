@@ -0,0 +1,71 @@
+"""シーケンス生成のベンチマーク (従来のリスト + np.array 方式とストライドビュー方式の比較)
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_sequences --bars 1250 --symbols 50
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from sequences import iter_batches, sliding_windows
+
+SEQUENCE_LENGTH = 60
+N_FEATURES = 12
+
+
+def create_sequences_list(data: np.ndarray, sequence_length: int = SEQUENCE_LENGTH):
+    """従来の StockPricePredictor.create_sequences"""
+    X, y = [], []
+    for i in range(sequence_length, len(data)):
+        X.append(data[i-sequence_length:i])
+        y.append(data[i, 0])
+    return np.array(X), np.array(y)
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def consume_batches(X, y, batch_size=32):
+    """1エポック分のバッチを取り出す (学習時に実際にコピーされる量)"""
+    total = 0
+    for xb, _ in iter_batches(X, y, batch_size, shuffle=True):
+        total += xb.shape[0]
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, default=1250)
+    parser.add_argument("--symbols", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    datasets = [rng.random((args.bars, N_FEATURES), dtype=np.float32) for _ in range(args.symbols)]
+
+    # 結果の一致を確認
+    X_old, y_old = create_sequences_list(datasets[0])
+    X_new, y_new = sliding_windows(datasets[0], SEQUENCE_LENGTH)
+    np.testing.assert_array_equal(X_old, X_new)
+    np.testing.assert_array_equal(y_old, y_new)
+
+    _, old_seconds, old_peak = measure(lambda: [create_sequences_list(d) for d in datasets])
+    views, new_seconds, new_peak = measure(lambda: [sliding_windows(d, SEQUENCE_LENGTH) for d in datasets])
+    _, batch_seconds, batch_peak = measure(lambda: [consume_batches(X, y) for X, y in views])
+
+    print(f"{args.symbols} symbols x {args.bars} bars x {N_FEATURES} features (seq={SEQUENCE_LENGTH})")
+    print(f"list + np.array : {old_seconds:.3f}s, peak {old_peak / 2**20:.1f} MiB")
+    print(f"sliding windows : {new_seconds:.4f}s, peak {new_peak / 2**20:.3f} MiB")
+    print(f"1 epoch batches : {batch_seconds:.3f}s, peak {batch_peak / 2**20:.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
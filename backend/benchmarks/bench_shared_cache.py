@@ -0,0 +1,88 @@
+"""ワーカー間の共有キャッシュのベンチマーク (複数プロセスで同じ銘柄を同時に要求する)
+
+uvicorn のワーカーに見立てたプロセスを起動し、各プロセスのスレッドから同じキー集合を
+shared_cache.SharedCache.single_flight で要求する。プロバイダ呼び出し (遅延付きの擬似関数)
+の実行回数がキー数と一致すること、共有キャッシュからの読み出しにかかる時間を確認する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_shared_cache --processes 4 --threads 8 --keys 20 --latency 0.1
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def worker(url: str, keys: list, threads: int, latency: float, start_at: float, results):
+    import shared_cache
+    from bars import BarFrame
+    from benchmarks.bench_historical import synthetic_history
+
+    cache = shared_cache.SharedCache(url)
+    calls = []
+
+    def fetch(key):
+        calls.append(key)
+        time.sleep(latency)
+        return BarFrame.from_frame(synthetic_history(252, seed=keys.index(key)))
+
+    time.sleep(max(0.0, start_at - time.time()))  # 全プロセスで同時に要求を始める
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda i: cache.single_flight(keys[i % len(keys)], lambda: fetch(keys[i % len(keys)]), 300),
+                      range(threads * len(keys))))
+
+    # 値が揃った後の読み出し時間
+    times = []
+    for key in keys * 5:
+        t = time.perf_counter()
+        cache.get(key)
+        times.append((time.perf_counter() - t) * 1000)
+    results.put((os.getpid(), len(calls), cache.stats(), statistics.median(times)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--keys", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1, help="擬似プロバイダの応答遅延 (秒)")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="shared-cache-")
+    url = f"sqlite:///{directory}/shared_cache.db"
+    keys = [f"bars:SYN{i}:1d:1y" for i in range(args.keys)]
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    start_at = time.time() + 2.0
+    processes = [
+        context.Process(target=worker, args=(url, keys, args.threads, args.latency, start_at, results))
+        for _ in range(args.processes)
+    ]
+    for p in processes:
+        p.start()
+    reports = [results.get(timeout=300) for _ in processes]
+    for p in processes:
+        p.join()
+    elapsed = time.time() - start_at
+
+    total_calls = sum(r[1] for r in reports)
+    requests = args.processes * args.threads * args.keys
+    print(f"{args.processes} processes x {args.threads} threads, {args.keys} keys, "
+          f"provider latency {args.latency * 1000:.0f} ms")
+    print(f"requests: {requests}, provider calls: {total_calls} (without sharing: {args.processes * args.keys})")
+    print(f"elapsed:  {elapsed:.3f} s")
+    for pid, calls, stats, read_ms in reports:
+        print(f"  pid {pid}: calls {calls:3d}  fill {stats['fill']:3d}  waited {stats['waited']:3d}  "
+              f"hit {stats['hit']:4d}  read median {read_ms:.3f} ms")
+    print(f"read median over processes: {np.median([r[3] for r in reports]):.3f} ms")
+    assert total_calls == args.keys, "同じキーのプロバイダ呼び出しが重複しています"
+
+
+if __name__ == "__main__":
+    main()
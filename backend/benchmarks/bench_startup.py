@@ -0,0 +1,73 @@
+"""起動時間のベンチマーク (モジュールごとの import コスト)
+
+各モジュールを新しいプロセスで import した時間と、`import main` の -X importtime の結果から
+main が直接読み込むモジュールごとの累積時間を表示する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_startup --repeat 3
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "main", "analysis", "market_data", "ml_models", "model_registry", "streaming", "alerts",
+    "fastapi", "pandas", "numpy", "sqlalchemy", "scipy.signal", "sklearn.linear_model",
+    "yfinance", "textblob", "ta", "bs4", "requests", "tensorflow",
+]
+
+
+def import_seconds(module: str) -> float:
+    """新しいプロセスで module を import したときの所要時間"""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True,
+                         env={**os.environ, "TF_CPP_MIN_LOG_LEVEL": "3"})
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else "import failed")
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def importtime_breakdown(module: str) -> list:
+    """-X importtime の出力から module が直接 import したモジュールの累積時間 (ミリ秒)"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BACKEND_DIR,
+                         capture_output=True, text=True, env={**os.environ, "TF_CPP_MIN_LOG_LEVEL": "3"})
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # 字下げ2つ分 = main の直下のモジュール
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            rows.append((name.strip(), int(cumulative) / 1000))
+    return sorted(rows, key=lambda r: -r[1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modules", default=",".join(MODULES))
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'module':<24}{'best ms':>10}")
+    for module in args.modules.split(","):
+        try:
+            best = min(import_seconds(module) for _ in range(args.repeat))
+        except RuntimeError as e:
+            print(f"{module:<24}{'skipped':>10} ({e})")
+            continue
+        print(f"{module:<24}{best * 1000:>10.1f}")
+
+    print("\nimport main: cumulative ms per direct import")
+    for name, ms in importtime_breakdown("main")[:args.top]:
+        print(f"  {name:<22}{ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""プロバイダ呼び出し層のベンチマーク (擬似プロバイダを使うためネットワーク不要)
+
+人気銘柄に同時リクエストが集まった状況を再現し、single-flight なしで各リクエストが
+プロバイダを呼ぶ場合と、ProviderClient を通した場合の呼び出し回数と所要時間を比較する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.bench_upstream --requests 100 --symbols 5 --latency 0.1
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import providers
+
+
+def run(fn, symbols: list, n_requests: int, workers: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(lambda i: fn(symbols[i % len(symbols)], "1d", period="1y"), range(n_requests)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--symbols", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.1, help="擬似プロバイダの応答遅延 (秒)")
+    parser.add_argument("--workers", type=int, default=40)
+    parser.add_argument("--rate", type=float, default=10, help="1秒あたりの呼び出し上限")
+    args = parser.parse_args()
+
+    symbols = [f"SYM{i}" for i in range(args.symbols)]
+
+    # 素朴な方法: 各リクエストがそのままプロバイダを呼び、レート制限で待たされる
+    direct = providers.SyntheticProvider(latency=args.latency)
+    bucket = providers.TokenBucket(rate=args.rate, burst=args.symbols)
+
+    def direct_history(symbol, interval, period=None):
+        bucket.acquire()
+        return direct.history(symbol, interval, period=period)
+
+    naive = run(direct_history, symbols, args.requests, args.workers)
+
+    client = providers.ProviderClient(
+        providers.SyntheticProvider(latency=args.latency),
+        bucket=providers.TokenBucket(rate=args.rate, burst=args.symbols),
+    )
+    coalesced = run(client.history, symbols, args.requests, args.workers)
+
+    print(f"{args.requests} concurrent requests over {args.symbols} symbols, "
+          f"provider latency {args.latency * 1000:.0f} ms, rate limit {args.rate}/s")
+    print(f"direct calls:      {direct.calls:5d} provider calls, {naive:7.3f} s")
+    print(f"ProviderClient:    {client.provider.calls:5d} provider calls, {coalesced:7.3f} s")
+    print(client.stats()["coalesced"])
+
+
+if __name__ == "__main__":
+    main()
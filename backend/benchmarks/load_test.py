@@ -0,0 +1,174 @@
+"""API の負荷試験 (プロセス内で FastAPI アプリに直接リクエストを送る)
+
+プロバイダを擬似プロバイダ (providers.SyntheticProvider) に差し替え、データストアは一時
+ディレクトリに置くため、ネットワークや既存のデータに依存しない。決まった乱数列で
+エンドポイントと銘柄を選び、並行度を固定してリクエストを送り続け、エンドポイントごとの
+スループットと p50/p90/p99 を出力・保存する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.load_test --requests 2000 --concurrency 32
+    python -m benchmarks.load_test --scenario historical --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import report
+
+
+def _isolate_environment(latency: float):
+    """アプリの import 前に、擬似プロバイダと一時ディレクトリのストアを使う設定にする"""
+    data = tempfile.mkdtemp(prefix="load-test-")
+    os.environ.update({
+        "MARKET_DATA_PROVIDER": "synthetic",
+        "SYNTHETIC_LATENCY": str(latency),
+        "UPSTREAM_RATE": "0",
+        "BAR_STORE_URL": f"sqlite:///{data}/bars.db",
+        "PREDICTION_STORE_URL": f"sqlite:///{data}/predictions.db",
+        "ALERT_STORE_URL": f"sqlite:///{data}/alerts.db",
+        "SCREENER_SNAPSHOT_PATH": f"{data}/screener.npz",
+        "SHARED_LOCK_DIR": data,
+        "WARMUP_ON_STARTUP": "0",
+        "ALERT_POLL_INTERVAL": "0",
+        "TRAIN_SCHEDULE_ENABLED": "0",
+        "SCREENER_SCHEDULE_ENABLED": "0",
+    })
+    return data
+
+
+# シナリオ名 -> [(重み, メソッド, パス, 銘柄からリクエスト本文を作る関数)]
+SCENARIOS = {
+    "mixed": [
+        (4, "POST", "/api/stock/technical-analysis", lambda s: {"symbol": s, "period": "6mo"}),
+        (3, "POST", "/api/stock/historical", lambda s: {"symbol": s, "period": "1y", "format": "columnar"}),
+        (2, "POST", "/api/stock/prediction", lambda s: {"symbol": s, "period": "1y"}),
+        (2, "POST", "/api/stock/news", lambda s: {"symbol": s}),
+        (1, "POST", "/api/stock/info", lambda s: {"symbol": s}),
+        (1, "POST", "/api/stock/comprehensive-analysis", lambda s: {"symbol": s, "period": "6mo"}),
+    ],
+    "historical": [
+        (1, "POST", "/api/stock/historical", lambda s: {"symbol": s, "period": "5y", "format": "columnar"}),
+        (1, "POST", "/api/stock/historical", lambda s: {"symbol": s, "period": "5y", "format": "msgpack"}),
+        (1, "POST", "/api/stock/historical", lambda s: {"symbol": s, "period": "5y", "points": 500}),
+    ],
+    "analysis": [
+        (1, "POST", "/api/stock/technical-analysis", lambda s: {"symbol": s, "period": "1y"}),
+        (1, "POST", "/api/stock/prediction", lambda s: {"symbol": s, "period": "1y"}),
+    ],
+}
+
+
+def plan(scenario: str, n_requests: int, symbols: list, seed: int) -> list:
+    """送るリクエストの列 (同じ seed なら毎回同じ)"""
+    rng = random.Random(seed)
+    entries = SCENARIOS[scenario]
+    weights = [e[0] for e in entries]
+    requests = []
+    for _ in range(n_requests):
+        _, method, path, body = rng.choices(entries, weights)[0]
+        requests.append((method, path, body(rng.choice(symbols))))
+    return requests
+
+
+async def run(app, requests: list, concurrency: int) -> list:
+    """並行度 concurrency でリクエストを送り、(パス, ステータス, 秒) のリストを返す"""
+    import httpx
+
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    samples = []
+
+    async def worker(client):
+        while True:
+            try:
+                method, path, body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = response.status_code
+            except Exception:
+                status = 0
+            samples.append((path, status, time.perf_counter() - start))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return samples
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    """エンドポイントごとの件数・エラー数・スループット・レイテンシの分位点"""
+    groups = {"total": samples}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+    results = {}
+    for name, group in groups.items():
+        latency = np.array([s[2] for s in group]) * 1000
+        results[name] = {
+            "requests": len(group),
+            "errors": sum(1 for s in group if s[1] >= 400 or s[1] == 0),
+            "throughput_rps": len(group) / elapsed,
+            "mean_ms": float(latency.mean()),
+            "p50_ms": float(np.percentile(latency, 50)),
+            "p90_ms": float(np.percentile(latency, 90)),
+            "p99_ms": float(np.percentile(latency, 99)),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=100, help="計測前に送るリクエスト数 (キャッシュ・プールの準備)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--symbols", type=int, default=50, help="リクエストに使う銘柄数 (少ないほどキャッシュが効く)")
+    parser.add_argument("--latency", type=float, default=0.02, help="擬似プロバイダの応答遅延 (秒)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="比較対象の結果ファイル (省略時は同じシナリオの前回の結果)")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    data_dir = _isolate_environment(args.latency)
+    import main as api
+    from executors import shutdown
+
+    symbols = [f"SYN{i:03d}" for i in range(args.symbols)]
+    requests = plan(args.scenario, args.warmup + args.requests, symbols, args.seed)
+
+    async def go():
+        if args.warmup:
+            await run(api.app, requests[:args.warmup], args.concurrency)
+        start = time.perf_counter()
+        samples = await run(api.app, requests[args.warmup:], args.concurrency)
+        return samples, time.perf_counter() - start
+
+    try:
+        samples, elapsed = asyncio.run(go())
+    finally:
+        shutdown()
+    results = summarize(samples, elapsed)
+
+    print(f"scenario={args.scenario} requests={args.requests} concurrency={args.concurrency} "
+          f"symbols={args.symbols} provider latency={args.latency * 1000:.0f} ms (data: {data_dir})")
+    print(f"{'endpoint':<38} {'reqs':>6} {'err':>5} {'req/s':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<38} {r['requests']:>6} {r['errors']:>5} {r['throughput_rps']:>8.1f} "
+              f"{r['p50_ms']:>9.2f} {r['p90_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+
+    if not args.no_save:
+        kind = f"load-{args.scenario}"
+        path = report.save(kind, {"config": vars(args), **results})
+        report.summarize(path, results, kind, "p99_ms", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""ベンチマーク結果の保存と前回との比較
+
+結果は BENCH_RESULTS_DIR (既定は benchmarks/results) に "<種類>-<日時>.json" として保存し、
+同じ種類の直前の結果 (または指定したファイル) と指標ごとの増減を比較する。
+"""
+import glob
+import json
+import os
+import platform
+import subprocess
+import time
+
+RESULTS_DIR = os.getenv("BENCH_RESULTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+
+
+def environment() -> dict:
+    """比較のために結果と一緒に保存する実行環境"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save(kind: str, results: dict, directory: str = RESULTS_DIR) -> str:
+    """結果を保存してファイルパスを返す"""
+    os.makedirs(directory, exist_ok=True)
+    created = time.strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"{kind}-{created}.json")
+    with open(path, "w") as f:
+        json.dump({"kind": kind, "created": created, "environment": environment(), "results": results},
+                  f, ensure_ascii=False, indent=2)
+    return path
+
+
+def previous(kind: str, exclude: str = None, directory: str = RESULTS_DIR):
+    """同じ種類の直前の結果 (なければ None)"""
+    paths = sorted(p for p in glob.glob(os.path.join(directory, f"{kind}-*.json")) if p != exclude)
+    return load(paths[-1]) if paths else None
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current: dict, baseline: dict, metric: str, lower_is_better: bool = True) -> list:
+    """ケースごとに metric の増減を比較した行を返す (悪化したものに印を付ける)"""
+    lines = []
+    base = baseline["results"]
+    for name, values in current.items():
+        if name not in base or metric not in values or metric not in base[name]:
+            continue
+        old, new = base[name][metric], values[metric]
+        if not old:
+            continue
+        change = (new - old) / old * 100
+        worse = change > 10 if lower_is_better else change < -10
+        lines.append(f"  {name:<40} {old:>12.3f} -> {new:>12.3f} {metric} ({change:+6.1f}%){'  <-- regression' if worse else ''}")
+    return lines
+
+
+def summarize(path: str, current: dict, kind: str, metric: str, baseline_path: str = None,
+              lower_is_better: bool = True):
+    """保存先と、前回 (または baseline_path) との比較を表示する"""
+    print(f"saved: {path}")
+    baseline = load(baseline_path) if baseline_path else previous(kind, exclude=path)
+    if baseline is None:
+        print("no previous results to compare")
+        return
+    env = baseline.get("environment", {})
+    print(f"compared with {baseline['created']} (commit {env.get('commit')}):")
+    for line in compare(current, baseline, metric, lower_is_better):
+        print(line)
@@ -0,0 +1,98 @@
+"""マイクロベンチマーク一式 (指標計算・前処理・シーケンス生成・履歴のシリアライズ)
+
+全てのケースは擬似データだけで動き、ネットワークやプロバイダを使わない。
+結果は benchmarks/results に保存し、前回の結果との差を表示する。
+
+実行方法 (backend ディレクトリで):
+    python -m benchmarks.suite
+    python -m benchmarks.suite --filter historical --repeat 50
+    python -m benchmarks.suite --baseline benchmarks/results/micro-20240101-000000.json
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+import analysis
+import chart_data
+import indicators
+import portfolio
+from benchmarks import report
+from benchmarks.bench_historical import synthetic_history
+from benchmarks.bench_indicators import synthetic_ohlc
+
+
+def cases(bars: int) -> dict:
+    """ケース名 -> 引数なしで呼べる関数"""
+    from ml_models import StockPricePredictor
+
+    df = synthetic_history(bars)
+    high, low, close = synthetic_ohlc(500, bars)
+    predictor = StockPricePredictor("SYN")
+    prepared = predictor.prepare_features(df)
+    features = prepared.select(predictor.feature_columns).astype(np.float32)
+    columns = chart_data.history_columns(df)
+    frames = {f"SYM{i}": synthetic_history(bars, seed=i) for i in range(100)}
+    dates, symbols, closes = portfolio.align_closes(frames)
+    weights = np.full(len(symbols), 1.0 / len(symbols))
+
+    return {
+        "indicators.single": lambda: indicators.compute_indicators(df["High"], df["Low"], df["Close"]),
+        "indicators.panel_500": lambda: indicators.compute_indicators(high, low, close),
+        "analysis.technical": lambda: analysis.compute_technical_analysis("SYN", df),
+        "ml.prepare_data": lambda: predictor.prepare_data(df),
+        "ml.prepare_features": lambda: predictor.prepare_features(df),
+        "ml.create_sequences": lambda: predictor.create_sequences(features),
+        "historical.columns": lambda: chart_data.history_columns(df),
+        "historical.rows_json": lambda: chart_data.encode("SYN", "5y", columns, "rows"),
+        "historical.columnar_json": lambda: chart_data.encode("SYN", "5y", columns, "columnar"),
+        "historical.msgpack": lambda: chart_data.encode("SYN", "5y", columns, "msgpack"),
+        "historical.lttb_500": lambda: chart_data.downsample(columns, 500, "lttb"),
+        "historical.render_gzip": lambda: chart_data.render("SYN", "5y", df, "columnar", accept_encoding="gzip"),
+        "portfolio.analyze_100": lambda: portfolio.analyze(dates, symbols, closes, weights, matrices=False),
+    }
+
+
+def measure(fn, repeat: int, min_time: float = 0.0) -> dict:
+    """repeat 回 (min_time 秒に満たなければ延長して) 実行し、ミリ秒単位の統計を返す"""
+    fn()  # 初回の import やキャッシュの影響を除く
+    times = []
+    start = time.perf_counter()
+    while len(times) < repeat or time.perf_counter() - start < min_time:
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return {
+        "runs": len(times),
+        "min_ms": min(times),
+        "median_ms": statistics.median(times),
+        "mean_ms": statistics.fmean(times),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bars", type=int, default=1260, help="5年分の営業日はおよそ 1260 本")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--min-time", type=float, default=0.2, help="ケースごとの最低計測時間 (秒)")
+    parser.add_argument("--filter", default="", help="名前にこの文字列を含むケースだけを実行")
+    parser.add_argument("--baseline", help="比較対象の結果ファイル (省略時は前回の結果)")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    for name, fn in cases(args.bars).items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = measure(fn, args.repeat, args.min_time)
+        r = results[name]
+        print(f"{name:<28} median {r['median_ms']:9.3f} ms  min {r['min_ms']:9.3f} ms  ({r['runs']} runs)")
+
+    if not args.no_save:
+        path = report.save("micro", results)
+        report.summarize(path, results, "micro", "median_ms", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
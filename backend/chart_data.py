@@ -0,0 +1,181 @@
+import gzip
+import importlib.util
+import json
+
+import numpy as np
+import pandas as pd
+
+# /api/stock/historical のレスポンス生成
+#
+# 行ごとの辞書を Python のループで組み立てる代わりに列単位で配列を作り、要求に応じて
+# 行形式 / 列形式の JSON、MessagePack、Arrow IPC にエンコードする。チャート描画用に
+# 指定点数への間引き (LTTB または OHLC 集約) と gzip / brotli 圧縮にも対応する。
+
+FORMATS = ("rows", "columnar", "msgpack", "arrow")
+# Arrow 形式と brotli 圧縮は pyarrow / brotli がインストールされている場合だけ使う
+# (Accept ヘッダーでの判定でも、なければ選ばない)
+ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+BROTLI_AVAILABLE = importlib.util.find_spec("brotli") is not None
+MEDIA_TYPES = {
+    "rows": "application/json",
+    "columnar": "application/json",
+    "msgpack": "application/x-msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+DOWNSAMPLE_METHODS = ("lttb", "ohlc")
+# これより小さいレスポンスは圧縮しない (バイト)
+COMPRESS_MIN_SIZE = 1024
+
+
+def _dates(index: pd.DatetimeIndex) -> np.ndarray:
+    """現地時間の日付文字列 (strftime より大幅に速い)"""
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return np.datetime_as_string(index.values.astype("datetime64[D]"))
+
+
+def history_columns(df: pd.DataFrame) -> dict:
+    """OHLCV を列ごとの配列にする"""
+    return {
+        "date": _dates(df.index),
+        "open": df["Open"].to_numpy(dtype=np.float64),
+        "high": df["High"].to_numpy(dtype=np.float64),
+        "low": df["Low"].to_numpy(dtype=np.float64),
+        "close": df["Close"].to_numpy(dtype=np.float64),
+        "volume": df["Volume"].fillna(0).to_numpy(dtype=np.int64),
+    }
+
+
+def _buckets(n: int, points: int) -> np.ndarray:
+    """0..n を points 個のほぼ等しい区間に分ける境界"""
+    return np.linspace(0, n, points + 1).astype(np.int64)
+
+
+def downsample_ohlc(columns: dict, points: int) -> dict:
+    """連続するバーを points 本の足にまとめる (始値・高値・安値・終値・出来高の集約)"""
+    n = len(columns["close"])
+    if points <= 0 or n <= points:
+        return columns
+    starts = _buckets(n, points)[:-1]
+    ends = np.append(starts[1:], n)
+    return {
+        "date": columns["date"][starts],
+        "open": columns["open"][starts],
+        "high": np.maximum.reduceat(columns["high"], starts),
+        "low": np.minimum.reduceat(columns["low"], starts),
+        "close": columns["close"][ends - 1],
+        "volume": np.add.reduceat(columns["volume"], starts),
+    }
+
+
+def lttb_indices(y: np.ndarray, points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets で残す点の位置を選ぶ (x は等間隔とみなす)"""
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+    # 先頭と末尾の点は必ず残し、間を points - 2 個のバケットに分ける
+    bounds = (1 + _buckets(n - 2, points - 2)).tolist()
+    # バケットの平均は累積和からまとめて求める
+    csum = np.concatenate([[0.0], np.cumsum(y)])
+    values = y.tolist()
+    selected = [0]
+    a = 0
+    for i in range(points - 2):
+        start, end = bounds[i], bounds[i + 1]
+        # 次のバケットの平均点 (最後のバケットでは末尾の点)
+        next_start, next_end = (end, bounds[i + 2]) if i < points - 3 else (n - 1, n)
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = (csum[next_end] - csum[next_start]) / (next_end - next_start)
+        ya = values[a]
+        dx = a - avg_x
+        dy = avg_y - ya
+        # 1本ごとの numpy 呼び出しはバケットが小さいと割高なので Python で走査する
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs(dx * (values[j] - ya) - (a - j) * dy)
+            if area > best_area:
+                best, best_area = j, area
+        a = best
+        selected.append(a)
+    selected.append(n - 1)
+    return np.array(selected, dtype=np.int64)
+
+
+def downsample(columns: dict, points: int, method: str = "lttb") -> dict:
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"未対応の間引き方法です: {method}")
+    if method == "ohlc":
+        return downsample_ohlc(columns, points)
+    idx = lttb_indices(columns["close"], points)
+    return {key: values[idx] for key, values in columns.items()}
+
+
+def _rows(columns: dict) -> list:
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*(columns[k].tolist() for k in keys))]
+
+
+def encode(symbol: str, period: str, columns: dict, fmt: str = "rows") -> bytes:
+    """列の配列を指定形式のバイト列にする"""
+    if fmt == "rows":
+        payload = {"symbol": symbol, "period": period, "data": _rows(columns)}
+        return json.dumps(payload, separators=(",", ":")).encode()
+    if fmt == "columnar":
+        payload = {"symbol": symbol, "period": period, "columns": {k: v.tolist() for k, v in columns.items()}}
+        return json.dumps(payload, separators=(",", ":")).encode()
+    if fmt == "msgpack":
+        import msgpack
+
+        payload = {"symbol": symbol, "period": period, "columns": {k: v.tolist() for k, v in columns.items()}}
+        return msgpack.packb(payload)
+    if fmt == "arrow":
+        if not ARROW_AVAILABLE:
+            raise ValueError("Arrow 形式には pyarrow が必要です")
+        import pyarrow as pa
+
+        table = pa.table({k: pa.array(v) for k, v in columns.items()})
+        table = table.replace_schema_metadata({"symbol": symbol, "period": period})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    raise ValueError(f"未対応の形式です: {fmt}")
+
+
+def negotiate_format(requested: str, accept: str) -> str:
+    """リクエストの format 指定、なければ Accept ヘッダーから形式を決める"""
+    if requested:
+        if requested not in FORMATS:
+            raise ValueError(f"未対応の形式です: {requested}")
+        if requested == "arrow" and not ARROW_AVAILABLE:
+            raise ValueError("Arrow 形式には pyarrow が必要です")
+        return requested
+    accept = accept or ""
+    if ARROW_AVAILABLE and MEDIA_TYPES["arrow"] in accept:
+        return "arrow"
+    if MEDIA_TYPES["msgpack"] in accept:
+        return "msgpack"
+    return "rows"
+
+
+def compress(body: bytes, accept_encoding: str):
+    """Accept-Encoding に応じて brotli (利用可能な場合) または gzip で圧縮し、(本文, エンコーディング) を返す"""
+    accept_encoding = accept_encoding or ""
+    if len(body) < COMPRESS_MIN_SIZE:
+        return body, None
+    if BROTLI_AVAILABLE and "br" in accept_encoding:
+        import brotli
+
+        return brotli.compress(body, quality=5), "br"
+    if "gzip" in accept_encoding:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, None
+
+
+def render(symbol: str, period: str, df: pd.DataFrame, fmt: str, points: int = None,
+           method: str = "lttb", accept_encoding: str = None):
+    """履歴から (エンコード・圧縮済みの本文, Content-Encoding) を作る"""
+    columns = history_columns(df)
+    if points:
+        columns = downsample(columns, points, method)
+    return compress(encode(symbol, period, columns, fmt), accept_encoding)
@@ -0,0 +1,49 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+# ブロッキングI/O (yfinance 等) を実行するスレッド数
+IO_WORKERS = int(os.getenv("IO_WORKERS", "32"))
+# uvicorn のワーカー数 (各ワーカーが自分のプロセスプールを持つ)
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# CPU処理 (指標計算・モデル学習) を実行するプロセス数 (0 の場合はスレッドプールで実行)
+# 既定ではホストのコア数をワーカー間で分け合う
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+
+io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+_cpu_pool = None
+
+
+def get_cpu_pool():
+    """CPU処理用のプロセスプールを取得 (初回呼び出し時に生成)"""
+    global _cpu_pool
+    if _cpu_pool is None and CPU_WORKERS > 0:
+        # 初回の呼び出し時には I/O のスレッドや DB の接続があり、fork すると子プロセスが
+        # 引き継いだロックで止まることがある。forkserver (ない環境では spawn) の新しいプロセスで
+        # 実行するため、渡す関数はモジュールの最上位で定義したものにする
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _cpu_pool
+
+
+async def run_io(fn, *args, **kwargs):
+    """ブロッキングI/Oをスレッドプールで実行し、イベントループを止めない"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_pool, partial(fn, *args, **kwargs))
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """CPU処理をプロセスプールで実行"""
+    loop = asyncio.get_running_loop()
+    pool = get_cpu_pool() or io_pool
+    return await loop.run_in_executor(pool, partial(fn, *args, **kwargs))
+
+
+def shutdown():
+    global _cpu_pool
+    io_pool.shutdown(wait=False, cancel_futures=True)
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
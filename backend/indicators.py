@@ -0,0 +1,179 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# テクニカル指標の計算エンジン
+#
+# すべての関数は最後の軸を時間軸として扱い、1次元 (時間) と 2次元 (銘柄 × 時間) の
+# どちらの配列も受け付ける。先頭の NaN (パネルの末尾揃えによる埋め草) は未取得として
+# 扱い、ta ライブラリと同じ min_periods で結果を NaN にする。系列途中の NaN は想定しない。
+# out を受け付ける関数は、結果を新しい配列ではなく out (入力と同じ形の float64 配列) に書き込む。
+
+
+def _as_array(x) -> np.ndarray:
+    return np.ascontiguousarray(x, dtype=np.float64)
+
+
+def _first_valid(x: np.ndarray) -> np.ndarray:
+    """各系列で最初に有限値が現れる位置 (全て NaN の場合は系列長)"""
+    finite = np.isfinite(x)
+    return np.where(finite.any(axis=-1), finite.argmax(axis=-1), x.shape[-1])
+
+
+def _mask_warmup(y: np.ndarray, first: np.ndarray, periods: int) -> np.ndarray:
+    """最初の有効値から periods 本未満の区間を NaN にする"""
+    t = np.arange(y.shape[-1])
+    y[t < (np.expand_dims(first, -1) + periods - 1)] = np.nan
+    return y
+
+
+def _pad_front(y: np.ndarray, n: int) -> np.ndarray:
+    pad = np.full(y.shape[:-1] + (n,), np.nan)
+    return np.concatenate([pad, y], axis=-1)
+
+
+def sma(x, window: int, out: np.ndarray = None) -> np.ndarray:
+    """単純移動平均 (累積和による計算)"""
+    x = _as_array(x)
+    if out is None:
+        out = np.empty(x.shape)
+    if x.shape[-1] < window:
+        out[...] = np.nan
+        return out
+    valid = np.isfinite(x)
+    complete = valid.all()
+    cs = np.empty(x.shape[:-1] + (x.shape[-1] + 1,))
+    cs[..., 0] = 0.0
+    np.cumsum(x if complete else np.where(valid, x, 0.0), axis=-1, out=cs[..., 1:])
+    body = out[..., window - 1:]
+    np.subtract(cs[..., window:], cs[..., :-window], out=body)
+    body /= window
+    if not complete:
+        cn = np.zeros(cs.shape, dtype=np.int64)
+        np.cumsum(valid, axis=-1, out=cn[..., 1:])
+        body[(cn[..., window:] - cn[..., :-window]) != window] = np.nan
+    out[..., :window - 1] = np.nan
+    return out
+
+
+def rolling_std(x, window: int, ddof: int = 0, out: np.ndarray = None) -> np.ndarray:
+    """移動標準偏差 (平方和の累積和による計算、桁落ちを避けるため系列ごとに中心化)"""
+    x = _as_array(x)
+    with np.errstate(all="ignore"):
+        center = np.nanmean(x, axis=-1, keepdims=True)
+    d = x - center
+    mean = sma(d, window)
+    var = sma(d * d, window, out=out)
+    var -= mean * mean
+    np.maximum(var, 0.0, out=var)
+    var *= window / (window - ddof)
+    return np.sqrt(var, out=var)
+
+
+def ema(x, span: int = None, alpha: float = None, min_periods: int = 0, adjust: bool = False,
+        out: np.ndarray = None) -> np.ndarray:
+    """指数移動平均 (pandas の ewm(adjust=False) と同じ再帰フィルタ)
+
+    adjust=True の場合は ewm(adjust=True) と同じく、先頭からの重み (1-α)^i の合計で割った加重平均。
+    """
+    if alpha is None:
+        alpha = 2.0 / (span + 1)
+    x = _as_array(x)
+    first = _first_valid(x)
+    # scipy.signal は import に時間がかかるため最初の EMA 計算時に読み込む
+    from scipy.signal import lfilter
+
+    if adjust:
+        valid = np.arange(x.shape[-1]) >= np.expand_dims(first, -1)
+        weighted = lfilter([1.0], [1.0, alpha - 1.0], np.where(valid, x, 0.0), axis=-1)
+        weights = lfilter([1.0], [1.0, alpha - 1.0], valid.astype(np.float64), axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            y = np.divide(weighted, weights, out=out)
+        return _mask_warmup(y, first, max(min_periods, 1))
+    # 先頭の NaN を最初の有効値で埋めると、再帰の初期値が最初の有効値になる
+    idx = np.minimum(first, x.shape[-1] - 1)
+    seed = np.take_along_axis(x, np.expand_dims(idx, -1), axis=-1)
+    filled = np.where(np.arange(x.shape[-1]) < np.expand_dims(first, -1), seed, x)
+    y, _ = lfilter([alpha], [1.0, alpha - 1.0], filled, axis=-1, zi=(1.0 - alpha) * seed)
+    if out is not None:
+        # lfilter は出力先を指定できないため書き写す
+        out[...] = y
+        y = out
+    return _mask_warmup(y, first, max(min_periods, 1))
+
+
+def macd(close, fast: int = 12, slow: int = 26, signal: int = 9):
+    """MACD、シグナル、ヒストグラムを返す"""
+    macd_line = ema(close, span=fast, min_periods=fast) - ema(close, span=slow, min_periods=slow)
+    signal_line = ema(macd_line, span=signal, min_periods=signal)
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def rsi(close, window: int = 14) -> np.ndarray:
+    """RSI (Wilder の平滑化)"""
+    close = _as_array(close)
+    diff = np.diff(close, axis=-1, prepend=np.nan)
+    first = _first_valid(close)
+    # 最初のバーの差分は 0 とみなす (ta と同じ)
+    at_first = np.arange(close.shape[-1]) == np.expand_dims(first, -1)
+    diff[at_first] = 0.0
+    up = np.where(diff > 0, diff, np.where(np.isnan(diff), np.nan, 0.0))
+    down = np.where(diff < 0, -diff, np.where(np.isnan(diff), np.nan, 0.0))
+    avg_up = ema(up, alpha=1.0 / window, min_periods=window)
+    avg_down = ema(down, alpha=1.0 / window, min_periods=window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = 100.0 - 100.0 / (1.0 + avg_up / avg_down)
+    return np.where(avg_down == 0, 100.0, values)
+
+
+def bollinger(close, window: int = 20, k: float = 2.0):
+    """ボリンジャーバンドの上限、中心線、下限を返す"""
+    middle = sma(close, window)
+    std = rolling_std(close, window, ddof=0)
+    return middle + k * std, middle, middle - k * std
+
+
+def rolling_max(x, window: int) -> np.ndarray:
+    x = _as_array(x)
+    if x.shape[-1] < window:
+        return np.full(x.shape, np.nan)
+    return _pad_front(sliding_window_view(x, window, axis=-1).max(axis=-1), window - 1)
+
+
+def rolling_min(x, window: int) -> np.ndarray:
+    x = _as_array(x)
+    if x.shape[-1] < window:
+        return np.full(x.shape, np.nan)
+    return _pad_front(sliding_window_view(x, window, axis=-1).min(axis=-1), window - 1)
+
+
+def stochastic(high, low, close, window: int = 14, smooth: int = 3):
+    """ストキャスティクスの %K と %D を返す"""
+    lowest = rolling_min(low, window)
+    highest = rolling_max(high, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = 100.0 * (_as_array(close) - lowest) / (highest - lowest)
+    return k, sma(k, smooth)
+
+
+def compute_indicators(high, low, close) -> dict:
+    """テクニカル分析で使う全指標をまとめて計算"""
+    close = _as_array(close)
+    macd_line, signal_line, histogram = macd(close)
+    bb_upper, bb_middle, bb_lower = bollinger(close)
+    stoch_k, stoch_d = stochastic(high, low, close)
+    return {
+        "Close": close,
+        "SMA_20": sma(close, 20),
+        "SMA_50": sma(close, 50),
+        "EMA_12": ema(close, span=12, min_periods=12),
+        "EMA_26": ema(close, span=26, min_periods=26),
+        "MACD": macd_line,
+        "MACD_signal": signal_line,
+        "MACD_diff": histogram,
+        "RSI": rsi(close),
+        "BB_upper": bb_upper,
+        "BB_middle": bb_middle,
+        "BB_lower": bb_lower,
+        "Stoch_K": stoch_k,
+        "Stoch_D": stoch_d,
+    }
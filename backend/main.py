@@ -1,25 +1,60 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-import yfinance as yf
-import pandas as pd
+from typing import Dict, List, Optional
 import numpy as np
-from datetime import datetime, timedelta
-import ta
-from textblob import TextBlob
-import requests
-from bs4 import BeautifulSoup
+from datetime import datetime
+import asyncio
+import json
+import logging
 import os
+import sys
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+import alerts
+import analysis
+import backtest
+import chart_data
+import market_data
+import metrics
+import portfolio
+import profiling
+import providers
+import screener
+import sentiment
+import shared_cache
+import streaming
+import training_scheduler
+import warmup
+from executors import CPU_WORKERS, WEB_CONCURRENCY, run_cpu, run_io, shutdown as shutdown_executors
+from streaming_indicators import IndicatorRegistry, IndicatorState
+
+# TensorFlow を使うモデル関連 (ml_models, model_registry) は各エンドポイントで import する
+
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Stock Trading Assistant API")
 
 # CORS設定
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173").split(",")
 
+# 一括分析の設定
+BATCH_MAX_SYMBOLS = int(os.getenv("BATCH_MAX_SYMBOLS", "500"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "50"))
+
+# (銘柄, 期間) ごとのストリーミング指標 (新しいバーの分だけ更新する)
+indicator_registry = IndicatorRegistry(maxsize=int(os.getenv("STREAM_STATE_SIZE", "1024")))
+
+# 価格アラート (銘柄ごとの閾値の板で評価する)
+alert_engine = alerts.AlertEngine()
+
+# 価格・指標の配信 (購読中の銘柄を全クライアント共通で1周期に1回取得する)
+stream_hub = streaming.StreamHub(market_data.get_quotes, market_data.get_history, run_io, run_cpu)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
@@ -28,6 +63,70 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """エンドポイントごとの処理時間を記録 (PROFILING_ENABLED=1 なら X-Profile: 1 でプロファイルを採取)"""
+    if not metrics.METRICS_ENABLED:
+        return await call_next(request)
+    profile = profiling.PROFILING_ENABLED and (
+        request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+    )
+    sampler = profiling.StackSampler().start() if profile else None
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, request.method, _endpoint(request), "500")
+        raise
+    finally:
+        if sampler is not None:
+            profile_id = profiling.profile_store.add(_endpoint(request), sampler.stop())
+    # call_next はヘッダーの送信時点で戻るため、本体を送り終えた時点で記録する
+    # (ストリーミング・SSE のレスポンスも全体の時間になる。SSE は接続が続いた時間)
+    response.body_iterator = _timed_body(response.body_iterator, request, start, response.status_code)
+    if sampler is not None:
+        response.headers["X-Profile-Id"] = profile_id
+    return response
+
+def _endpoint(request: Request) -> str:
+    route = request.scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+async def _timed_body(body, request: Request, start: float, status: int):
+    """レスポンス本体を送り終えた (または中断された) 時点でリクエストの処理時間を記録する"""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, request.method, _endpoint(request), str(status))
+
+@metrics.register_collector
+def _collect_cache_metrics():
+    """キャッシュのヒット率などを出力時に集める"""
+    families = []
+    bar = market_data.bar_cache.stats()
+    families.append(("stock_api_bar_cache_lookups_total", "counter", "Bar cache lookups",
+                     [({"result": "hit"}, bar["hits"]), ({"result": "miss"}, bar["misses"])]))
+    families.append(("stock_api_bar_cache_hit_ratio", "gauge", "Bar cache hit ratio", [({}, bar["hit_ratio"])]))
+    families.append(("stock_api_bar_cache_entries", "gauge", "Bar cache entries", [({}, bar["size"])]))
+    families.append(("stock_api_bar_cache_bytes", "gauge", "Bar cache array bytes", [({}, bar["nbytes"])]))
+    if sentiment._pipeline is not None:
+        stats = sentiment.get_pipeline().stats()
+        families.append(("stock_api_sentiment_cache_lookups_total", "counter", "Headline sentiment cache lookups",
+                         [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]))
+    if "model_registry" in sys.modules:
+        pool = sys.modules["model_registry"].model_pool.stats()
+        families.append(("stock_api_model_pool_loads_total", "counter", "Model pool lookups",
+                         [({"result": "warm"}, pool["warm_hits"]), ({"result": "cold"}, pool["cold_loads"])]))
+        families.append(("stock_api_model_pool_bytes", "gauge", "Memory used by loaded models",
+                         [({}, pool["used_mb"] * 2**20)]))
+    families.append(("stock_api_indicator_states", "gauge", "Streaming indicator states held",
+                     [({}, len(indicator_registry))]))
+    families.append(("stock_api_active_alerts", "gauge", "Active price alerts", [({}, len(alert_engine))]))
+    families.append(("stock_api_stream_symbols", "gauge", "Symbols being streamed",
+                     [({}, len(stream_hub.feeds))]))
+    return families
+
 # データモデル
 class StockSymbol(BaseModel):
     symbol: str
@@ -40,155 +139,219 @@ class AnalysisRequest(BaseModel):
     symbol: str
     period: str = "1mo"  # 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y
 
+class HistoricalRequest(AnalysisRequest):
+    format: Optional[str] = None  # rows, columnar, msgpack, arrow (pyarrow が必要。未指定なら Accept ヘッダーで判定)
+    points: Optional[int] = None  # チャート用に間引く点数
+    downsample: str = "lttb"  # lttb または ohlc
+
+class BatchAnalysisRequest(BaseModel):
+    symbols: List[str]
+    period: str = "3mo"
+
+class ModelPredictionRequest(BaseModel):
+    symbol: str
+    model_type: str = "lstm"  # lstm または gru
+    days: int = 5
+
+class BatchModelPredictionRequest(BaseModel):
+    symbols: List[str]
+    model_type: str = "lstm"
+    days: int = 5
+
+class BacktestRequest(BaseModel):
+    symbols: List[str]
+    period: str = "2y"
+    # 各パラメータは候補のリスト (全組み合わせを評価する)
+    rsi_lower: List[float] = [30]
+    rsi_upper: List[float] = [70]
+    entry_score: List[int] = [2]
+    exit_score: List[int] = [-2]
+    allow_short: bool = False
+    cost: float = 0.0
+
+class PortfolioRequest(BaseModel):
+    holdings: Dict[str, float]  # 銘柄 -> 保有比率 (評価額でもよい、合計で正規化する)
+    period: str = "1y"
+    benchmark: Optional[str] = "SPY"  # ベータの基準 (None でベータを計算しない)
+    confidence: List[float] = [0.95, 0.99]  # VaR/CVaR の信頼水準
+    window: int = portfolio.PORTFOLIO_WINDOW  # ローリング指標の窓 (営業日数)
+    matrices: bool = True  # 共分散・相関行列を含めるか
+
+class ScreenerQuery(BaseModel):
+    where: str = ""  # 例: "RSI < 30 and SMA_20 > SMA_50"
+    sort: str = "score"
+    descending: bool = True
+    limit: int = 50
+    columns: Optional[List[str]] = None  # 返す列 (未指定なら全列)
+
+class ScreenerRebuildRequest(BaseModel):
+    symbols: Optional[List[str]] = None  # 未指定なら SCREENER_UNIVERSE
+
 class PriceAlert(BaseModel):
     symbol: str
     target_price: float
     condition: str  # "above" or "below"
 
+training_job_scheduler = None
+screener_scheduler = None
+alert_poll_task = None
+# ウォームアップが終わるまではレディネスチェックに 503 を返す
+readiness = {"ready": not warmup.WARMUP_ON_STARTUP, "warmup": None}
+
+async def warm_up():
+    """重いライブラリとモデルを API プロセスと CPU ワーカーへ事前に読み込む"""
+    start = time.perf_counter()
+    try:
+        api, workers = await asyncio.gather(
+            run_io(warmup.warm_api_process, warmup.WARMUP_TENSORFLOW, warmup.parse_models()),
+            asyncio.gather(*(run_cpu(warmup.warm_worker) for _ in range(max(1, CPU_WORKERS)))),
+        )
+        readiness["warmup"] = {
+            **api,
+            "cpu_workers": len(set(workers)),
+            "total_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+    except Exception as e:
+        logger.warning("warm-up failed: %s", e)
+        readiness["warmup"] = {"error": str(e)}
+    finally:
+        readiness["ready"] = True
+
+@app.on_event("startup")
+async def on_startup():
+    global training_job_scheduler, screener_scheduler, alert_poll_task
+    # 定期実行 (再学習・スクリーナー・アラート確認) はホスト上の1つのワーカーだけで行う
+    if shared_cache.acquire_leader("scheduler"):
+        if training_scheduler.TRAIN_SCHEDULE_ENABLED:
+            training_job_scheduler = training_scheduler.start_scheduler()
+        if screener.SCREENER_SCHEDULE_ENABLED:
+            screener_scheduler = screener.start_scheduler(training_scheduler.load_universe(screener.SCREENER_UNIVERSE))
+        if alerts.ALERT_POLL_INTERVAL > 0:
+            alert_poll_task = asyncio.create_task(alerts.poll_alerts(
+                alert_engine, market_data.get_quotes, run_io, refresh=WEB_CONCURRENCY > 1,
+            ))
+    if warmup.WARMUP_ON_STARTUP:
+        asyncio.create_task(warm_up())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if training_job_scheduler is not None:
+        training_job_scheduler.shutdown(wait=False)
+    if screener_scheduler is not None:
+        screener_scheduler.shutdown(wait=False)
+    if alert_poll_task is not None:
+        alert_poll_task.cancel()
+    await stream_hub.close()
+    shutdown_executors()
+
 @app.get("/")
 async def root():
     return {"message": "Stock Trading Assistant API", "version": "1.0.0"}
 
+@app.get("/api/health/live")
+async def liveness():
+    """プロセスが応答しているか"""
+    return {"status": "ok"}
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """ウォームアップが完了してリクエストを受けられるか"""
+    if not readiness["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready", "warmup": readiness["warmup"]}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 形式のメトリクス"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/metrics/stages")
+async def get_stage_metrics():
+    """エンドポイント・段階ごとの件数と平均処理時間"""
+    return metrics.STAGE_LATENCY.summary()
+
+@app.get("/api/profiles")
+async def list_profiles():
+    """採取済みのプロファイル"""
+    return profiling.profile_store.list()
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """プロファイルを collapsed stacks 形式で返す (flamegraph.pl や speedscope で表示できる)"""
+    profile = profiling.profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile["collapsed"])
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """市場データキャッシュの統計情報"""
+    return market_data.cache_stats()
+
+@app.get("/api/cache/shared/stats")
+async def get_shared_cache_stats():
+    """ワーカー間の共有キャッシュの統計情報 (カウンタはこのワーカーの分)"""
+    return await run_io(shared_cache.cache.stats)
+
+@app.get("/api/upstream/stats")
+async def get_upstream_stats():
+    """プロバイダ呼び出しの統計情報 (共有・再試行・レート制限の待ち時間)"""
+    return providers.client.stats()
+
 @app.post("/api/stock/info")
 async def get_stock_info(stock: StockSymbol):
     """株式の基本情報を取得"""
     try:
-        ticker = yf.Ticker(stock.symbol)
-        info = ticker.info
-        
-        return {
-            "symbol": stock.symbol,
-            "name": info.get("longName", "N/A"),
-            "current_price": info.get("currentPrice", info.get("regularMarketPrice", 0)),
-            "previous_close": info.get("previousClose", 0),
-            "open": info.get("open", 0),
-            "day_high": info.get("dayHigh", 0),
-            "day_low": info.get("dayLow", 0),
-            "volume": info.get("volume", 0),
-            "market_cap": info.get("marketCap", 0),
-            "pe_ratio": info.get("trailingPE", 0),
-            "dividend_yield": info.get("dividendYield", 0),
-            "52week_high": info.get("fiftyTwoWeekHigh", 0),
-            "52week_low": info.get("fiftyTwoWeekLow", 0),
-        }
+        info = await run_io(market_data.get_info, stock.symbol)
+        return analysis.build_stock_info(stock.symbol, info)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error fetching stock info: {str(e)}")
 
 @app.post("/api/stock/historical")
-async def get_historical_data(request: AnalysisRequest):
+async def get_historical_data(request: HistoricalRequest, http_request: Request):
     """過去の株価データを取得"""
     try:
-        ticker = yf.Ticker(request.symbol)
-        df = ticker.history(period=request.period)
+        fmt = chart_data.negotiate_format(request.format, http_request.headers.get("accept"))
+        endpoint = "/api/stock/historical"
+        df = await metrics.timed(endpoint, "fetch", run_io(market_data.get_history, request.symbol, request.period))
         
         if df.empty:
             raise HTTPException(status_code=404, detail="No data found for this symbol")
         
-        # データを辞書形式に変換
-        data = []
-        for index, row in df.iterrows():
-            data.append({
-                "date": index.strftime("%Y-%m-%d"),
-                "open": float(row["Open"]),
-                "high": float(row["High"]),
-                "low": float(row["Low"]),
-                "close": float(row["Close"]),
-                "volume": int(row["Volume"])
-            })
-        
-        return {"symbol": request.symbol, "period": request.period, "data": data}
+        # データを列ごとの配列に変換し、指定形式でエンコード
+        body, encoding = await metrics.timed(endpoint, "serialization", run_io(
+            chart_data.render, request.symbol, request.period, df, fmt,
+            request.points, request.downsample, http_request.headers.get("accept-encoding"),
+        ))
+        headers = {"Vary": "Accept, Accept-Encoding"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=chart_data.MEDIA_TYPES[fmt], headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error fetching historical data: {str(e)}")
 
+async def _technical_from_state(symbol: str, period: str, df):
+    """保持しているストリーミング指標に未反映のバーだけを反映してシグナルを判定"""
+    key = (symbol, period)
+    state = indicator_registry.get(key)
+    if state is None or not state.apply_history(df):
+        state = await run_cpu(IndicatorState.from_history, df)
+        indicator_registry.put(key, state)
+    return analysis.build_technical_result(symbol, state.latest, state.previous)
+
 @app.post("/api/stock/technical-analysis")
 async def technical_analysis(request: AnalysisRequest):
     """テクニカル分析を実行"""
     try:
-        ticker = yf.Ticker(request.symbol)
-        df = ticker.history(period=request.period)
+        endpoint = "/api/stock/technical-analysis"
+        df = await metrics.timed(endpoint, "fetch", run_io(market_data.get_history, request.symbol, request.period))
         
         if df.empty:
             raise HTTPException(status_code=404, detail="No data found")
         
-        # テクニカル指標の計算
-        # 移動平均
-        df['SMA_20'] = ta.trend.sma_indicator(df['Close'], window=20)
-        df['SMA_50'] = ta.trend.sma_indicator(df['Close'], window=50)
-        df['EMA_12'] = ta.trend.ema_indicator(df['Close'], window=12)
-        df['EMA_26'] = ta.trend.ema_indicator(df['Close'], window=26)
-        
-        # MACD
-        macd = ta.trend.MACD(df['Close'])
-        df['MACD'] = macd.macd()
-        df['MACD_signal'] = macd.macd_signal()
-        df['MACD_diff'] = macd.macd_diff()
-        
-        # RSI
-        df['RSI'] = ta.momentum.rsi(df['Close'], window=14)
-        
-        # ボリンジャーバンド
-        bollinger = ta.volatility.BollingerBands(df['Close'])
-        df['BB_upper'] = bollinger.bollinger_hband()
-        df['BB_middle'] = bollinger.bollinger_mavg()
-        df['BB_lower'] = bollinger.bollinger_lband()
-        
-        # ストキャスティクス
-        stoch = ta.momentum.StochasticOscillator(df['High'], df['Low'], df['Close'])
-        df['Stoch_K'] = stoch.stoch()
-        df['Stoch_D'] = stoch.stoch_signal()
-        
-        # 最新の値を取得
-        latest = df.iloc[-1]
-        
-        # トレンド判定
-        trend = "中立"
-        if latest['SMA_20'] > latest['SMA_50']:
-            trend = "上昇トレンド"
-        elif latest['SMA_20'] < latest['SMA_50']:
-            trend = "下降トレンド"
-        
-        # シグナル判定
-        signals = []
-        
-        # RSIシグナル
-        if latest['RSI'] < 30:
-            signals.append({"type": "買いシグナル", "indicator": "RSI", "value": float(latest['RSI']), "reason": "売られすぎ"})
-        elif latest['RSI'] > 70:
-            signals.append({"type": "売りシグナル", "indicator": "RSI", "value": float(latest['RSI']), "reason": "買われすぎ"})
-        
-        # MACDシグナル
-        if latest['MACD'] > latest['MACD_signal'] and df.iloc[-2]['MACD'] <= df.iloc[-2]['MACD_signal']:
-            signals.append({"type": "買いシグナル", "indicator": "MACD", "value": float(latest['MACD']), "reason": "ゴールデンクロス"})
-        elif latest['MACD'] < latest['MACD_signal'] and df.iloc[-2]['MACD'] >= df.iloc[-2]['MACD_signal']:
-            signals.append({"type": "売りシグナル", "indicator": "MACD", "value": float(latest['MACD']), "reason": "デッドクロス"})
-        
-        # ボリンジャーバンドシグナル
-        if latest['Close'] < latest['BB_lower']:
-            signals.append({"type": "買いシグナル", "indicator": "ボリンジャーバンド", "value": float(latest['Close']), "reason": "下限突破"})
-        elif latest['Close'] > latest['BB_upper']:
-            signals.append({"type": "売りシグナル", "indicator": "ボリンジャーバンド", "value": float(latest['Close']), "reason": "上限突破"})
-        
-        return {
-            "symbol": request.symbol,
-            "trend": trend,
-            "indicators": {
-                "SMA_20": float(latest['SMA_20']) if not pd.isna(latest['SMA_20']) else None,
-                "SMA_50": float(latest['SMA_50']) if not pd.isna(latest['SMA_50']) else None,
-                "EMA_12": float(latest['EMA_12']) if not pd.isna(latest['EMA_12']) else None,
-                "EMA_26": float(latest['EMA_26']) if not pd.isna(latest['EMA_26']) else None,
-                "RSI": float(latest['RSI']) if not pd.isna(latest['RSI']) else None,
-                "MACD": float(latest['MACD']) if not pd.isna(latest['MACD']) else None,
-                "MACD_signal": float(latest['MACD_signal']) if not pd.isna(latest['MACD_signal']) else None,
-                "BB_upper": float(latest['BB_upper']) if not pd.isna(latest['BB_upper']) else None,
-                "BB_middle": float(latest['BB_middle']) if not pd.isna(latest['BB_middle']) else None,
-                "BB_lower": float(latest['BB_lower']) if not pd.isna(latest['BB_lower']) else None,
-                "Stoch_K": float(latest['Stoch_K']) if not pd.isna(latest['Stoch_K']) else None,
-                "Stoch_D": float(latest['Stoch_D']) if not pd.isna(latest['Stoch_D']) else None,
-            },
-            "signals": signals,
-            "current_price": float(latest['Close']),
-            "updated_at": datetime.now().isoformat()
-        }
+        return await metrics.timed(endpoint, "indicators", _technical_from_state(request.symbol, request.period, df))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Technical analysis error: {str(e)}")
 
@@ -196,140 +359,454 @@ async def technical_analysis(request: AnalysisRequest):
 async def predict_price(request: AnalysisRequest):
     """簡易的な価格予測 (線形回帰ベース)"""
     try:
-        from sklearn.linear_model import LinearRegression
-        from sklearn.preprocessing import StandardScaler
-        
-        ticker = yf.Ticker(request.symbol)
-        df = ticker.history(period=request.period)
-        
-        if len(df) < 30:
-            raise HTTPException(status_code=400, detail="Insufficient data for prediction")
-        
-        # 特徴量の準備
-        df['Returns'] = df['Close'].pct_change()
-        df['SMA_5'] = ta.trend.sma_indicator(df['Close'], window=5)
-        df['SMA_20'] = ta.trend.sma_indicator(df['Close'], window=20)
-        df['RSI'] = ta.momentum.rsi(df['Close'], window=14)
-        df['Volume_Change'] = df['Volume'].pct_change()
-        
-        df = df.dropna()
-        
-        # 特徴量とターゲットの準備
-        features = ['Returns', 'SMA_5', 'SMA_20', 'RSI', 'Volume_Change']
-        X = df[features].values
-        y = df['Close'].values
-        
-        # 訓練データとテストデータに分割
-        train_size = int(len(X) * 0.8)
-        X_train, X_test = X[:train_size], X[train_size:]
-        y_train, y_test = y[:train_size], y[train_size:]
-        
-        # スケーリング
-        scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
-        
-        # モデル訓練
-        model = LinearRegression()
-        model.fit(X_train_scaled, y_train)
-        
-        # 予測
-        predictions = model.predict(X_test_scaled)
-        
-        # 次の5日間の予測
-        last_features = X_test_scaled[-1].reshape(1, -1)
-        future_predictions = []
-        
-        for i in range(5):
-            pred = model.predict(last_features)[0]
-            future_predictions.append(float(pred))
-        
-        current_price = float(df['Close'].iloc[-1])
-        avg_prediction = np.mean(future_predictions)
-        
-        # 推奨判定
-        price_change_pct = ((avg_prediction - current_price) / current_price) * 100
+        endpoint = "/api/stock/prediction"
+        df = await metrics.timed(endpoint, "fetch", run_io(market_data.get_history, request.symbol, request.period))
+        return await metrics.timed(endpoint, "model", run_cpu(analysis.compute_prediction, request.symbol, df, request.period))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Prediction error: {str(e)}")
+
+@app.post("/api/stock/model-prediction")
+async def model_prediction(request: ModelPredictionRequest):
+    """登録済みのLSTM/GRUモデルで価格を予測 (読み込み済みモデルはメモリ上のプールから提供)"""
+    from model_registry import model_pool, registry as model_registry
+    
+    try:
+        version = await run_io(model_registry.latest, request.symbol, request.model_type.lower())
+        if version is None:
+            raise HTTPException(status_code=404, detail="No trained model registered for this symbol")
         
-        if price_change_pct > 2:
-            recommendation = "買い推奨"
-            confidence = min(abs(price_change_pct) * 10, 80)
-        elif price_change_pct < -2:
-            recommendation = "売り推奨"
-            confidence = min(abs(price_change_pct) * 10, 80)
-        else:
-            recommendation = "様子見"
-            confidence = 50
+        endpoint = "/api/stock/model-prediction"
+        predictor, cold_load, load_seconds = await metrics.timed(endpoint, "model_load", run_io(model_pool.get, version))
+        start = time.perf_counter()
+        predictions = await metrics.timed(endpoint, "model", run_io(predictor.predict_future, request.days))
+        predict_seconds = time.perf_counter() - start
         
         return {
             "symbol": request.symbol,
-            "current_price": current_price,
-            "predicted_prices": future_predictions,
-            "average_prediction": float(avg_prediction),
-            "price_change_percent": float(price_change_pct),
-            "recommendation": recommendation,
-            "confidence": float(confidence),
+            "model_type": version.model_type,
+            "model_version": version.id,
+            "data_end": version.data_end,
+            "predicted_prices": predictions,
+            "cold_load": cold_load,
+            "latency_ms": {
+                "cold_load" if cold_load else "warm_hit": round(load_seconds * 1000, 3),
+                "predict": round(predict_seconds * 1000, 3),
+            },
             "note": "※この予測は参考情報であり、投資判断は自己責任でお願いします",
             "updated_at": datetime.now().isoformat()
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Prediction error: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Model prediction error: {str(e)}")
+
+@app.post("/api/stock/model-prediction/batch")
+async def batch_model_prediction(request: BatchModelPredictionRequest):
+    """複数銘柄のLSTM/GRU予測をまとめて実行"""
+    from ml_models import predict_future_batch
+    from model_registry import model_pool, registry as model_registry
+    
+    try:
+        model_type = request.model_type.lower()
+        symbols = list(dict.fromkeys(request.symbols))
+        versions = await asyncio.gather(*(run_io(model_registry.latest, s, model_type) for s in symbols))
+        missing = [s for s, v in zip(symbols, versions) if v is None]
+        
+        start = time.perf_counter()
+        endpoint = "/api/stock/model-prediction/batch"
+        loaded = await metrics.timed(endpoint, "model_load", asyncio.gather(
+            *(run_io(model_pool.get, v) for v in versions if v is not None)
+        ))
+        load_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        predictions = await metrics.timed(
+            endpoint, "model", run_io(predict_future_batch, [p for p, _, _ in loaded], request.days)
+        )
+        predict_seconds = time.perf_counter() - start
+        
+        return {
+            "model_type": model_type,
+            "predictions": predictions,
+            "missing_models": missing,
+            "cold_loads": sum(1 for _, cold, _ in loaded if cold),
+            "latency_ms": {
+                "model_load": round(load_seconds * 1000, 3),
+                "predict": round(predict_seconds * 1000, 3),
+            },
+            "updated_at": datetime.now().isoformat()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Model prediction error: {str(e)}")
+
+@app.get("/api/models/pool")
+async def get_model_pool_stats():
+    """読み込み済みモデルのプールの統計情報"""
+    from model_registry import model_pool
+    
+    return model_pool.stats()
 
 @app.post("/api/stock/news")
 async def get_stock_news(stock: StockSymbol):
     """株式関連ニュースを取得"""
     try:
-        ticker = yf.Ticker(stock.symbol)
-        news = ticker.news
-        
-        news_list = []
-        for item in news[:10]:  # 最新10件
-            # センチメント分析
-            title = item.get('title', '')
-            sentiment_score = TextBlob(title).sentiment.polarity
-            
-            if sentiment_score > 0.1:
-                sentiment = "ポジティブ"
-            elif sentiment_score < -0.1:
-                sentiment = "ネガティブ"
-            else:
-                sentiment = "中立"
-            
-            news_list.append({
-                "title": title,
-                "publisher": item.get('publisher', 'Unknown'),
-                "link": item.get('link', ''),
-                "published_at": datetime.fromtimestamp(item.get('providerPublishTime', 0)).isoformat(),
-                "sentiment": sentiment,
-                "sentiment_score": float(sentiment_score)
-            })
-        
-        # 全体的なセンチメント
-        avg_sentiment = np.mean([n['sentiment_score'] for n in news_list]) if news_list else 0
-        
-        overall_sentiment = "中立"
-        if avg_sentiment > 0.1:
-            overall_sentiment = "ポジティブ"
-        elif avg_sentiment < -0.1:
-            overall_sentiment = "ネガティブ"
+        endpoint = "/api/stock/news"
+        news = await metrics.timed(endpoint, "fetch", run_io(market_data.get_news, stock.symbol))
+        # 見出しのスコアのキャッシュはこのプロセスにあるため、スレッドで実行する
+        return await metrics.timed(endpoint, "sentiment", run_io(analysis.score_news, stock.symbol, news))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"News fetch error: {str(e)}")
+
+@app.get("/api/sentiment/stats")
+async def get_sentiment_stats():
+    """見出しセンチメントのキャッシュの統計情報"""
+    return sentiment.get_pipeline().stats()
+
+@app.post("/api/stock/batch-technical-analysis")
+async def batch_technical_analysis(request: BatchAnalysisRequest):
+    """複数銘柄のテクニカル分析を一括で実行し、銘柄ごとの結果をNDJSONでストリーミング"""
+    symbols = list(dict.fromkeys(s.strip().upper() for s in request.symbols if s.strip()))
+    if not symbols:
+        raise HTTPException(status_code=400, detail="No symbols given")
+    if len(symbols) > BATCH_MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"Too many symbols (max {BATCH_MAX_SYMBOLS})")
+
+    chunks = [symbols[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(symbols), BATCH_CHUNK_SIZE)]
+
+    async def stream():
+        start = time.perf_counter()
+        completed = 0
+        # 次のチャンクのダウンロードを、現在のチャンクの計算と並行して進める
+        download = asyncio.ensure_future(run_io(market_data.get_history_batch, chunks[0], request.period))
+        for i, chunk in enumerate(chunks):
+            results = []
+            try:
+                frames = await download
+            except Exception as e:
+                frames = {}
+                results = [{"symbol": symbol, "error": f"Download error: {str(e)}"} for symbol in chunk]
+            if i + 1 < len(chunks):
+                download = asyncio.ensure_future(run_io(market_data.get_history_batch, chunks[i + 1], request.period))
+
+            if frames:
+                try:
+                    results = await metrics.timed(
+                        "/api/stock/batch-technical-analysis", "indicators",
+                        run_cpu(analysis.compute_panel_technical, frames),
+                    )
+                except Exception as e:
+                    results = [{"symbol": symbol, "error": f"Technical analysis error: {str(e)}"} for symbol in frames]
+            found = {r["symbol"] for r in results}
+            for symbol in chunk:
+                if symbol in found:
+                    continue
+                reason = "Insufficient data" if symbol in frames else "No data found"
+                results.append({"symbol": symbol, "error": reason})
+
+            for result in results:
+                completed += 1
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+
+        elapsed = time.perf_counter() - start
+        yield json.dumps({
+            "done": True,
+            "symbols": completed,
+            "elapsed_seconds": round(elapsed, 3),
+            "symbols_per_second": round(completed / elapsed, 2) if elapsed > 0 else None,
+        }) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/api/backtest")
+async def run_backtest(request: BacktestRequest):
+    """売買シグナルのルールを過去の全バーで検証 (パラメータの全組み合わせを評価)"""
+    try:
+        symbols = list(dict.fromkeys(s.strip().upper() for s in request.symbols if s.strip()))
+        if not symbols:
+            raise HTTPException(status_code=400, detail="No symbols given")
+        if len(symbols) > BATCH_MAX_SYMBOLS:
+            raise HTTPException(status_code=400, detail=f"Too many symbols (max {BATCH_MAX_SYMBOLS})")
+        
+        frames = await run_io(market_data.get_history_batch, symbols, request.period)
+        if not frames:
+            raise HTTPException(status_code=404, detail="No data found")
         
+        start = time.perf_counter()
+        ind = await run_cpu(
+            backtest.prepare_indicators,
+            analysis.build_panel(frames, 'High'), analysis.build_panel(frames, 'Low'), analysis.build_panel(frames, 'Close'),
+        )
+        grid = backtest.parameter_grid(
+            rsi_lower=request.rsi_lower, rsi_upper=request.rsi_upper,
+            entry_score=request.entry_score, exit_score=request.exit_score,
+            allow_short=[request.allow_short], cost=[request.cost],
+        )
+        results = await metrics.timed("/api/backtest", "backtest", run_io(backtest.sweep, ind, grid))
+        elapsed = time.perf_counter() - start
+        
+        summaries = [backtest.summarize(list(frames), r) for r in results]
+        summaries.sort(key=lambda s: s["summary"]["mean_return"] if s["summary"]["mean_return"] is not None else float("-inf"), reverse=True)
+        bars = int(np.isfinite(ind["Close"]).sum())
         return {
-            "symbol": stock.symbol,
-            "news": news_list,
-            "overall_sentiment": overall_sentiment,
-            "average_sentiment_score": float(avg_sentiment)
+            "symbols": list(frames),
+            "missing_symbols": [s for s in symbols if s not in frames],
+            "period": request.period,
+            "results": summaries,
+            "bars_processed": bars * len(grid),
+            "bars_per_second": round(bars * len(grid) / elapsed, 1) if elapsed > 0 else None,
+            "elapsed_seconds": round(elapsed, 4),
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"News fetch error: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Backtest error: {str(e)}")
+
+@app.post("/api/portfolio/analysis")
+async def analyze_portfolio(request: PortfolioRequest):
+    """保有銘柄全体の共分散・相関・ボラティリティ・VaR/CVaR・ベータを計算"""
+    try:
+        endpoint = "/api/portfolio/analysis"
+        holdings = {}
+        for symbol, weight in request.holdings.items():
+            symbol = symbol.strip().upper()
+            if symbol:
+                holdings[symbol] = holdings.get(symbol, 0.0) + weight
+        if not holdings:
+            raise HTTPException(status_code=400, detail="No holdings given")
+        if len(holdings) > BATCH_MAX_SYMBOLS:
+            raise HTTPException(status_code=400, detail=f"Too many symbols (max {BATCH_MAX_SYMBOLS})")
+        if not all(0 < c < 1 for c in request.confidence):
+            raise HTTPException(status_code=400, detail="Confidence levels must be between 0 and 1")
+        if request.window < 2:
+            raise HTTPException(status_code=400, detail="Window must be at least 2")
+        benchmark = request.benchmark.strip().upper() if request.benchmark else None
+
+        symbols = list(holdings) + ([benchmark] if benchmark and benchmark not in holdings else [])
+        frames = await metrics.timed(endpoint, "fetch", run_io(market_data.get_history_batch, symbols, request.period))
+        held = [s for s in holdings if s in frames]
+        if not held:
+            raise HTTPException(status_code=404, detail="No data found")
+        weights = np.array([holdings[s] for s in held], dtype=float)
+        if weights.sum() == 0:
+            raise HTTPException(status_code=400, detail="Weights must not sum to zero")
+
+        dates, columns, closes = await metrics.timed(endpoint, "align", run_io(portfolio.align_closes, frames))
+        bench = closes[:, columns.index(benchmark)] if benchmark in frames else None
+        closes = closes[:, [columns.index(s) for s in held]]
+        result = await metrics.timed(endpoint, "risk", run_cpu(
+            portfolio.analyze, dates, held, closes, weights / weights.sum(), bench,
+            tuple(request.confidence), request.window, request.matrices,
+        ))
+        # 行列は大きくなるため jsonable_encoder を通さずにそのままエンコードする
+        return JSONResponse({
+            **result,
+            "period": request.period,
+            "benchmark": benchmark if bench is not None else None,
+            "missing_symbols": [s for s in holdings if s not in frames],
+            "updated_at": datetime.now().isoformat(),
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Portfolio analysis error: {str(e)}")
+
+@app.post("/api/screener/query")
+async def query_screener(query: ScreenerQuery):
+    """スナップショットから条件に合う銘柄を絞り込み、指定列の順に並べて返す"""
+    snapshot = screener.builder.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Screener snapshot is not built yet")
+    try:
+        return snapshot.query(query.where, query.sort, query.descending, query.limit, query.columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/screener/rebuild")
+async def rebuild_screener(request: ScreenerRebuildRequest):
+    """スナップショットを今すぐ再構築 (前回以降の新しいバーだけを反映)
+
+    銘柄を指定した場合はその銘柄の行だけを更新し、他の銘柄の行は前回のまま残す。
+    """
+    if request.symbols:
+        symbols = list(dict.fromkeys(s.strip().upper() for s in request.symbols if s.strip()))
+    else:
+        symbols = training_scheduler.load_universe(screener.SCREENER_UNIVERSE)
+    if not symbols:
+        raise HTTPException(status_code=400, detail="No symbols given (set SCREENER_UNIVERSE)")
+    try:
+        return await run_io(screener.builder.rebuild, symbols, bool(request.symbols))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Screener rebuild error: {str(e)}")
+
+@app.get("/api/screener/stats")
+async def get_screener_stats():
+    """スナップショットの件数・サイズと前回の再構築の結果"""
+    return screener.builder.stats()
+
+@app.post("/api/alerts")
+async def create_alert(alert: PriceAlert):
+    """価格アラートを登録"""
+    try:
+        return await run_io(alert_engine.create, alert.symbol.strip().upper(), alert.target_price, alert.condition)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/alerts")
+async def list_alerts(active: Optional[bool] = None, symbol: Optional[str] = None):
+    """登録済みのアラート (active=false で発火済みのもの)"""
+    return await run_io(alert_engine.list, active, symbol.upper() if symbol else None)
+
+@app.delete("/api/alerts/{alert_id}")
+async def delete_alert(alert_id: int):
+    """アラートを削除"""
+    if not await run_io(alert_engine.delete, alert_id):
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return {"deleted": alert_id}
+
+@app.post("/api/alerts/check")
+async def check_alerts():
+    """有効なアラートのある銘柄の価格を一括取得して今すぐ評価"""
+    try:
+        if WEB_CONCURRENCY > 1:
+            # 他のワーカーでの追加・削除・発火を反映してから評価する
+            await run_io(alert_engine.refresh)
+        symbols = alert_engine.symbols()
+        quotes = await run_io(market_data.get_quotes, symbols)
+        return {"quotes": quotes, "triggered": await run_io(alert_engine.evaluate, quotes)}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Alert check error: {str(e)}")
+
+@app.post("/api/watchlist")
+async def add_to_watchlist(item: WatchlistAdd):
+    """ウォッチリストに追加 (目標価格があれば現在値との位置関係からアラートを登録)"""
+    try:
+        symbol = item.symbol.strip().upper()
+        quotes = await run_io(market_data.get_quotes, [symbol])
+        if symbol not in quotes:
+            raise HTTPException(status_code=404, detail="No data found")
+        alert = None
+        if item.target_price is not None:
+            condition = "above" if item.target_price >= quotes[symbol] else "below"
+            alert = await run_io(alert_engine.create, symbol, item.target_price, condition)
+        return {"symbol": symbol, "current_price": quotes[symbol], "alert": alert}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Watchlist error: {str(e)}")
+
+def _stream_symbols(symbols) -> list:
+    if not isinstance(symbols, list) or not all(isinstance(s, str) for s in symbols):
+        raise ValueError("symbols must be a list of strings")
+    symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+    if len(symbols) > streaming.STREAM_MAX_SYMBOLS:
+        raise ValueError(f"Too many symbols (max {streaming.STREAM_MAX_SYMBOLS})")
+    return symbols
+
+@app.websocket("/ws/stream")
+async def stream_websocket(websocket: WebSocket):
+    """価格と指標の差分を配信 ({"action": "subscribe" | "unsubscribe", "symbols": [...]} で購読を変更)"""
+    await websocket.accept()
+    subscription = streaming.Subscription()
+
+    async def send():
+        while True:
+            for message in await subscription.get():
+                await websocket.send_json(message)
+
+    sender = asyncio.create_task(send())
+    try:
+        while True:
+            try:
+                # 不正な JSON やオブジェクト以外の JSON でも接続は切らずにエラーを返す
+                request = json.loads(await websocket.receive_text())
+                if not isinstance(request, dict):
+                    raise ValueError('Messages must be JSON objects: {"action": ..., "symbols": [...]}')
+                symbols = _stream_symbols(request.get("symbols", []))
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            if request.get("action") == "unsubscribe":
+                stream_hub.unsubscribe(subscription, symbols)
+            elif len(subscription.symbols | set(symbols)) > streaming.STREAM_MAX_SYMBOLS:
+                await websocket.send_json({"type": "error", "detail": f"Too many symbols (max {streaming.STREAM_MAX_SYMBOLS})"})
+            else:
+                stream_hub.subscribe(subscription, symbols)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        stream_hub.unsubscribe(subscription)
+
+@app.get("/api/stream")
+async def stream_events(symbols: str):
+    """価格と指標の差分を Server-Sent Events で配信 (symbols はカンマ区切り)"""
+    try:
+        symbol_list = _stream_symbols(symbols.split(","))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not symbol_list:
+        raise HTTPException(status_code=400, detail="No symbols given")
+
+    async def events():
+        subscription = streaming.Subscription()
+        stream_hub.subscribe(subscription, symbol_list)
+        try:
+            while True:
+                try:
+                    messages = await asyncio.wait_for(subscription.get(), timeout=streaming.STREAM_POLL_INTERVAL * 2)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                for message in messages:
+                    yield f"event: {message['type']}\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+        finally:
+            stream_hub.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/stream/stats")
+async def get_stream_stats():
+    """配信中の銘柄・購読数・取得回数"""
+    return stream_hub.stats()
+
+async def _timed(timings: dict, stage: str, awaitable):
+    """処理時間をミリ秒で timings[stage] に記録する (段階ごとのヒストグラムにも記録)"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        elapsed = time.perf_counter() - start
+        timings[stage] = round(elapsed * 1000, 2)
+        metrics.STAGE_LATENCY.observe(elapsed, "/api/stock/comprehensive-analysis", stage)
+
+async def _history_stages(request: AnalysisRequest, timings: dict):
+    """履歴を1回だけ取得し、テクニカル分析と価格予測で共有する"""
+    df = await _timed(timings, "fetch", run_io(market_data.get_history, request.symbol, request.period))
+    if df.empty:
+        raise HTTPException(status_code=404, detail="No data found")
+    return await asyncio.gather(
+        _timed(timings, "indicators", _technical_from_state(request.symbol, request.period, df)),
+        _timed(timings, "model", run_cpu(analysis.compute_prediction, request.symbol, df, request.period)),
+    )
+
+async def _news_stage(symbol: str, timings: dict):
+    news = await _timed(timings, "fetch_news", run_io(market_data.get_news, symbol))
+    return await _timed(timings, "sentiment", run_io(analysis.score_news, symbol, news))
 
 @app.post("/api/stock/comprehensive-analysis")
 async def comprehensive_analysis(request: AnalysisRequest):
     """総合分析 - テクニカル、ファンダメンタル、ニュースを統合"""
     try:
-        # 各分析を実行
-        technical = await technical_analysis(request)
-        prediction = await predict_price(request)
-        stock_info = await get_stock_info(StockSymbol(symbol=request.symbol))
-        news = await get_stock_news(StockSymbol(symbol=request.symbol))
+        # 各分析を並行して実行
+        timings = {}
+        start = time.perf_counter()
+        (technical, prediction), info, news = await asyncio.gather(
+            _history_stages(request, timings),
+            _timed(timings, "fetch_info", run_io(market_data.get_info, request.symbol)),
+            _news_stage(request.symbol, timings),
+        )
+        stock_info = analysis.build_stock_info(request.symbol, info)
+        timings["total"] = round((time.perf_counter() - start) * 1000, 2)
         
         # スコアリング
         score = 50  # 基準点
@@ -378,6 +855,7 @@ async def comprehensive_analysis(request: AnalysisRequest):
             "news_sentiment": news,
             "summary": f"{stock_info['name']}の総合スコアは{score}点です。{overall_recommendation}と判断されます。",
             "disclaimer": "※この分析は参考情報です。最終的な投資判断はご自身の責任で行ってください。",
+            "timings_ms": timings,
             "updated_at": datetime.now().isoformat()
         }
     except Exception as e:
@@ -385,4 +863,5 @@ async def comprehensive_analysis(request: AnalysisRequest):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # 複数ワーカーの場合、uvicorn は各ワーカーでアプリを import し直すため文字列で渡す
+    uvicorn.run("main:app" if WEB_CONCURRENCY > 1 else app, host="0.0.0.0", port=8000, workers=WEB_CONCURRENCY)
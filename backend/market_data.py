@@ -0,0 +1,263 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import metrics
+import providers
+import shared_cache
+from bar_store import BarStore
+from bars import OHLCV_COLUMNS, BarFrame
+
+# 期間の長さ順 (長い期間のキャッシュで短い期間の要求を満たすために使用)
+# ytd は長さが時期によって変わるため、1y 以上のキャッシュからのみ切り出す
+PERIOD_ORDER = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "max"]
+
+_PERIOD_OFFSETS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+CACHE_TTL = float(os.getenv("MARKET_DATA_TTL", "300"))
+CACHE_SIZE = int(os.getenv("MARKET_DATA_CACHE_SIZE", "1024"))
+# ニュースのキャッシュ期間 (秒)
+NEWS_TTL = float(os.getenv("NEWS_TTL", "600"))
+# 銘柄の基本情報を共有キャッシュに置く期間 (秒)
+INFO_TTL = float(os.getenv("INFO_TTL", "300"))
+
+
+def period_start(index: pd.DatetimeIndex, period: str) -> int:
+    """昇順のインデックスで指定期間が始まる位置"""
+    if len(index) == 0 or period == "max":
+        return 0
+    if period == "1d":
+        return int(index.searchsorted(index[-1].normalize(), side="left"))
+    if period == "5d":
+        days = index.normalize().unique()
+        return int(index.searchsorted(days[-5:][0], side="left"))
+    if period == "ytd":
+        return int(index.searchsorted(index[-1].replace(month=1, day=1).normalize(), side="left"))
+    offset = _PERIOD_OFFSETS.get(period)
+    if offset is None:
+        raise ValueError(f"未対応の期間です: {period}")
+    return int(index.searchsorted(index[-1] - offset, side="right"))
+
+
+def slice_period(df: pd.DataFrame, period: str) -> pd.DataFrame:
+    """長い期間のデータから指定期間分を切り出す"""
+    return df.iloc[period_start(df.index, period):]
+
+
+class BarCache:
+    """(銘柄, 足種, 期間) をキーとした TTL + LRU の OHLCV キャッシュ
+
+    エントリは DataFrame ではなく bars.BarFrame で持ち、取り出すたびに新しい DataFrame を作る。
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, bars = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return bars
+
+    def get(self, symbol: str, period: str, interval: str = "1d"):
+        """キャッシュからデータを取得 (より長い期間のエントリがあれば切り出して返す)"""
+        if period == "ytd":
+            candidates = ["ytd"] + PERIOD_ORDER[PERIOD_ORDER.index("1y"):]
+        elif period in PERIOD_ORDER:
+            candidates = PERIOD_ORDER[PERIOD_ORDER.index(period):]
+        else:
+            candidates = [period]
+        with self._lock:
+            for cached_period in candidates:
+                bars = self._lookup((symbol, interval, cached_period))
+                if bars is None:
+                    continue
+                self.hits += 1
+                break
+            else:
+                self.misses += 1
+                return None
+        start = period_start(bars.index, period) if cached_period != period else 0
+        return bars.to_frame(start)
+
+    def put(self, symbol: str, period: str, interval: str, df) -> pd.DataFrame:
+        """データ (DataFrame または BarFrame) をキャッシュに格納し、格納した内容の DataFrame を返す
+
+        価格は既定で float32 に丸めて持つ (BAR_CACHE_DTYPE) ため、初回と2回目以降で同じ値が返るように戻り値を使う。
+        """
+        bars = df if isinstance(df, BarFrame) else BarFrame.from_frame(df)
+        with self._lock:
+            key = (symbol, interval, period)
+            self._entries[key] = (time.monotonic(), bars)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return bars.to_frame()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """ヒット/ミス/追い出しのカウンタ"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "nbytes": sum(bars.nbytes for _, bars in self._entries.values()),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+bar_cache = BarCache()
+bar_store = BarStore()
+
+
+def _fetch(symbol: str, interval: str, period: str = None, start: str = None) -> pd.DataFrame:
+    """プロバイダからOHLCVを取得 (period 指定で全期間、start 指定で末尾のみ)"""
+    return providers.client.history(symbol, interval, period=period, start=start)
+
+
+def get_history(symbol: str, period: str = "1mo", interval: str = "1d") -> pd.DataFrame:
+    """OHLCVデータを取得 (プロバイダへの履歴の問い合わせは全てここを経由する)
+
+    メモリキャッシュ → ワーカー間の共有キャッシュ → ローカルのバーストア → プロバイダの順に参照する。
+    共有キャッシュにない場合にバーストアを読む (必要ならプロバイダから取得する) のは1つのワーカーだけ。
+    """
+    df = bar_cache.get(symbol, period, interval)
+    if df is not None:
+        return df
+
+    def load():
+        df = slice_period(bar_store.read_through(symbol, period, interval, _fetch), period)
+        return BarFrame.from_frame(df) if not df.empty else None
+
+    bars = shared_cache.cache.single_flight(_shared_key(symbol, interval, period), load, CACHE_TTL)
+    if bars is None:
+        return pd.DataFrame(columns=list(OHLCV_COLUMNS), dtype=float)
+    return bar_cache.put(symbol, period, interval, bars)
+
+
+def _shared_key(symbol: str, interval: str, period: str) -> str:
+    return f"bars:{symbol}:{interval}:{period}"
+
+
+def get_history_batch(symbols: list, period: str = "1mo", interval: str = "1d") -> dict:
+    """複数銘柄のOHLCVをまとめて取得 (キャッシュにない銘柄は1回の一括ダウンロードで取得)"""
+    frames = {}
+    missing = []
+    for symbol in symbols:
+        df = bar_cache.get(symbol, period, interval)
+        if df is None:
+            missing.append(symbol)
+        else:
+            frames[symbol] = df
+
+    if missing:
+        shared = shared_cache.cache.get_many([_shared_key(symbol, interval, period) for symbol in missing])
+        for symbol in missing:
+            bars = shared.get(_shared_key(symbol, interval, period))
+            if bars is not None:
+                frames[symbol] = bar_cache.put(symbol, period, interval, bars)
+        missing = [symbol for symbol in missing if symbol not in frames]
+
+    if missing:
+        raw = providers.client.download(missing, period, interval)
+        fetched = {}
+        for symbol in missing:
+            if isinstance(raw.columns, pd.MultiIndex):
+                if symbol not in raw.columns.get_level_values(0):
+                    continue
+                df = raw[symbol]
+            else:
+                df = raw
+            df = df.dropna(how="all")
+            if df.empty:
+                continue
+            fetched[_shared_key(symbol, interval, period)] = bars = BarFrame.from_frame(df)
+            frames[symbol] = bar_cache.put(symbol, period, interval, bars)
+        shared_cache.cache.set_many(fetched, CACHE_TTL)
+
+    return {symbol: frames[symbol] for symbol in symbols if symbol in frames}
+
+
+def get_quotes(symbols: list) -> dict:
+    """複数銘柄の直近価格を1回の一括ダウンロードで取得 (キャッシュは使わない)"""
+    if not symbols:
+        return {}
+    raw = providers.client.download(symbols, "1d", "1m", kind="quotes")
+    quotes = {}
+    for symbol in symbols:
+        if isinstance(raw.columns, pd.MultiIndex):
+            if symbol not in raw.columns.get_level_values(0):
+                continue
+            close = raw[symbol]["Close"]
+        else:
+            close = raw["Close"]
+        close = close.dropna()
+        if not close.empty:
+            quotes[symbol] = float(close.iloc[-1])
+    return quotes
+
+
+def get_info(symbol: str) -> dict:
+    """銘柄の基本情報を取得 (INFO_TTL 秒間はワーカー間で共有する)"""
+    return shared_cache.cache.single_flight(f"info:{symbol}", lambda: providers.client.info(symbol), INFO_TTL)
+
+
+_news_cache = OrderedDict()  # 銘柄 -> (取得時刻, ニュース)
+_news_lock = threading.Lock()
+
+
+def get_news(symbol: str) -> list:
+    """銘柄のニュースを取得 (NEWS_TTL 秒間はキャッシュを返す)"""
+    now = time.monotonic()
+    with _news_lock:
+        entry = _news_cache.get(symbol)
+        if entry is not None and now - entry[0] <= NEWS_TTL:
+            _news_cache.move_to_end(symbol)
+            metrics.CACHE_LOOKUPS.inc("news", "hit")
+            return list(entry[1])
+    metrics.CACHE_LOOKUPS.inc("news", "miss")
+    news = shared_cache.cache.single_flight(f"news:{symbol}", lambda: providers.client.news(symbol), NEWS_TTL)
+    with _news_lock:
+        _news_cache[symbol] = (now, news)
+        _news_cache.move_to_end(symbol)
+        while len(_news_cache) > CACHE_SIZE:
+            _news_cache.popitem(last=False)
+    return list(news)
+
+
+def cache_stats() -> dict:
+    return bar_cache.stats()
@@ -0,0 +1,182 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# 処理時間・キャッシュ・プロバイダ呼び出しの計測 (Prometheus のテキスト形式で出力)
+#
+# エンドポイントごとの段階 (fetch, indicators, model, sentiment, serialization など) の
+# 処理時間をヒストグラムに記録する。キャッシュのヒット率などの値は collector として
+# 登録した関数から出力時に集める。
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# 秒単位のバケット境界
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: tuple, values: tuple, extra: dict = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """ラベルごとの単調増加カウンタ"""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, count in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(count)}")
+        return lines
+
+
+class Histogram:
+    """ラベルごとの累積バケット付きヒストグラム"""
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # ラベル値 -> [バケットごとの件数..., 合計, 件数]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def summary(self) -> dict:
+        """ラベルごとの件数と平均 (JSON 出力用)"""
+        with self._lock:
+            return {
+                "/".join(values): {"count": s[-1], "mean_ms": round(s[-2] / s[-1] * 1000, 3) if s[-1] else None}
+                for values, s in sorted(self._series.items())
+            }
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    labels = _format_labels(self.labels, values, {"le": _format_value(bound)})
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, values)
+                lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "stock_api_request_seconds", "Request latency by endpoint", ("method", "endpoint", "status"),
+)
+STAGE_LATENCY = Histogram(
+    "stock_api_stage_seconds", "Latency of each processing stage by endpoint", ("endpoint", "stage"),
+)
+UPSTREAM_CALLS = Counter("stock_api_upstream_calls_total", "Market data provider calls", ("kind",))
+UPSTREAM_ERRORS = Counter("stock_api_upstream_errors_total", "Failed market data provider calls", ("kind",))
+UPSTREAM_LATENCY = Histogram("stock_api_upstream_seconds", "Market data provider call latency", ("kind",))
+UPSTREAM_RETRIES = Counter("stock_api_upstream_retries_total", "Retried market data provider calls", ("kind",))
+UPSTREAM_COALESCED = Counter(
+    "stock_api_upstream_coalesced_total", "Requests served by an identical in-flight provider call", ("kind",),
+)
+UPSTREAM_THROTTLED = Counter(
+    "stock_api_upstream_throttled_seconds_total", "Time spent waiting for the provider rate limiter", ("kind",),
+)
+CACHE_LOOKUPS = Counter("stock_api_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"))
+COLLECTOR_ERRORS = Counter(
+    "stock_api_metrics_collector_errors_total", "Metric collectors that raised while rendering", ("collector",),
+)
+
+_metrics = [
+    REQUEST_LATENCY, STAGE_LATENCY, UPSTREAM_CALLS, UPSTREAM_ERRORS, UPSTREAM_LATENCY,
+    UPSTREAM_RETRIES, UPSTREAM_COALESCED, UPSTREAM_THROTTLED, CACHE_LOOKUPS, COLLECTOR_ERRORS,
+]
+_collectors = []
+
+
+def register_collector(fn):
+    """出力時に呼ばれ、[(メトリクス名, 種別, 説明, {ラベル: 値} のリスト と 値の組)] を返す関数を登録"""
+    _collectors.append(fn)
+    return fn
+
+
+@contextmanager
+def stage(endpoint: str, name: str):
+    """with ブロックの処理時間を段階として記録"""
+    with STAGE_LATENCY.time(endpoint, name):
+        yield
+
+
+async def timed(endpoint: str, name: str, awaitable):
+    """awaitable の完了までの時間を段階として記録"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, endpoint, name)
+
+
+def render() -> str:
+    """Prometheus のテキスト形式で全メトリクスを出力"""
+    # collector の失敗を同じ出力の COLLECTOR_ERRORS に含めるため、collector を先に呼ぶ
+    collected = []
+    for collector in _collectors:
+        try:
+            collected.extend(collector())
+        except Exception:
+            logger.exception("metrics collector %s failed", collector.__name__)
+            COLLECTOR_ERRORS.inc(collector.__name__)
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for name, kind, help, samples in collected:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
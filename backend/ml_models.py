@@ -1,15 +1,44 @@
 import numpy as np
 import pandas as pd
 from sklearn.preprocessing import MinMaxScaler
-from tensorflow import keras
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, GRU, Dense, Dropout
-from tensorflow.keras.optimizers import Adam
-import yfinance as yf
 from datetime import datetime, timedelta
 import pickle
 import os
 
+import bars
+import indicators
+import market_data
+from sequences import iter_batches, sliding_windows, to_tf_dataset
+
+# TensorFlow は読み込みに数秒かかるため、モデルの構築・推論・読み込みで初めて import する
+
+# 予測に使う過去データの日数
+SEQUENCE_LENGTH = 60
+
+# モデルの入力特徴量 (先頭が予測対象の Close)
+FEATURE_COLUMNS = ['Close', 'Volume', 'Returns', 'Volume_Change', 
+                   'High_Low_Diff', 'Close_Open_Diff', 'SMA_5', 'SMA_20', 
+                   'RSI', 'MACD', 'BB_Upper', 'BB_Lower']
+
+# prepare_data が OHLCV に加えて計算する列 (いずれかが欠損の行は除く)
+PREPARED_COLUMNS = ['Returns', 'Volume_Change', 'High_Low_Diff', 'Close_Open_Diff',
+                    'SMA_5', 'SMA_20', 'SMA_50', 'EMA_12', 'EMA_26', 'RSI', 'MACD', 'MACD_Signal',
+                    'BB_Middle', 'BB_Std', 'BB_Upper', 'BB_Lower']
+
+
+def _fill_gaps(values: np.ndarray):
+    """欠損を直前の値で、先頭の欠損を最初の有効値で埋める (その場で書き換える)"""
+    missing = np.isnan(values)
+    if not missing.any():
+        return
+    idx = np.where(missing, 0, np.arange(len(values)))
+    np.maximum.accumulate(idx, out=idx)
+    values[:] = values[idx]
+    if np.isnan(values[0]):
+        valid = np.flatnonzero(~np.isnan(values))
+        if len(valid):
+            values[:valid[0]] = values[valid[0]]
+
 class StockPricePredictor:
     """LSTMとGRUを使った株価予測モデル"""
     
@@ -18,58 +47,90 @@ class StockPricePredictor:
         self.model_type = model_type.lower()
         self.model = None
         self.scaler = MinMaxScaler(feature_range=(0, 1))
-        self.sequence_length = 60  # 60日分のデータで予測
+        self.sequence_length = SEQUENCE_LENGTH  # 60日分のデータで予測
+        self.feature_columns = list(FEATURE_COLUMNS)
+        self.data_end = None  # 訓練に使ったデータの最終日
+        self._infer = None
+        self._infer_model = None
+        
+    def prepare_data(self, data: pd.DataFrame, target_column: str = 'Close') -> pd.DataFrame:
+        """データの前処理 (OHLCV と特徴量の DataFrame を返す)"""
+        return self.prepare_features(data).to_frame()
+    
+    def prepare_features(self, data: pd.DataFrame) -> bars.FeatureFrame:
+        """prepare_data と同じ列を、事前に確保した1つの配列へ書き込んで返す (クラス内の訓練・推論用)"""
+        frame = bars.FeatureFrame(bars.epoch_seconds(data.index),
+                                  str(data.index.tz) if data.index.tz is not None else None,
+                                  list(bars.OHLCV_COLUMNS) + PREPARED_COLUMNS)
+        
+        # 欠損値の処理 (前の値、先頭は後の値で埋める)
+        for column in bars.OHLCV_COLUMNS:
+            values = frame.column(column)
+            values[:] = data[column].to_numpy(dtype=float)
+            _fill_gaps(values)
         
-    def prepare_data(self, data: pd.DataFrame, target_column: str = 'Close'):
-        """データの前処理"""
-        # 欠損値の処理
-        data = data.fillna(method='ffill').fillna(method='bfill')
+        close = frame['Close']
+        volume = frame['Volume']
         
         # 特徴量の追加
-        data['Returns'] = data['Close'].pct_change()
-        data['Volume_Change'] = data['Volume'].pct_change()
-        data['High_Low_Diff'] = data['High'] - data['Low']
-        data['Close_Open_Diff'] = data['Close'] - data['Open']
-        
-        # テクニカル指標
-        data['SMA_5'] = data['Close'].rolling(window=5).mean()
-        data['SMA_20'] = data['Close'].rolling(window=20).mean()
-        data['SMA_50'] = data['Close'].rolling(window=50).mean()
-        data['EMA_12'] = data['Close'].ewm(span=12).mean()
-        data['EMA_26'] = data['Close'].ewm(span=26).mean()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = frame.column('Returns')
+            returns[0] = np.nan
+            np.divide(close[1:], close[:-1], out=returns[1:])
+            returns[1:] -= 1
+            volume_change = frame.column('Volume_Change')
+            volume_change[0] = np.nan
+            np.divide(volume[1:], volume[:-1], out=volume_change[1:])
+            volume_change[1:] -= 1
+        np.subtract(frame['High'], frame['Low'], out=frame.column('High_Low_Diff'))
+        np.subtract(close, frame['Open'], out=frame.column('Close_Open_Diff'))
+        
+        # テクニカル指標 (指標エンジンで計算するが、値は訓練済みモデルの入力と同じ従来の定義のまま:
+        # EMA は ewm(adjust=True)、RSI は14日の単純平均、ボリンジャーバンドは不偏標準偏差)
+        # 結果は一時配列を作らずにフレームの列へ直接書き込む
+        indicators.sma(close, 5, out=frame.column('SMA_5'))
+        indicators.sma(close, 20, out=frame.column('SMA_20'))
+        indicators.sma(close, 50, out=frame.column('SMA_50'))
+        indicators.ema(close, span=12, adjust=True, out=frame.column('EMA_12'))
+        indicators.ema(close, span=26, adjust=True, out=frame.column('EMA_26'))
         
         # RSI
-        delta = data['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        data['RSI'] = 100 - (100 / (1 + rs))
+        delta = np.diff(close, prepend=np.nan)
+        gain = indicators.sma(np.where(delta > 0, delta, 0.0), 14)
+        loss = indicators.sma(np.where(delta < 0, -delta, 0.0), 14)
+        rsi = frame.column('RSI')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            np.divide(gain, loss, out=rsi)
+            rsi += 1
+            np.divide(100, rsi, out=rsi)
+            np.subtract(100, rsi, out=rsi)
         
         # MACD
-        data['MACD'] = data['EMA_12'] - data['EMA_26']
-        data['MACD_Signal'] = data['MACD'].ewm(span=9).mean()
+        macd_line = frame.column('MACD')
+        np.subtract(frame['EMA_12'], frame['EMA_26'], out=macd_line)
+        indicators.ema(macd_line, span=9, adjust=True, out=frame.column('MACD_Signal'))
         
         # ボリンジャーバンド
-        data['BB_Middle'] = data['Close'].rolling(window=20).mean()
-        data['BB_Std'] = data['Close'].rolling(window=20).std()
-        data['BB_Upper'] = data['BB_Middle'] + (data['BB_Std'] * 2)
-        data['BB_Lower'] = data['BB_Middle'] - (data['BB_Std'] * 2)
+        frame['BB_Middle'] = frame['SMA_20']
+        bb_std = indicators.rolling_std(close, 20, ddof=1, out=frame.column('BB_Std'))
+        upper, lower = frame.column('BB_Upper'), frame.column('BB_Lower')
+        np.multiply(bb_std, 2, out=upper)
+        np.subtract(frame['BB_Middle'], upper, out=lower)
+        upper += frame['BB_Middle']
         
         # 欠損値を削除
-        data = data.dropna()
-        
-        return data
+        return frame.dropna()
     
     def create_sequences(self, data: np.ndarray):
-        """時系列データをシーケンスに変換"""
-        X, y = [], []
-        for i in range(self.sequence_length, len(data)):
-            X.append(data[i-self.sequence_length:i])
-            y.append(data[i, 0])  # Closeの値
-        return np.array(X), np.array(y)
+        """時系列データをシーケンスに変換 (X はコピーを伴わないストライドビュー)"""
+        return sliding_windows(data, self.sequence_length)
     
     def build_model(self, input_shape):
         """モデルの構築"""
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import LSTM, GRU, Dense, Dropout
+        from tensorflow.keras.optimizers import Adam
+        
         model = Sequential()
         
         if self.model_type == "lstm":
@@ -94,89 +155,108 @@ class StockPricePredictor:
         
         return model
     
-    def train(self, period: str = "2y", epochs: int = 50, batch_size: int = 32):
-        """モデルの訓練"""
+    def train(self, period: str = "2y", epochs: int = 50, batch_size: int = 32, verbose: int = 1,
+              df: pd.DataFrame = None, callbacks: list = None):
+        """モデルの訓練 (df を渡した場合はデータを取得せずにそれを使う)"""
         # データ取得
-        ticker = yf.Ticker(self.symbol)
-        df = ticker.history(period=period)
+        if df is None:
+            df = market_data.get_history(self.symbol, period)
         
         if len(df) < self.sequence_length + 100:
             raise ValueError("訓練に十分なデータがありません")
         
         # データ準備
-        df = self.prepare_data(df)
+        features = self.prepare_features(df)
+        self.data_end = features.end
         
         # 特徴量の選択
-        feature_columns = ['Close', 'Volume', 'Returns', 'Volume_Change', 
-                          'High_Low_Diff', 'Close_Open_Diff', 'SMA_5', 'SMA_20', 
-                          'RSI', 'MACD', 'BB_Upper', 'BB_Lower']
-        
-        data = df[feature_columns].values
+        data = features.select(self.feature_columns)
         
         # スケーリング
-        scaled_data = self.scaler.fit_transform(data)
+        scaled_data = self.scaler.fit_transform(data).astype(np.float32)
         
-        # シーケンス作成
+        # シーケンス作成 (ビューのまま保持し、バッチ単位でのみコピーする)
         X, y = self.create_sequences(scaled_data)
         
         # 訓練/テストデータ分割
         split = int(0.8 * len(X))
-        X_train, X_test = X[:split], X[split:]
-        y_train, y_test = y[:split], y[split:]
+        train_idx, test_idx = np.arange(split), np.arange(split, len(X))
+        n_features = X.shape[2]
+        train_ds = to_tf_dataset(
+            lambda: iter_batches(X, y, batch_size, train_idx, shuffle=True),
+            self.sequence_length, n_features,
+        )
+        test_ds = to_tf_dataset(
+            lambda: iter_batches(X, y, batch_size, test_idx),
+            self.sequence_length, n_features,
+        )
         
         # モデル構築
-        self.model = self.build_model((X_train.shape[1], X_train.shape[2]))
+        self.model = self.build_model((self.sequence_length, n_features))
         
         # 訓練
         history = self.model.fit(
-            X_train, y_train,
+            train_ds,
             epochs=epochs,
-            batch_size=batch_size,
-            validation_data=(X_test, y_test),
-            verbose=1
+            validation_data=test_ds,
+            callbacks=callbacks,
+            verbose=verbose
         )
         
         return history
     
-    def predict_future(self, days: int = 5):
-        """将来の価格を予測"""
-        if self.model is None:
-            raise ValueError("モデルが訓練されていません")
-        
-        # 最新データ取得
-        ticker = yf.Ticker(self.symbol)
-        df = ticker.history(period="1y")
-        df = self.prepare_data(df)
-        
-        feature_columns = ['Close', 'Volume', 'Returns', 'Volume_Change', 
-                          'High_Low_Diff', 'Close_Open_Diff', 'SMA_5', 'SMA_20', 
-                          'RSI', 'MACD', 'BB_Upper', 'BB_Lower']
+    def _inference_fn(self):
+        """グラフモードでコンパイルした推論関数 (model.predict より呼び出しコストが小さい)"""
+        if self._infer is None or self._infer_model is not self.model:
+            import tensorflow as tf
+            
+            model = self.model
+            self._infer = tf.function(
+                lambda x: model(x, training=False),
+                input_signature=[tf.TensorSpec([None, self.sequence_length, len(self.feature_columns)], tf.float32)],
+            )
+            self._infer_model = model
+        return self._infer
+    
+    def latest_sequence(self) -> np.ndarray:
+        """直近 sequence_length 日分のスケーリング済み特徴量"""
+        df = market_data.get_history(self.symbol, "1y")
+        data = self.prepare_features(df).select(self.feature_columns)
+        return self.scaler.transform(data[-self.sequence_length:])
+    
+    def forecast(self, sequences: np.ndarray, days: int) -> np.ndarray:
+        """複数の系列 (銘柄やシナリオ) をまとめて days 日先まで予測 (スケーリング済みの値を返す)
         
-        data = df[feature_columns].values
-        scaled_data = self.scaler.transform(data)
+        sequences は (系列数, sequence_length, 特徴量数)。1ステップにつき1回のバッチ推論を行い、
+        予測値は事前に確保したバッファへ書き込んで次のステップの入力にする。
+        """
+        import tensorflow as tf
         
-        # 最新のシーケンスを取得
-        last_sequence = scaled_data[-self.sequence_length:]
-        predictions = []
+        infer = self._inference_fn()
+        n, length, n_features = sequences.shape
+        buffer = np.empty((n, length + days, n_features), dtype=np.float32)
+        buffer[:, :length] = sequences
         
-        current_sequence = last_sequence.copy()
+        for step in range(days):
+            window = buffer[:, step:step + length]
+            pred = infer(tf.constant(window)).numpy()[:, 0]
+            # Close 以外の特徴量は直近の値を引き継ぐ
+            buffer[:, length + step] = buffer[:, length + step - 1]
+            buffer[:, length + step, 0] = pred
         
-        for _ in range(days):
-            # 予測
-            input_data = current_sequence.reshape(1, self.sequence_length, len(feature_columns))
-            pred_scaled = self.model.predict(input_data, verbose=0)
-            
-            # スケールを元に戻す
-            pred_row = np.zeros((1, len(feature_columns)))
-            pred_row[0, 0] = pred_scaled[0, 0]
-            pred_price = self.scaler.inverse_transform(pred_row)[0, 0]
-            
-            predictions.append(float(pred_price))
-            
-            # 次の入力のためにシーケンスを更新
-            current_sequence = np.vstack([current_sequence[1:], pred_scaled])
+        return buffer[:, length:, 0]
+    
+    def inverse_close(self, scaled: np.ndarray) -> np.ndarray:
+        """スケーリング済みの Close を価格に戻す"""
+        return (scaled - self.scaler.min_[0]) / self.scaler.scale_[0]
+    
+    def predict_future(self, days: int = 5):
+        """将来の価格を予測"""
+        if self.model is None:
+            raise ValueError("モデルが訓練されていません")
         
-        return predictions
+        scaled = self.forecast(self.latest_sequence()[np.newaxis], days)
+        return [float(p) for p in self.inverse_close(scaled[0])]
     
     def save_model(self, path: str):
         """モデルの保存"""
@@ -189,21 +269,56 @@ class StockPricePredictor:
     
     def load_model(self, path: str):
         """モデルの読み込み"""
+        from tensorflow import keras
+        
         self.model = keras.models.load_model(f"{path}/model_{self.symbol}.h5")
         with open(f"{path}/scaler_{self.symbol}.pkl", 'rb') as f:
             self.scaler = pickle.load(f)
 
+def predict_future_batch(predictors: list, days: int = 5) -> dict:
+    """複数銘柄の予測をまとめて実行 (同じモデルを共有する銘柄は1回のバッチ推論で処理)"""
+    groups = {}
+    for predictor in predictors:
+        if predictor.model is None:
+            raise ValueError(f"{predictor.symbol}: モデルが訓練されていません")
+        groups.setdefault(id(predictor.model), []).append(predictor)
+    
+    results = {}
+    for members in groups.values():
+        sequences = np.stack([p.latest_sequence() for p in members])
+        scaled = members[0].forecast(sequences, days)
+        for predictor, row in zip(members, scaled):
+            results[predictor.symbol] = [float(p) for p in predictor.inverse_close(row)]
+    return results
+
 def calculate_trading_signals(df: pd.DataFrame):
     """複数の指標から総合的な売買シグナルを生成"""
+    return evaluate_trading_signals(df.iloc[-1], df.iloc[-2])
+
+def calculate_trading_signals_from_state(state):
+    """ストリーミング指標 (streaming_indicators.IndicatorState) の現在値から売買シグナルを生成"""
+    def features(values):
+        return {
+            'Close': values['Close'],
+            'RSI': values['RSI'],
+            'MACD': values['MACD'],
+            'MACD_Signal': values['MACD_signal'],
+            'SMA_5': values['SMA_5'],
+            'SMA_20': values['SMA_20'],
+            'SMA_50': values['SMA_50'],
+            'BB_Upper': values['BB_upper'],
+            'BB_Lower': values['BB_lower'],
+        }
+    return evaluate_trading_signals(features(state.latest), features(state.previous))
+
+def evaluate_trading_signals(latest, previous):
+    """最新バーと1本前の指標値から売買シグナルを判定"""
     signals = {
         'buy_score': 0,
         'sell_score': 0,
         'signals': []
     }
     
-    latest = df.iloc[-1]
-    previous = df.iloc[-2]
-    
     # RSIシグナル
     if latest['RSI'] < 30:
         signals['buy_score'] += 2
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+from ml_models import FEATURE_COLUMNS, SEQUENCE_LENGTH, StockPricePredictor
+
+MODEL_REGISTRY_DIR = os.getenv(
+    "MODEL_REGISTRY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"),
+)
+# メモリ上に保持する訓練済みモデルの上限 (MB)
+MODEL_POOL_BUDGET_MB = float(os.getenv("MODEL_POOL_BUDGET_MB", "512"))
+
+
+def feature_set_id(feature_columns, sequence_length: int) -> str:
+    """特徴量の組み合わせとシーケンス長を識別する短いハッシュ"""
+    payload = json.dumps({"features": list(feature_columns), "sequence_length": sequence_length})
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+class ModelVersion:
+    """銘柄・モデル種別・特徴量セット・データ最終日で識別される訓練済みモデル"""
+
+    __slots__ = ("symbol", "model_type", "feature_set", "data_end")
+
+    def __init__(self, symbol: str, model_type: str, feature_set: str, data_end: str):
+        self.symbol = symbol
+        self.model_type = model_type
+        self.feature_set = feature_set
+        self.data_end = data_end
+
+    @property
+    def key(self) -> tuple:
+        return (self.symbol, self.model_type, self.feature_set, self.data_end)
+
+    @property
+    def id(self) -> str:
+        return "/".join(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, ModelVersion) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+class ModelRegistry:
+    """訓練済みモデルをバージョンごとにディスクへ保存・読み込みする"""
+
+    def __init__(self, root: str = MODEL_REGISTRY_DIR):
+        self.root = root
+
+    def _path(self, version: ModelVersion) -> str:
+        return os.path.join(self.root, version.symbol, version.model_type, version.feature_set, version.data_end)
+
+    def register(self, predictor: StockPricePredictor, metrics: dict = None) -> ModelVersion:
+        """訓練済みの予測器を新しいバージョンとして登録"""
+        if predictor.model is None or predictor.data_end is None:
+            raise ValueError("モデルが訓練されていません")
+        version = ModelVersion(
+            predictor.symbol,
+            predictor.model_type,
+            feature_set_id(predictor.feature_columns, predictor.sequence_length),
+            pd.Timestamp(predictor.data_end).strftime("%Y-%m-%d"),
+        )
+        path = self._path(version)
+        os.makedirs(path, exist_ok=True)
+        predictor.model.save(os.path.join(path, "model.keras"))
+        with open(os.path.join(path, "scaler.pkl"), "wb") as f:
+            pickle.dump(predictor.scaler, f)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({
+                "feature_columns": predictor.feature_columns,
+                "sequence_length": predictor.sequence_length,
+                "trained_at": datetime.now().isoformat(),
+                "metrics": metrics or {},
+            }, f, ensure_ascii=False)
+        return version
+
+    def versions(self, symbol: str, model_type: str, feature_set: str = None) -> list:
+        """登録済みのバージョンをデータ最終日の昇順で返す"""
+        if feature_set is None:
+            feature_set = feature_set_id(FEATURE_COLUMNS, SEQUENCE_LENGTH)
+        base = os.path.join(self.root, symbol, model_type, feature_set)
+        if not os.path.isdir(base):
+            return []
+        return [
+            ModelVersion(symbol, model_type, feature_set, data_end)
+            for data_end in sorted(os.listdir(base))
+            if os.path.exists(os.path.join(base, data_end, "meta.json"))
+        ]
+
+    def latest(self, symbol: str, model_type: str, feature_set: str = None):
+        versions = self.versions(symbol, model_type, feature_set)
+        return versions[-1] if versions else None
+
+    def metadata(self, version: ModelVersion) -> dict:
+        with open(os.path.join(self._path(version), "meta.json")) as f:
+            return json.load(f)
+
+    def load(self, version: ModelVersion) -> StockPricePredictor:
+        """保存済みのバージョンから予測器を復元"""
+        from tensorflow import keras
+
+        path = self._path(version)
+        meta = self.metadata(version)
+        predictor = StockPricePredictor(version.symbol, version.model_type)
+        predictor.feature_columns = meta["feature_columns"]
+        predictor.sequence_length = meta["sequence_length"]
+        predictor.data_end = pd.Timestamp(version.data_end)
+        predictor.model = keras.models.load_model(os.path.join(path, "model.keras"))
+        with open(os.path.join(path, "scaler.pkl"), "rb") as f:
+            predictor.scaler = pickle.load(f)
+        return predictor
+
+
+def model_nbytes(predictor: StockPricePredictor) -> int:
+    """モデルの重みが占めるメモリ量の概算"""
+    return sum(w.nbytes for w in predictor.model.get_weights())
+
+
+class WarmModelPool:
+    """読み込み済みモデルをメモリ予算内で保持する LRU プール"""
+
+    def __init__(self, registry: ModelRegistry, budget_bytes: int):
+        self.registry = registry
+        self.budget_bytes = budget_bytes
+        self._models = OrderedDict()  # version -> (predictor, nbytes)
+        self._lock = threading.Lock()
+        self._loading = {}  # version -> threading.Event (同じモデルの多重読み込みを防ぐ)
+        self.used_bytes = 0
+        self.warm_hits = 0
+        self.cold_loads = 0
+        self.evictions = 0
+        self.cold_load_seconds = 0.0
+        self.warm_hit_seconds = 0.0
+
+    def _evict(self):
+        while self.used_bytes > self.budget_bytes and len(self._models) > 1:
+            _, (_, nbytes) = self._models.popitem(last=False)
+            self.used_bytes -= nbytes
+            self.evictions += 1
+
+    def get(self, version: ModelVersion):
+        """予測器を取得し、(予測器, コールドロードだったか, 取得にかかった秒数) を返す"""
+        start = time.perf_counter()
+        while True:
+            with self._lock:
+                entry = self._models.get(version)
+                if entry is not None:
+                    self._models.move_to_end(version)
+                    elapsed = time.perf_counter() - start
+                    self.warm_hits += 1
+                    self.warm_hit_seconds += elapsed
+                    return entry[0], False, elapsed
+                event = self._loading.get(version)
+                if event is None:
+                    event = self._loading[version] = threading.Event()
+                    break
+            # 他のスレッドが読み込み中なので完了を待つ
+            event.wait()
+
+        try:
+            predictor = self.registry.load(version)
+            nbytes = model_nbytes(predictor)
+            with self._lock:
+                self._models[version] = (predictor, nbytes)
+                self.used_bytes += nbytes
+                self._evict()
+                elapsed = time.perf_counter() - start
+                self.cold_loads += 1
+                self.cold_load_seconds += elapsed
+            return predictor, True, elapsed
+        finally:
+            with self._lock:
+                self._loading.pop(version, None)
+            event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "models": len(self._models),
+                "used_mb": round(self.used_bytes / 2**20, 2),
+                "budget_mb": round(self.budget_bytes / 2**20, 2),
+                "warm_hits": self.warm_hits,
+                "cold_loads": self.cold_loads,
+                "evictions": self.evictions,
+                "avg_warm_hit_ms": round(self.warm_hit_seconds / self.warm_hits * 1000, 3) if self.warm_hits else None,
+                "avg_cold_load_ms": round(self.cold_load_seconds / self.cold_loads * 1000, 3) if self.cold_loads else None,
+            }
+
+
+registry = ModelRegistry()
+model_pool = WarmModelPool(registry, int(MODEL_POOL_BUDGET_MB * 2**20))
@@ -0,0 +1,221 @@
+import math
+import os
+from statistics import NormalDist
+
+import numpy as np
+
+# ポートフォリオ全体のリスク指標
+#
+# 保有銘柄の終値を日付で揃えた (時点 × 銘柄) の行列にまとめ、共分散・相関・ボラティリティ・
+# VaR/CVaR・ベータを行列演算で一括して求める。上場前などで値のない期間は欠損として扱い、
+# 共分散は銘柄の組ごとに両方の値がある時点だけで計算する (pairwise)。
+# ローリング指標は窓ごとに計算し直さず、累積和の差 (前の窓に入る値を足し、出る値を引く) で求める。
+
+TRADING_DAYS = 252
+PORTFOLIO_WINDOW = int(os.getenv("PORTFOLIO_WINDOW", "63"))
+
+
+def align_closes(frames: dict):
+    """銘柄ごとの終値を日付で揃え、(日付 (エポック日), 銘柄, 時点 × 銘柄の終値) を返す
+
+    休場日などで値がない日は直前の終値で埋める (その日のリターンは 0 になる)。
+    """
+    symbols = list(frames)
+    days = []
+    for df in frames.values():
+        index = df.index.tz_localize(None) if df.index.tz is not None else df.index
+        days.append(index.to_numpy().astype("datetime64[D]").astype(np.int64))
+    dates = np.unique(np.concatenate(days)) if days else np.empty(0, dtype=np.int64)
+    closes = np.full((len(dates), len(symbols)), np.nan)
+    for j, (df, d) in enumerate(zip(frames.values(), days)):
+        closes[np.searchsorted(dates, d), j] = df["Close"].to_numpy(dtype=float)
+    return dates, symbols, forward_fill(closes)
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """列ごとに欠損を直前の値で埋める (先頭の欠損はそのまま)"""
+    valid = ~np.isnan(values)
+    idx = np.where(valid, np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return values[idx, np.arange(values.shape[1])]
+
+
+def simple_returns(closes: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return closes[1:] / closes[:-1] - 1
+
+
+def pairwise_moments(returns: np.ndarray):
+    """欠損を含むリターン行列の十分統計量 (Σxxᵀ, 組ごとの Σx, 組ごとの件数)
+
+    欠損のない銘柄どうしの組は全時点の合計と件数で済むため、欠損のある銘柄の列だけ行列積で求める。
+    """
+    mask = ~np.isnan(returns)
+    x = np.where(mask, returns, 0.0)
+    sxx = x.T @ x
+    sxm = np.repeat(x.sum(axis=0)[:, None], returns.shape[1], axis=1)
+    n = np.full(sxx.shape, float(len(returns)))
+    partial = np.flatnonzero(~mask.all(axis=0))
+    if len(partial):
+        m = mask[:, partial].astype(float)
+        sxm[:, partial] = x.T @ m
+        n[:, partial] = mask.T.astype(float) @ m
+        n[partial, :] = n[:, partial].T
+    return sxx, sxm, n
+
+
+def covariance_from_moments(sxx: np.ndarray, sxm: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """組ごとの件数で正規化した不偏共分散 (件数が2未満の組は NaN)"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = (sxx - sxm * sxm.T / n) / (n - 1)
+    cov[n < 2] = np.nan
+    return cov
+
+
+def covariance_with(returns: np.ndarray, other: np.ndarray):
+    """各銘柄と other (ベンチマーク等) の共分散と、組ごとの other の分散"""
+    mask = ~np.isnan(returns) & ~np.isnan(other)[:, None]
+    x = np.where(mask, returns, 0.0)
+    y = np.where(mask, other[:, None], 0.0)
+    n = mask.sum(axis=0).astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = ((x * y).sum(axis=0) - x.sum(axis=0) * y.sum(axis=0) / n) / (n - 1)
+        var = ((y * y).sum(axis=0) - y.sum(axis=0) ** 2 / n) / (n - 1)
+    cov[n < 2] = np.nan
+    return cov, var
+
+
+def correlation(cov: np.ndarray) -> np.ndarray:
+    sd = np.sqrt(np.diag(cov))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.outer(sd, sd)
+    np.fill_diagonal(corr, 1.0)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def value_at_risk(returns: np.ndarray, confidence: float):
+    """ヒストリカル法の VaR と CVaR (損失を正の値で返す)"""
+    returns = returns[np.isfinite(returns)]
+    if len(returns) == 0:
+        return None, None
+    var = -float(np.quantile(returns, 1 - confidence))
+    tail = returns[returns <= -var]
+    return var, -float(tail.mean()) if len(tail) else var
+
+
+def parametric_var(mean: float, sd: float, confidence: float):
+    """正規分布を仮定した VaR と CVaR"""
+    z = NormalDist().inv_cdf(confidence)
+    return sd * z - mean, sd * math.exp(-z * z / 2) / (math.sqrt(2 * math.pi) * (1 - confidence)) - mean
+
+
+def rolling_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """累積和の差による窓内の合計 (先頭 window-1 点は NaN)"""
+    csum = np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)])
+    out = np.full(values.shape, np.nan)
+    out[window - 1:] = csum[window:] - csum[:-window]
+    return out
+
+
+def rolling_risk(rp: np.ndarray, rb: np.ndarray, window: int) -> dict:
+    """ポートフォリオのローリング年率ボラティリティとベータ (各窓を前の窓からの差分で求める)"""
+    n = window
+    s_p, s_pp = rolling_sums(rp, n), rolling_sums(rp * rp, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var_p = (s_pp - s_p * s_p / n) / (n - 1)
+        result = {"volatility": np.sqrt(np.maximum(var_p, 0) * TRADING_DAYS)}
+        if rb is not None:
+            valid = np.isfinite(rb)
+            rb = np.where(valid, rb, 0.0)
+            k = rolling_sums(valid.astype(float), n)
+            s_b, s_bb = rolling_sums(rb, n), rolling_sums(rb * rb, n)
+            s_pb = rolling_sums(np.where(valid, rp, 0.0) * rb, n)
+            s_pv = rolling_sums(np.where(valid, rp, 0.0), n)
+            result["beta"] = (s_pb - s_pv * s_b / k) / (s_bb - s_b * s_b / k)
+    return result
+
+
+def _matrix(values: np.ndarray) -> list:
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def _series(dates: np.ndarray, values: np.ndarray) -> list:
+    return [
+        {"date": str(np.datetime64(int(d), "D")), "value": float(v)}
+        for d, v in zip(dates, values) if np.isfinite(v)
+    ]
+
+
+def analyze(dates: np.ndarray, symbols: list, closes: np.ndarray, weights: np.ndarray,
+            benchmark: np.ndarray = None, confidence: tuple = (0.95, 0.99),
+            window: int = PORTFOLIO_WINDOW, matrices: bool = True) -> dict:
+    """揃えた終値の行列からポートフォリオのリスク指標を計算する
+
+    benchmark はベンチマークの終値 (dates に揃えたもの)。weights は合計 1 に正規化済みとする。
+    """
+    returns = simple_returns(closes)
+    ret_dates = dates[1:]
+    if len(returns) < 2:
+        raise ValueError("Insufficient data for portfolio analysis")
+
+    cov = covariance_from_moments(*pairwise_moments(returns))
+    # 値のない銘柄はその時点のリターンを 0 として扱う
+    rp = np.where(np.isnan(returns), 0.0, returns) @ weights
+    clean_cov = np.nan_to_num(cov)
+    daily_vol = float(np.sqrt(max(weights @ clean_cov @ weights, 0.0)))
+    mean = float(rp.mean())
+
+    risk = {}
+    for c in confidence:
+        var, cvar = value_at_risk(rp, c)
+        p_var, p_cvar = parametric_var(mean, daily_vol, c)
+        risk[str(c)] = {"historical_var": var, "historical_cvar": cvar,
+                        "parametric_var": p_var, "parametric_cvar": p_cvar}
+
+    rb = None
+    beta = None
+    asset_beta = np.full(len(symbols), np.nan)
+    if benchmark is not None:
+        rb = simple_returns(benchmark)
+        cov_b, var_b = covariance_with(returns, rb)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            asset_beta = cov_b / var_b
+        beta = float(np.nansum(weights * asset_beta))
+
+    rolling = rolling_risk(rp, rb, window) if len(rp) >= window else {}
+    window_vol = None
+    if len(returns) >= window:
+        window_cov = covariance_from_moments(*pairwise_moments(returns[-window:]))
+        window_vol = float(np.sqrt(max(weights @ np.nan_to_num(window_cov) @ weights, 0.0)))
+
+    vol = np.sqrt(np.diag(cov))
+    result = {
+        "symbols": symbols,
+        "weights": {s: float(w) for s, w in zip(symbols, weights)},
+        "observations": int(len(returns)),
+        "start_date": str(np.datetime64(int(dates[0]), "D")),
+        "end_date": str(np.datetime64(int(dates[-1]), "D")),
+        "expected_return": mean * TRADING_DAYS,
+        "volatility": daily_vol * math.sqrt(TRADING_DAYS),
+        "daily_volatility": daily_vol,
+        "window_volatility": window_vol * math.sqrt(TRADING_DAYS) if window_vol is not None else None,
+        "beta": beta,
+        "risk": risk,
+        "assets": [
+            {
+                "symbol": s,
+                "weight": float(w),
+                "volatility": float(v * math.sqrt(TRADING_DAYS)) if np.isfinite(v) else None,
+                "beta": float(b) if np.isfinite(b) else None,
+            }
+            for s, w, v, b in zip(symbols, weights, vol, asset_beta)
+        ],
+        "rolling": {
+            "window": window,
+            **{name: _series(ret_dates, values) for name, values in rolling.items()},
+        },
+    }
+    if matrices:
+        result["covariance"] = _matrix(cov * TRADING_DAYS)
+        result["correlation"] = _matrix(correlation(cov))
+    return result
@@ -0,0 +1,260 @@
+import copy
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, Float, LargeBinary, MetaData, String, Table, create_engine, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import indicators
+import shared_cache
+
+# /api/stock/prediction の線形回帰モデルの保持と差分更新
+#
+# StandardScaler + LinearRegression は、元の特徴量に切片付きの最小二乗法を当てはめたものと
+# 同じ予測になる。そこで訓練行の十分統計量 (件数, Σx, Σxxᵀ, Σxy, Σy) を保持し、新しい
+# バーが来たら訓練期間から外れた行を引き、加わった行を足すだけで係数を解き直す。
+# 状態は (銘柄, 期間) ごとに最終バーの日付と共に SQLite に保存し、ワーカー間で共有する。
+
+PREDICTION_STORE_URL = os.getenv(
+    "PREDICTION_STORE_URL",
+    "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "predictions.db"),
+)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "256"))
+# 差分更新をこの回数続けたら全行で当てはめ直す (統計量の足し引きで溜まる丸め誤差を消すため)
+PREDICTION_FULL_REFIT_EVERY = int(os.getenv("PREDICTION_FULL_REFIT_EVERY", "20"))
+
+FEATURES = ['Returns', 'SMA_5', 'SMA_20', 'RSI', 'Volume_Change']
+TRAIN_FRACTION = 0.8
+MIN_ROWS = 30
+
+metadata = MetaData()
+
+prediction_models = Table(
+    "prediction_models", metadata,
+    Column("symbol", String, primary_key=True),
+    Column("period", String, primary_key=True),
+    Column("last_bar", String, nullable=False),
+    Column("state", LargeBinary, nullable=False),
+    Column("updated_at", Float, nullable=False),
+)
+
+
+def build_features(df: pd.DataFrame):
+    """特徴量の行列・終値・各行の時刻 (エポック秒) を返す (欠損を含む行は除く)"""
+    close = df['Close'].to_numpy(dtype=float)
+    volume = df['Volume'].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.concatenate([[np.nan], close[1:] / close[:-1] - 1])
+        volume_change = np.concatenate([[np.nan], volume[1:] / volume[:-1] - 1])
+    X = np.column_stack([
+        returns,
+        indicators.sma(close, 5),
+        indicators.sma(close, 20),
+        indicators.rsi(close, 14),
+        volume_change,
+    ])
+    keep = ~np.isnan(X).any(axis=1) & ~np.isnan(close)
+    ts = df.index.asi8 // 10**9
+    return X[keep], close[keep], ts[keep]
+
+
+class LinearModelState:
+    """十分統計量で表した切片付き線形回帰 (訓練行も差分更新のために保持する)"""
+
+    __slots__ = ("train_ts", "X_train", "y_train", "n", "sx", "sxx", "sxy", "sy",
+                 "coef", "intercept", "last_bar", "last_close", "last_features", "increments")
+
+    @classmethod
+    def fit(cls, X: np.ndarray, y: np.ndarray, ts: np.ndarray) -> "LinearModelState":
+        state = cls()
+        train_size = int(len(X) * TRAIN_FRACTION)
+        state.train_ts = ts[:train_size].copy()
+        state.X_train = X[:train_size].copy()
+        state.y_train = y[:train_size].copy()
+        state.n = train_size
+        state.sx = state.X_train.sum(axis=0)
+        state.sxx = state.X_train.T @ state.X_train
+        state.sxy = state.X_train.T @ state.y_train
+        state.sy = float(state.y_train.sum())
+        state.increments = 0
+        state._solve()
+        state._set_last(X, y, ts)
+        return state
+
+    def _solve(self):
+        mean_x = self.sx / self.n
+        mean_y = self.sy / self.n
+        cov_xx = self.sxx - self.n * np.outer(mean_x, mean_x)
+        cov_xy = self.sxy - self.n * mean_x * mean_y
+        self.coef = np.linalg.lstsq(cov_xx, cov_xy, rcond=None)[0]
+        self.intercept = float(mean_y - mean_x @ self.coef)
+
+    def _set_last(self, X: np.ndarray, y: np.ndarray, ts: np.ndarray):
+        self.last_bar = int(ts[-1])
+        self.last_close = float(y[-1])
+        self.last_features = X[-1].copy()
+
+    def update(self, X: np.ndarray, y: np.ndarray, ts: np.ndarray) -> bool:
+        """新しい期間の特徴量に合わせて訓練行を入れ替える (差分更新できない場合は False)"""
+        train_size = int(len(X) * TRAIN_FRACTION)
+        target_ts = ts[:train_size]
+        X_target, y_target = X[:train_size], y[:train_size]
+        # 期間の先頭が動くと、残る行でも RSI 等の値が以前の期間で計算したものと変わる。
+        # 時刻が同じでも特徴量か終値が変わった行は、古い値を引いて新しい値を足す
+        pos = np.minimum(np.searchsorted(target_ts, self.train_ts), max(train_size - 1, 0))
+        same = target_ts[pos] == self.train_ts if train_size else np.zeros(len(self.train_ts), dtype=bool)
+        same[same] = ((X_target[pos[same]] == self.X_train[same]).all(axis=1)
+                      & (y_target[pos[same]] == self.y_train[same]))
+        removed = ~same
+        added = np.ones(train_size, dtype=bool)
+        added[pos[same]] = False
+        kept = int(same.sum())
+        # 重なりが小さい場合や差分更新が続いた場合は全行で当てはめ直す
+        if kept < train_size // 2 or self.increments >= PREDICTION_FULL_REFIT_EVERY:
+            return False
+
+        X_out, y_out = self.X_train[removed], self.y_train[removed]
+        X_in, y_in = X_target[added], y_target[added]
+        self.n += len(X_in) - len(X_out)
+        self.sx += X_in.sum(axis=0) - X_out.sum(axis=0)
+        self.sxx += X_in.T @ X_in - X_out.T @ X_out
+        self.sxy += X_in.T @ y_in - X_out.T @ y_out
+        self.sy += float(y_in.sum() - y_out.sum())
+
+        order = np.argsort(np.concatenate([self.train_ts[~removed], target_ts[added]]), kind="stable")
+        self.train_ts = np.concatenate([self.train_ts[~removed], target_ts[added]])[order]
+        self.X_train = np.concatenate([self.X_train[~removed], X_in])[order]
+        self.y_train = np.concatenate([self.y_train[~removed], y_in])[order]
+        self.increments += 1
+        self._solve()
+        self._set_last(X, y, ts)
+        return True
+
+    def predict(self, x: np.ndarray) -> float:
+        return float(x @ self.coef + self.intercept)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class PredictionModelStore:
+    """(銘柄, 期間) ごとの最新のモデル状態を SQLite に保存する"""
+
+    def __init__(self, url: str = PREDICTION_STORE_URL):
+        if url.startswith("sqlite:///"):
+            path = url[len("sqlite:///"):]
+            if path and path != ":memory:":
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.engine = create_engine(url, connect_args={"timeout": 30} if url.startswith("sqlite") else {})
+        shared_cache.create_tables(self.engine, metadata)
+
+    def get(self, symbol: str, period: str):
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(prediction_models.c.state)
+                .where(prediction_models.c.symbol == symbol, prediction_models.c.period == period)
+            ).first()
+        return pickle.loads(row.state) if row is not None else None
+
+    def put(self, symbol: str, period: str, state: LinearModelState):
+        stmt = sqlite_insert(prediction_models).values(
+            symbol=symbol, period=period, last_bar=str(state.last_bar),
+            state=pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), updated_at=time.time(),
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=["symbol", "period"],
+                set_={"last_bar": stmt.excluded.last_bar, "state": stmt.excluded.state,
+                      "updated_at": stmt.excluded.updated_at},
+            ))
+
+
+class PredictionModelCache:
+    """プロセス内の LRU と共有ストアを使い、最終バーが変わったときだけ当てはめ直す"""
+
+    def __init__(self, store: PredictionModelStore = None, maxsize: int = PREDICTION_CACHE_SIZE):
+        self._store = store
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats_counts = {"hit": 0, "store_hit": 0, "incremental": 0, "fit": 0}
+
+    @property
+    def store(self) -> PredictionModelStore:
+        if self._store is None:
+            self._store = PredictionModelStore()
+        return self._store
+
+    def warm(self):
+        """共有ストアへ接続してテーブルを用意しておく"""
+        self.store.get("", "")
+
+    def _remember(self, key, state):
+        with self._lock:
+            self._entries[key] = state
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return state
+
+    @staticmethod
+    def _refit(state, stored, df: pd.DataFrame, last_bar: int):
+        X, y, ts = build_features(df)
+        if len(X) < MIN_ROWS:
+            raise ValueError("Insufficient data for prediction")
+        # プロセス内とストアのうち新しい方を起点に差分更新する (共有中の状態は書き換えない)
+        bases = [s for s in (state, stored) if s is not None and s.last_bar < last_bar]
+        state = copy.deepcopy(max(bases, key=lambda s: s.last_bar)) if bases else None
+        if state is not None and state.update(X, y, ts):
+            return state, "incremental"
+        return LinearModelState.fit(X, y, ts), "fit"
+
+    def get(self, symbol: str, period: str, df: pd.DataFrame):
+        """(モデル状態, 最新の特徴量, 取得方法) を返す"""
+        key = (symbol, period)
+        last_bar = int(df.index.asi8[-1] // 10**9)
+        last_close = float(df['Close'].iloc[-1])
+        with self._lock:
+            state = self._entries.get(key)
+            if state is not None:
+                self._entries.move_to_end(key)
+        source = "hit"
+        if state is None or state.last_bar != last_bar:
+            stored = self.store.get(symbol, period)
+            if stored is not None and stored.last_bar == last_bar:
+                state, source = self._remember(key, stored), "store_hit"
+            else:
+                # 当てはめは1つのワーカーだけが行い、待っていたワーカーはストアの結果を使う
+                with shared_cache.cache.lock(f"prediction:{symbol}:{period}"):
+                    stored = self.store.get(symbol, period)
+                    if stored is not None and stored.last_bar == last_bar:
+                        state, source = self._remember(key, stored), "store_hit"
+                    else:
+                        state, source = self._refit(state, stored, df, last_bar)
+                        self.store.put(symbol, period, state)
+                        self._remember(key, state)
+        with self._lock:
+            self.stats_counts[source] += 1
+
+        # 当日足の更新で最終バーの値が変わった場合は最新行の特徴量だけ計算し直す
+        features = state.last_features
+        if last_close != state.last_close:
+            X, _, _ = build_features(df)
+            features = X[-1]
+        return state, features, source
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"models": len(self._entries), **self.stats_counts}
+
+
+model_cache = PredictionModelCache()
@@ -0,0 +1,114 @@
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+# リクエスト単位のサンプリングプロファイラ (PROFILING_ENABLED=1 のときだけ有効)
+#
+# リクエストの処理中、一定間隔でプロセス内の全スレッドのスタックを採取し、flamegraph 等で
+# そのまま読める "関数;関数;... 件数" 形式 (collapsed stacks) で保持する。処理は
+# イベントループとスレッドプールにまたがるため、全スレッドを対象にしている。
+# 同時に処理中の他のリクエストのスタックも混ざる点に注意。
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+# 採取したプロファイルを書き出すディレクトリ (空の場合はメモリ上にのみ保持)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+
+# 待機中のスレッドの先頭フレーム (サンプルから除外する)
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FRAMES
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """別スレッドから他のスレッドのスタックを定期的に採取する"""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = None
+        self.duration = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own and not _is_idle(frame):
+                    self.samples[_collapse(frame)] += 1
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+class ProfileStore:
+    """採取したプロファイルを直近 PROFILE_KEEP 件まで保持する"""
+
+    def __init__(self, keep: int = PROFILE_KEEP, directory: str = PROFILE_DIR):
+        self.keep = keep
+        self.directory = directory
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, path: str, sampler: StackSampler) -> str:
+        profile_id = uuid.uuid4().hex[:12]
+        entry = {
+            "id": profile_id,
+            "path": path,
+            "duration_ms": round(sampler.duration * 1000, 2),
+            "samples": sum(sampler.samples.values()),
+            "collapsed": sampler.collapsed(),
+        }
+        with self._lock:
+            self._profiles[profile_id] = entry
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{profile_id}.folded"), "w") as f:
+                f.write(entry["collapsed"])
+        return profile_id
+
+    def get(self, profile_id: str):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> list:
+        with self._lock:
+            return [{k: v for k, v in p.items() if k != "collapsed"} for p in reversed(self._profiles.values())]
+
+
+profile_store = ProfileStore()
@@ -0,0 +1,404 @@
+import copy
+import os
+import random
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# 市場データプロバイダの呼び出し層
+#
+# 人気銘柄へのリクエストが同時に集まると、同じ内容の呼び出しがそれぞれプロバイダへ飛び、
+# 重複した通信とレート制限を招く。ここでは全ての呼び出しを ProviderClient に通し、
+#   - 同じ内容で実行中の呼び出しがあれば、その結果を待って共有する (single-flight)
+#   - トークンバケットで呼び出しの頻度を抑える
+#   - 失敗時はジッタ付きの指数バックオフで再試行する
+#   - HTTP セッションは接続プール付きで使い回す
+# プロバイダは MARKET_DATA_PROVIDER で切り替えられ、"synthetic" を指定すると
+# ネットワークを使わない決定的な擬似データで負荷試験ができる。
+
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "yfinance")
+# プロバイダへの同時リクエスト数の上限
+UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", "8"))
+# 1秒あたりの呼び出し数と、一度に使える上限 (0 以下で制限なし。既定では従来どおり制限しない。
+# プロバイダのレート制限に掛かる場合に 5 程度を指定する)
+UPSTREAM_RATE = float(os.getenv("UPSTREAM_RATE", "0"))
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", "10"))
+# 再試行の回数とバックオフ (秒)
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_BACKOFF = float(os.getenv("UPSTREAM_BACKOFF", "0.5"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "8"))
+# HTTP セッションの接続プールの大きさ
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "16"))
+# 擬似プロバイダの応答遅延 (秒) と失敗率
+SYNTHETIC_LATENCY = float(os.getenv("SYNTHETIC_LATENCY", "0.05"))
+SYNTHETIC_ERROR_RATE = float(os.getenv("SYNTHETIC_ERROR_RATE", "0"))
+
+
+class ProviderError(Exception):
+    """プロバイダ呼び出しの失敗 (再試行の対象)"""
+
+
+class TokenBucket:
+    """毎秒 rate 個補充され、最大 burst 個まで貯まるトークンバケット"""
+
+    def __init__(self, rate: float = UPSTREAM_RATE, burst: int = UPSTREAM_BURST):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """トークンを1つ取り出す (足りなければ補充まで待つ)。待った秒数を返す"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """同じキーで実行中の呼び出しがあれば、新たに実行せずその結果を待つ"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """(結果, 他の呼び出しの結果を共有したか) を返す"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def backoff_delay(attempt: int, base: float = UPSTREAM_BACKOFF, cap: float = UPSTREAM_BACKOFF_MAX) -> float:
+    """attempt 回目の再試行までの待ち時間 (full jitter)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class YFinanceProvider:
+    """yfinance 経由のプロバイダ (接続プール付きのセッションを共有する)"""
+
+    name = "yfinance"
+
+    def __init__(self, pool_size: int = UPSTREAM_POOL_SIZE):
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        # 新しい yfinance は curl_cffi のセッションを要求するため、あればそちらを使う
+        try:
+            from curl_cffi import requests as curl_requests
+        except ImportError:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            return session
+        return curl_requests.Session(impersonate="chrome", max_clients=self.pool_size)
+
+    def _ticker(self, symbol: str):
+        import yfinance as yf
+
+        return yf.Ticker(symbol, session=self.session)
+
+    def history(self, symbol: str, interval: str, period: str = None, start: str = None) -> pd.DataFrame:
+        if start is not None:
+            return self._ticker(symbol).history(start=start, interval=interval)
+        return self._ticker(symbol).history(period=period, interval=interval)
+
+    def download(self, symbols: list, period: str, interval: str) -> pd.DataFrame:
+        import yfinance as yf
+
+        return yf.download(
+            symbols, period=period, interval=interval, group_by="ticker",
+            auto_adjust=True, threads=True, progress=False, session=self.session,
+        )
+
+    def info(self, symbol: str) -> dict:
+        return self._ticker(symbol).info
+
+    def news(self, symbol: str) -> list:
+        return self._ticker(symbol).news or []
+
+
+# 擬似プロバイダで期間ごとに返す営業日数
+_PERIOD_DAYS = {"1d": 1, "5d": 5, "1mo": 21, "3mo": 63, "6mo": 126, "1y": 252, "2y": 504,
+                "5y": 1260, "10y": 2520, "max": 6000}
+_INTERVAL_MINUTES = {"1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "90m": 90, "1h": 60}
+_SESSION_MINUTES = 390
+
+
+class SyntheticProvider:
+    """ネットワークを使わない擬似プロバイダ (負荷試験・オフライン開発用)
+
+    銘柄名から決まる乱数で日足のランダムウォークを生成するため、同じ銘柄には毎回同じ系列を返す。
+    分足は当日分だけを生成し、時刻と共に本数が増える (直近価格が分ごとに変わる)。
+    """
+
+    name = "synthetic"
+    tz = "America/New_York"
+
+    def __init__(self, latency: float = SYNTHETIC_LATENCY, error_rate: float = SYNTHETIC_ERROR_RATE,
+                 origin: str = "2000-01-03"):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.origin = np.datetime64(origin, "D")
+        self._index = None  # (日付, 営業日のインデックス)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _respond(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if self.error_rate > 0 and random.random() < self.error_rate:
+            raise ProviderError("synthetic provider failure")
+
+    @staticmethod
+    def _seed(symbol: str) -> int:
+        return zlib.crc32(symbol.upper().encode())
+
+    def _business_days(self) -> pd.DatetimeIndex:
+        today = np.datetime64(datetime.now(timezone.utc).date(), "D")
+        if self._index is None or self._index[0] != today:
+            days = np.arange(self.origin, today + 1)
+            self._index = (today, pd.DatetimeIndex(days[np.is_busday(days)].astype("datetime64[ns]")).tz_localize(self.tz))
+        return self._index[1]
+
+    def _daily(self, symbol: str) -> pd.DataFrame:
+        index = self._business_days()
+        n = len(index)
+        seed = self._seed(symbol)
+        # 系列ごとに別の乱数列を使い、本数が増えても既存の値が変わらないようにする
+        returns = np.random.default_rng([seed, 0]).normal(0.0003, 0.02, n)
+        spread = np.abs(np.random.default_rng([seed, 1]).normal(0, 0.01, (n, 2)))
+        volume = np.random.default_rng([seed, 2]).integers(100_000, 10_000_000, n)
+        base = 20 + seed % 480
+        close = base * np.exp(np.cumsum(returns))
+        open_ = np.concatenate([[base], close[:-1]])
+        return pd.DataFrame({
+            "Open": open_,
+            "High": np.maximum(open_, close) * (1 + spread[:, 0]),
+            "Low": np.minimum(open_, close) * (1 - spread[:, 1]),
+            "Close": close,
+            "Volume": volume.astype(float),
+        }, index=index)
+
+    def _intraday(self, symbol: str, interval: str) -> pd.DataFrame:
+        step = _INTERVAL_MINUTES.get(interval, 1)
+        now = pd.Timestamp.now(tz=self.tz)
+        session_open = now.normalize() + pd.Timedelta(hours=9, minutes=30)
+        elapsed = int((now - session_open).total_seconds() // 60)
+        minutes = min(max(elapsed, 1), _SESSION_MINUTES)
+        last_close = float(self._daily(symbol)["Close"].iloc[-1])
+        rng = np.random.default_rng([self._seed(symbol), now.toordinal()])
+        steps = rng.normal(0, 0.0008, _SESSION_MINUTES)[:minutes]
+        close = last_close * np.exp(np.cumsum(steps))[::step]
+        index = session_open + pd.to_timedelta(np.arange(0, minutes, step), unit="m")
+        open_ = np.concatenate([[last_close], close[:-1]])
+        return pd.DataFrame({
+            "Open": open_,
+            "High": np.maximum(open_, close),
+            "Low": np.minimum(open_, close),
+            "Close": close,
+            "Volume": np.full(len(close), 10_000.0),
+        }, index=index)
+
+    def _bars(self, symbol: str, interval: str, period: str = None, start: str = None) -> pd.DataFrame:
+        if interval in _INTERVAL_MINUTES:
+            return self._intraday(symbol, interval)
+        df = self._daily(symbol)
+        if start is not None:
+            return df[df.index >= pd.Timestamp(start).tz_localize(self.tz)]
+        if period == "ytd":
+            return df[df.index.year == df.index[-1].year]
+        return df.iloc[-_PERIOD_DAYS.get(period, 21):]
+
+    def history(self, symbol: str, interval: str, period: str = None, start: str = None) -> pd.DataFrame:
+        self._respond()
+        return self._bars(symbol, interval, period, start)
+
+    def download(self, symbols: list, period: str, interval: str) -> pd.DataFrame:
+        self._respond()
+        frames = {symbol: self._bars(symbol, interval, period) for symbol in symbols}
+        return pd.concat(frames, axis=1)
+
+    def info(self, symbol: str) -> dict:
+        self._respond()
+        df = self._daily(symbol)
+        last = df.iloc[-1]
+        year = df.iloc[-252:]
+        return {
+            "symbol": symbol,
+            "longName": f"{symbol} Synthetic Corp.",
+            "currentPrice": float(last["Close"]),
+            "previousClose": float(df["Close"].iloc[-2]),
+            "open": float(last["Open"]),
+            "dayHigh": float(last["High"]),
+            "dayLow": float(last["Low"]),
+            "volume": int(last["Volume"]),
+            "marketCap": int(last["Close"] * 1e9),
+            "trailingPE": 10 + self._seed(symbol) % 30,
+            "dividendYield": (self._seed(symbol) % 50) / 1000,
+            "fiftyTwoWeekHigh": float(year["High"].max()),
+            "fiftyTwoWeekLow": float(year["Low"].min()),
+        }
+
+    def news(self, symbol: str) -> list:
+        self._respond()
+        day = int(time.time() // 86400)
+        words = ["beats", "misses", "expands", "cuts", "launches", "strong", "weak", "record"]
+        rng = random.Random(self._seed(symbol) + day)
+        return [
+            {
+                "uuid": f"{symbol}-{day}-{i}",
+                "title": f"{symbol} {rng.choice(words)} {rng.choice(words)} expectations",
+                "publisher": "Synthetic Wire",
+                "link": "",
+                "providerPublishTime": day * 86400 + i * 3600,
+            }
+            for i in range(10)
+        ]
+
+
+PROVIDERS = {"yfinance": YFinanceProvider, "synthetic": SyntheticProvider}
+
+
+class ProviderClient:
+    """プロバイダ呼び出しに single-flight・レート制限・再試行・同時実行数の制限をかける"""
+
+    def __init__(self, provider=None, bucket: TokenBucket = None, retries: int = UPSTREAM_RETRIES,
+                 concurrency: int = UPSTREAM_CONCURRENCY):
+        self.provider = provider or PROVIDERS[MARKET_DATA_PROVIDER]()
+        self.bucket = bucket or TokenBucket()
+        self.retries = retries
+        self.flights = SingleFlight()
+        self._upstream = threading.BoundedSemaphore(concurrency)
+
+    @contextmanager
+    def _attempt(self, kind: str):
+        """1回の呼び出し (同時実行数の制限と、呼び出し回数・エラー・所要時間の記録)"""
+        with self._upstream:
+            start = time.perf_counter()
+            try:
+                yield
+            except Exception:
+                metrics.UPSTREAM_ERRORS.inc(kind)
+                raise
+            finally:
+                metrics.UPSTREAM_CALLS.inc(kind)
+                metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - start, kind)
+
+    def _with_retry(self, kind: str, fn):
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire()
+            if waited:
+                metrics.UPSTREAM_THROTTLED.inc(kind, amount=waited)
+            try:
+                with self._attempt(kind):
+                    return fn()
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                metrics.UPSTREAM_RETRIES.inc(kind)
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+
+    def call(self, kind: str, key: tuple, fn):
+        """同じ key の呼び出しが実行中ならその結果を共有する (共有した結果は複製して返す)"""
+        result, shared = self.flights.do((kind,) + key, lambda: self._with_retry(kind, fn))
+        if shared:
+            metrics.UPSTREAM_COALESCED.inc(kind)
+            return copy.copy(result)
+        return result
+
+    def history(self, symbol: str, interval: str, period: str = None, start: str = None) -> pd.DataFrame:
+        return self.call("history", (symbol, interval, period, start),
+                         lambda: self.provider.history(symbol, interval, period=period, start=start))
+
+    def download(self, symbols: list, period: str, interval: str, kind: str = "history_batch") -> pd.DataFrame:
+        return self.call(kind, (tuple(symbols), period, interval),
+                         lambda: self.provider.download(symbols, period, interval))
+
+    def info(self, symbol: str) -> dict:
+        return self.call("info", (symbol,), lambda: self.provider.info(symbol))
+
+    def news(self, symbol: str) -> list:
+        return self.call("news", (symbol,), lambda: self.provider.news(symbol))
+
+    def stats(self) -> dict:
+        kinds = ["history", "history_batch", "quotes", "info", "news"]
+        return {
+            "provider": self.provider.name,
+            "inflight": self.flights.inflight(),
+            "tokens": round(self.bucket.tokens, 2),
+            "calls": {k: metrics.UPSTREAM_CALLS.value(k) for k in kinds},
+            "errors": {k: metrics.UPSTREAM_ERRORS.value(k) for k in kinds},
+            "retries": {k: metrics.UPSTREAM_RETRIES.value(k) for k in kinds},
+            "coalesced": {k: metrics.UPSTREAM_COALESCED.value(k) for k in kinds},
+            "throttled_seconds": {k: round(metrics.UPSTREAM_THROTTLED.value(k), 3) for k in kinds},
+        }
+
+
+client = ProviderClient()
@@ -0,0 +1,369 @@
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+import market_data
+from streaming_indicators import IndicatorState
+
+logger = logging.getLogger(__name__)
+
+# 銘柄スクリーナーのスナップショット
+#
+# 対象銘柄全体の最新の指標値と calculate_trading_signals のスコアを、列ごとの numpy 配列
+# (銘柄 × 列) にまとめて保持する。主要な列は値の順に並べた索引を持ち、"RSI < 30" のような
+# 条件は二分探索で該当行を絞り込んでから、残りの条件を絞り込んだ行だけで評価する。
+# 指標は銘柄ごとの IndicatorState で保持し、再構築時は前回以降に増えたバーだけを反映する。
+
+SCREENER_UNIVERSE = os.getenv("SCREENER_UNIVERSE", "")
+SCREENER_PERIOD = os.getenv("SCREENER_PERIOD", "1y")
+SCREENER_CHUNK_SIZE = int(os.getenv("SCREENER_CHUNK_SIZE", "50"))
+SCREENER_SNAPSHOT_PATH = os.getenv(
+    "SCREENER_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "screener.npz"),
+)
+# 夜間の再構築 (APScheduler の cron 形式の時・分)
+SCREENER_SCHEDULE_ENABLED = os.getenv("SCREENER_SCHEDULE_ENABLED", "0") == "1"
+SCREENER_CRON_HOUR = os.getenv("SCREENER_CRON_HOUR", "1")
+SCREENER_CRON_MINUTE = os.getenv("SCREENER_CRON_MINUTE", "0")
+
+VALUE_COLUMNS = [
+    "Close", "change_pct", "SMA_5", "SMA_20", "SMA_50", "EMA_12", "EMA_26", "MACD", "MACD_signal",
+    "MACD_diff", "RSI", "BB_upper", "BB_middle", "BB_lower", "Stoch_K", "Stoch_D",
+]
+SCORE_COLUMNS = ["buy_score", "sell_score", "score"]
+COLUMNS = VALUE_COLUMNS + SCORE_COLUMNS
+# 値の順の索引を持つ列
+INDEXED_COLUMNS = ["Close", "change_pct", "SMA_20", "SMA_50", "RSI", "MACD_diff", "Stoch_K", "score"]
+
+_OPS = {
+    "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+    "==": np.equal, "!=": np.not_equal,
+}
+_TERM = re.compile(
+    r"^\s*([A-Za-z_]\w*)\s*(<=|>=|==|!=|<|>)\s*([A-Za-z_]\w*|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*$"
+)
+
+
+def parse_conditions(where: str) -> list:
+    """"RSI < 30 and SMA_20 > SMA_50" 形式の条件を (列, 演算子, 列名または数値) のリストにする"""
+    conditions = []
+    if not where or not where.strip():
+        return conditions
+    for term in re.split(r"\s+and\s+", where.strip(), flags=re.IGNORECASE):
+        match = _TERM.match(term)
+        if match is None:
+            raise ValueError(f"条件を解釈できません: {term}")
+        column, op, rhs = match.groups()
+        for name in (column, rhs):
+            if name[0].isalpha() or name[0] == "_":
+                if name not in COLUMNS:
+                    raise ValueError(f"未対応の列です: {name}")
+        conditions.append((column, op, rhs if rhs in COLUMNS else float(rhs)))
+    return conditions
+
+
+def signal_scores(columns: dict, prev_macd: np.ndarray, prev_signal: np.ndarray):
+    """全銘柄について evaluate_trading_signals の買い・売りスコアを一括で計算"""
+    close, rsi = columns["Close"], columns["RSI"]
+    macd, signal = columns["MACD"], columns["MACD_signal"]
+    sma_5, sma_20, sma_50 = columns["SMA_5"], columns["SMA_20"], columns["SMA_50"]
+    buy = np.zeros(len(close), dtype=np.int8)
+    sell = np.zeros(len(close), dtype=np.int8)
+
+    buy += 2 * (rsi < 30)
+    sell += 2 * ((rsi > 70) & ~(rsi < 30))
+    golden = (macd > signal) & (prev_macd <= prev_signal)
+    buy += 3 * golden
+    sell += 3 * ((macd < signal) & (prev_macd >= prev_signal) & ~golden)
+    up = (sma_5 > sma_20) & (sma_20 > sma_50)
+    buy += 2 * up
+    sell += 2 * ((sma_5 < sma_20) & (sma_20 < sma_50) & ~up)
+    below = close < columns["BB_lower"]
+    buy += 2 * below
+    sell += 2 * ((close > columns["BB_upper"]) & ~below)
+    return buy, sell
+
+
+def recommendation(score: int) -> str:
+    if score >= 5:
+        return "強い買い"
+    if score >= 2:
+        return "買い"
+    if score <= -5:
+        return "強い売り"
+    if score <= -2:
+        return "売り"
+    return "様子見"
+
+
+class Snapshot:
+    """銘柄 × 列の表と、主要な列の値の順の索引"""
+
+    def __init__(self, symbols: np.ndarray, columns: dict, as_of: np.ndarray, built_at: float):
+        self.symbols = symbols
+        self.columns = columns
+        self.as_of = as_of  # 銘柄ごとの最終バーの日付 (エポック日)
+        self.built_at = built_at
+        self.index = {}
+        for name in INDEXED_COLUMNS:
+            values = columns[name].astype(float)
+            order = np.argsort(values, kind="stable")  # NaN は末尾に並ぶ
+            n_valid = int(np.count_nonzero(~np.isnan(values)))
+            self.index[name] = (order[:n_valid], values[order[:n_valid]])
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _index_rows(self, column: str, op: str, value: float):
+        """索引の二分探索で条件を満たす行を返す (索引で扱えない条件は None)"""
+        if column not in self.index or op == "!=":
+            return None
+        order, values = self.index[column]
+        if op == "<":
+            return order[:np.searchsorted(values, value, side="left")]
+        if op == "<=":
+            return order[:np.searchsorted(values, value, side="right")]
+        if op == ">":
+            return order[np.searchsorted(values, value, side="right"):]
+        if op == ">=":
+            return order[np.searchsorted(values, value, side="left"):]
+        return order[np.searchsorted(values, value, side="left"):np.searchsorted(values, value, side="right")]
+
+    def filter(self, conditions: list) -> np.ndarray:
+        """条件を全て満たす行番号 (最も絞り込める索引の結果から残りの条件を評価する)"""
+        candidates = None
+        rest = []
+        for condition in conditions:
+            column, op, rhs = condition
+            rows = self._index_rows(column, op, rhs) if isinstance(rhs, float) else None
+            if rows is None:
+                rest.append(condition)
+            elif candidates is None or len(rows) < len(candidates):
+                if candidates is not None:
+                    rest.append(best)
+                candidates, best = rows, condition
+            else:
+                rest.append(condition)
+        if candidates is None:
+            candidates = np.arange(len(self))
+        for column, op, rhs in rest:
+            if len(candidates) == 0:
+                break
+            lhs = self.columns[column][candidates]
+            rhs = self.columns[rhs][candidates] if isinstance(rhs, str) else rhs
+            candidates = candidates[_OPS[op](lhs, rhs)]
+        return candidates
+
+    def rank(self, rows: np.ndarray, sort: str, descending: bool, limit: int) -> np.ndarray:
+        """sort 列の順に上位 limit 行を返す (欠損は末尾)"""
+        if limit <= 0:
+            return rows[:0]
+        if sort in self.index and len(rows) == len(self) and limit <= len(self.index[sort][0]):
+            order = self.index[sort][0]
+            return (order[::-1] if descending else order)[:limit]
+        values = self.columns[sort][rows].astype(float)
+        keys = np.where(np.isnan(values), np.inf, -values if descending else values)
+        if len(rows) > limit:
+            top = np.argpartition(keys, limit - 1)[:limit]
+            return rows[top[np.argsort(keys[top], kind="stable")]]
+        return rows[np.argsort(keys, kind="stable")]
+
+    def row(self, i: int, columns: list = None) -> dict:
+        result = {"symbol": str(self.symbols[i]), "as_of": str(np.datetime64(int(self.as_of[i]), "D"))}
+        for name in columns or COLUMNS:
+            value = self.columns[name][i]
+            result[name] = None if np.isnan(value) else value.item()
+        result["recommendation"] = recommendation(int(self.columns["score"][i]))
+        return result
+
+    def query(self, where: str = "", sort: str = "score", descending: bool = True, limit: int = 50,
+              columns: list = None) -> dict:
+        start = time.perf_counter()
+        conditions = parse_conditions(where)
+        if sort not in COLUMNS:
+            raise ValueError(f"未対応の列です: {sort}")
+        for name in columns or []:
+            if name not in COLUMNS:
+                raise ValueError(f"未対応の列です: {name}")
+        rows = self.filter(conditions)
+        top = self.rank(rows, sort, descending, max(0, limit))
+        return {
+            "matched": int(len(rows)),
+            "universe": len(self),
+            "results": [self.row(i, columns) for i in top],
+            "snapshot_built_at": self.built_at,
+            "query_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+
+    def save(self, path: str):
+        """列ごとの配列を1つの npz ファイルに書き出す (書き込み中のファイルは読ませない)"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, symbols=self.symbols, as_of=self.as_of, built_at=np.array(self.built_at),
+                     **{f"col_{name}": values for name, values in self.columns.items()})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Snapshot":
+        with np.load(path, allow_pickle=False) as data:
+            columns = {name: data[f"col_{name}"] for name in COLUMNS}
+            return cls(data["symbols"], columns, data["as_of"], float(data["built_at"]))
+
+
+def snapshot_row(state: IndicatorState) -> tuple:
+    """指標状態から (値の列, 1本前の MACD, 1本前の MACD シグナル) を取り出す"""
+    latest, previous = state.latest, state.previous or {}
+    prev_close = previous.get("Close", np.nan)
+    change = latest["Close"] / prev_close * 100 - 100 if prev_close else np.nan
+    values = [latest["Close"], change] + [latest[name] for name in VALUE_COLUMNS[2:]]
+    return values, previous.get("MACD", np.nan), previous.get("MACD_signal", np.nan)
+
+
+class ScreenerBuilder:
+    """対象銘柄の指標状態を保持し、スナップショットを再構築する"""
+
+    def __init__(self, path: str = SCREENER_SNAPSHOT_PATH, period: str = SCREENER_PERIOD,
+                 chunk_size: int = SCREENER_CHUNK_SIZE):
+        self.path = path
+        self.period = period
+        self.chunk_size = chunk_size
+        self.states = {}  # 銘柄 -> IndicatorState
+        self.last_build = None
+        self._snapshot = None
+        self._mtime = None
+        self._build_lock = threading.Lock()
+
+    @property
+    def snapshot(self):
+        """最新のスナップショット (他のプロセスが書き出したファイルが新しければ読み直す)"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return self._snapshot
+        if mtime != self._mtime:
+            try:
+                self._snapshot, self._mtime = Snapshot.load(self.path), mtime
+            except Exception as e:
+                logger.warning("failed to load screener snapshot: %s", e)
+        return self._snapshot
+
+    def rebuild(self, symbols: list, merge: bool = False) -> dict:
+        """対象銘柄の指標を更新してスナップショットを作り直す
+
+        前回の状態がある銘柄は新しいバーだけを反映し、ない銘柄は履歴全体から初期化する。
+        merge=True の場合は一部の銘柄だけを更新し、それ以外 (と更新に失敗した銘柄) は前回の
+        スナップショットの行を残す。1銘柄も作れなかった場合はスナップショットを書き換えない。
+        """
+        with self._build_lock:
+            start = time.perf_counter()
+            counts = {"incremental": 0, "unchanged": 0, "full": 0}
+            failed = []
+            frames = {}
+            for i in range(0, len(symbols), self.chunk_size):
+                chunk = symbols[i:i + self.chunk_size]
+                try:
+                    frames.update(market_data.get_history_batch(chunk, self.period))
+                except Exception as e:
+                    failed.extend({"symbol": s, "error": str(e)} for s in chunk)
+            fetched = time.perf_counter()
+
+            rows, prev_macd, prev_signal, as_of, names = [], [], [], [], []
+            for symbol in symbols:
+                df = frames.get(symbol)
+                if df is None or len(df) < 2:
+                    if not any(f["symbol"] == symbol for f in failed):
+                        failed.append({"symbol": symbol, "error": "No data found"})
+                    continue
+                state = self.states.get(symbol)
+                try:
+                    last = state.last_timestamp if state is not None else None
+                    if state is not None and state.apply_history(df):
+                        counts["unchanged" if state.last_timestamp == last else "incremental"] += 1
+                    else:
+                        state = self.states[symbol] = IndicatorState.from_history(df)
+                        counts["full"] += 1
+                except Exception as e:
+                    failed.append({"symbol": symbol, "error": str(e)})
+                    continue
+                values, macd, signal = snapshot_row(state)
+                rows.append(values)
+                prev_macd.append(macd)
+                prev_signal.append(signal)
+                as_of.append(np.datetime64(state.last_timestamp.date(), "D").astype(np.int64))
+                names.append(symbol)
+
+            if not names:
+                self.last_build = {
+                    "symbols": 0,
+                    **counts,
+                    "failed": failed,
+                    "fetch_seconds": round(fetched - start, 3),
+                    "compute_seconds": round(time.perf_counter() - fetched, 3),
+                    "built_at": None,
+                }
+                logger.warning("screener snapshot not rebuilt: all %d symbols failed", len(symbols))
+                return self.last_build
+
+            table = np.array(rows, dtype=float).reshape(len(rows), len(VALUE_COLUMNS))
+            columns = {name: table[:, j].copy() for j, name in enumerate(VALUE_COLUMNS)}
+            buy, sell = signal_scores(columns, np.array(prev_macd, dtype=float), np.array(prev_signal, dtype=float))
+            columns.update(buy_score=buy, sell_score=sell, score=(buy - sell).astype(np.int8))
+            symbols_array, as_of_array = np.array(names, dtype=str), np.array(as_of, dtype=np.int64)
+            previous = self.snapshot if merge else None
+            if previous is not None:
+                keep = ~np.isin(previous.symbols, symbols_array)
+                symbols_array = np.concatenate([previous.symbols[keep], symbols_array])
+                as_of_array = np.concatenate([previous.as_of[keep], as_of_array])
+                columns = {name: np.concatenate([previous.columns[name][keep], values])
+                           for name, values in columns.items()}
+            snapshot = Snapshot(symbols_array, columns, as_of_array, time.time())
+            snapshot.save(self.path)
+            self._snapshot, self._mtime = snapshot, os.stat(self.path).st_mtime
+            self.last_build = {
+                "symbols": len(names),
+                "rows": len(snapshot),
+                **counts,
+                "failed": failed,
+                "fetch_seconds": round(fetched - start, 3),
+                "compute_seconds": round(time.perf_counter() - fetched, 3),
+                "built_at": snapshot.built_at,
+            }
+            logger.info("screener snapshot rebuilt: %d symbols (%d incremental, %d full)",
+                        len(names), counts["incremental"], counts["full"])
+            return self.last_build
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "rows": len(snapshot) if snapshot is not None else 0,
+            "built_at": snapshot.built_at if snapshot is not None else None,
+            "states": len(self.states),
+            "bytes": sum(v.nbytes for v in snapshot.columns.values()) if snapshot is not None else 0,
+            "last_build": self.last_build,
+        }
+
+
+builder = ScreenerBuilder()
+
+
+def start_scheduler(symbols: list):
+    """夜間の再構築ジョブを APScheduler に登録して開始 (スナップショットがなければすぐに1回実行)"""
+    from datetime import datetime
+
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(
+        builder.rebuild, CronTrigger(hour=SCREENER_CRON_HOUR, minute=SCREENER_CRON_MINUTE),
+        args=[symbols], id="nightly_screener", max_instances=1, coalesce=True,
+    )
+    if builder.snapshot is None:
+        scheduler.add_job(builder.rebuild, args=[symbols], id="initial_screener", next_run_time=datetime.now())
+    scheduler.start()
+    return scheduler
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import shared_cache
+
+# ニュース見出しのセンチメント
+#
+# 同じ見出しはリクエストや銘柄をまたいで何度も現れるため、見出しのIDまたはハッシュをキーに
+# スコアをキャッシュし、未評価の見出しだけをまとめてスコアリングする。
+# キャッシュはプロセス内に持つので、スコアリングはプロセスプールではなくスレッドで呼び出す。
+# プロセス内にないスコアはワーカー間の共有キャッシュ (shared_cache) からも探す。
+
+# 使用するスコアラー ("textblob" または "lexicon")
+SENTIMENT_SCORER = os.getenv("SENTIMENT_SCORER", "textblob")
+SENTIMENT_CACHE_TTL = float(os.getenv("SENTIMENT_CACHE_TTL", "86400"))
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "50000"))
+
+
+class TextBlobScorer:
+    """TextBlob (Pattern) の極性スコア"""
+
+    name = "textblob"
+
+    def score(self, titles: list) -> np.ndarray:
+        from textblob import TextBlob
+
+        return np.array([TextBlob(title).sentiment.polarity for title in titles], dtype=float)
+
+
+class LexiconScorer:
+    """TextBlob と同じ辞書の単語極性を、見出し×単語の疎行列の積でまとめて平均する
+
+    否定語や強調語による補正は行わないため TextBlob の近似値になる。
+    """
+
+    name = "lexicon"
+
+    def __init__(self):
+        from sklearn.feature_extraction.text import CountVectorizer
+        from textblob.en import sentiment as lexicon
+
+        words = sorted(lexicon.keys())
+        polarity = np.array([
+            (entry.get(None) or next(iter(entry.values())))[0] for entry in (lexicon[w] for w in words)
+        ], dtype=float)
+        self.vectorizer = CountVectorizer(
+            vocabulary={w: i for i, w in enumerate(words)}, lowercase=True,
+            token_pattern=r"(?u)\b[\w'-]+\b",
+        )
+        self.polarity = polarity
+
+    def score(self, titles: list) -> np.ndarray:
+        if not titles:
+            return np.empty(0)
+        counts = self.vectorizer.transform(titles)
+        matched = np.asarray(counts.sum(axis=1)).ravel()
+        total = counts @ self.polarity
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scores = np.where(matched > 0, total / np.maximum(matched, 1), 0.0)
+        return np.clip(scores, -1.0, 1.0)
+
+
+SCORERS = {"textblob": TextBlobScorer, "lexicon": LexiconScorer}
+
+
+def headline_key(item: dict) -> str:
+    """見出しの識別子 (プロバイダのIDがなければタイトルのハッシュ)"""
+    uuid = item.get("uuid")
+    if uuid:
+        return uuid
+    return hashlib.sha1(item.get("title", "").encode()).hexdigest()
+
+
+class SentimentCache:
+    """見出しキーごとのスコアを保持する TTL + LRU キャッシュ"""
+
+    def __init__(self, maxsize: int = SENTIMENT_CACHE_SIZE, ttl: float = SENTIMENT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: list) -> dict:
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or now - entry[0] > self.ttl:
+                    if entry is not None:
+                        del self._entries[key]
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+                self.hits += 1
+        return found
+
+    def put_many(self, scores: dict):
+        now = time.monotonic()
+        with self._lock:
+            for key, score in scores.items():
+                self._entries[key] = (now, score)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+            }
+
+
+class SentimentPipeline:
+    """キャッシュにない見出しだけを1回のバッチでスコアリングする"""
+
+    def __init__(self, scorer=None, cache: SentimentCache = None, shared: shared_cache.SharedCache = None):
+        self.scorer = scorer or SCORERS[SENTIMENT_SCORER]()
+        self.cache = cache or SentimentCache()
+        self.shared = shared or shared_cache.cache
+
+    def _shared_key(self, key: str) -> str:
+        return f"sentiment:{self.scorer.name}:{key}"
+
+    def score(self, items: list) -> list:
+        keys = [headline_key(item) for item in items]
+        scores = self.cache.get_many(keys)
+        unseen = {}
+        for key, item in zip(keys, items):
+            if key not in scores:
+                unseen.setdefault(key, item.get("title", ""))
+        if unseen:
+            shared = self.shared.get_many([self._shared_key(key) for key in unseen])
+            known = {key: shared[self._shared_key(key)] for key in unseen if self._shared_key(key) in shared}
+            for key in known:
+                del unseen[key]
+            fresh = {}
+            if unseen:
+                fresh = dict(zip(unseen, (float(s) for s in self.scorer.score(list(unseen.values())))))
+                self.shared.set_many({self._shared_key(key): score for key, score in fresh.items()}, self.cache.ttl)
+            self.cache.put_many({**known, **fresh})
+            scores.update(known)
+            scores.update(fresh)
+        return [scores[key] for key in keys]
+
+    def stats(self) -> dict:
+        return {"scorer": self.scorer.name, **self.cache.stats()}
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> SentimentPipeline:
+    """プロセス共通のパイプライン (スコアラーの初期化は初回利用時)"""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = SentimentPipeline()
+    return _pipeline
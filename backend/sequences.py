@@ -0,0 +1,91 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 学習用の時系列シーケンスの生成
+#
+# 60日分のスライスを1つずつコピーして積み上げる代わりに、元の配列へのストライドビューとして
+# 全ウィンドウを表現する。実際にコピーが発生するのはバッチを取り出すときだけ。
+
+
+def sliding_windows(data: np.ndarray, length: int):
+    """(時点, 特徴量) の配列から X[i] = data[i:i+length]、y[i] = data[i+length, 0] をコピーなしで作る
+
+    X は (サンプル数, length, 特徴量) の読み取り専用ビュー。
+    """
+    if len(data) <= length:
+        return np.empty((0, length, data.shape[1]), dtype=data.dtype), np.empty(0, dtype=data.dtype)
+    X = sliding_window_view(data[:-1], length, axis=0).transpose(0, 2, 1)
+    y = data[length:, 0]
+    return X, y
+
+
+def iter_batches(X: np.ndarray, y: np.ndarray, batch_size: int, indices=None, shuffle: bool = False, rng=None):
+    """ウィンドウのビューからバッチ単位でだけ実データを取り出す"""
+    if indices is None:
+        indices = np.arange(len(X))
+    if shuffle:
+        indices = (rng or np.random.default_rng()).permutation(indices)
+    for start in range(0, len(indices), batch_size):
+        batch = indices[start:start + batch_size]
+        yield X[batch], y[batch]
+
+
+def to_tf_dataset(batches_fn, sequence_length: int, n_features: int):
+    """バッチを返すジェネレータ関数から tf.data.Dataset を作る (エポックごとに再生成される)"""
+    import tensorflow as tf
+
+    return tf.data.Dataset.from_generator(
+        batches_fn,
+        output_signature=(
+            tf.TensorSpec(shape=(None, sequence_length, n_features), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32),
+        ),
+    ).prefetch(tf.data.AUTOTUNE)
+
+
+class MultiSymbolSequenceDataset:
+    """多数の銘柄のシーケンスを、一度に resident_symbols 銘柄分だけメモリに載せてバッチ化する
+
+    load_fn(symbol) は (時点, 特徴量) のスケーリング済み配列を返す関数。
+    読み込んだ銘柄のウィンドウを混ぜてシャッフルし、使い終わった銘柄から解放する。
+    """
+
+    def __init__(self, symbols, load_fn, sequence_length: int, n_features: int,
+                 batch_size: int = 32, resident_symbols: int = 8, shuffle: bool = True, seed: int = None):
+        self.symbols = list(symbols)
+        self.load_fn = load_fn
+        self.sequence_length = sequence_length
+        self.n_features = n_features
+        self.batch_size = batch_size
+        self.resident_symbols = resident_symbols
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+
+    def __iter__(self):
+        order = self.rng.permutation(len(self.symbols)) if self.shuffle else range(len(self.symbols))
+        order = [self.symbols[i] for i in order]
+        for start in range(0, len(order), self.resident_symbols):
+            windows = []
+            for symbol in order[start:start + self.resident_symbols]:
+                data = np.asarray(self.load_fn(symbol), dtype=np.float32)
+                X, y = sliding_windows(data, self.sequence_length)
+                if len(X):
+                    windows.append((X, y))
+            if not windows:
+                continue
+            # (銘柄番号, サンプル番号) の組をシャッフルしてバッチを作る
+            pairs = np.concatenate([
+                np.stack([np.full(len(X), i), np.arange(len(X))], axis=1)
+                for i, (X, _) in enumerate(windows)
+            ])
+            if self.shuffle:
+                pairs = self.rng.permutation(pairs)
+            for b in range(0, len(pairs), self.batch_size):
+                batch = pairs[b:b + self.batch_size]
+                yield (
+                    np.stack([windows[i][0][j] for i, j in batch]),
+                    np.array([windows[i][1][j] for i, j in batch], dtype=np.float32),
+                )
+
+    def to_tf_dataset(self):
+        return to_tf_dataset(self.__iter__, self.sequence_length, self.n_features)
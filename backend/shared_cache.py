@@ -0,0 +1,331 @@
+import fcntl
+import os
+import pickle
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from sqlalchemy import Column, Float, LargeBinary, MetaData, String, Table, create_engine, delete, event, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+import metrics
+from providers import SingleFlight
+
+# 同じホストの uvicorn ワーカー間で共有するキャッシュ
+#
+# 各ワーカーはプロセス内の LRU を持ったまま、その手前で取り逃した値をこの SQLite (WAL) から
+# 読む。値がなければキーごとの「取得中」の印 (リース) を1つのワーカーだけが取り、他のワーカーは
+# 値が書かれるまで待つ。これでワーカー数に関わらず、同じキーのプロバイダ呼び出しは1回になる。
+# リースには期限があり、取得中のワーカーが落ちても期限が切れれば別のワーカーが引き継ぐ。
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# 空文字列の場合は共有せず、プロセス内の single-flight だけになる
+# (既定では uvicorn のワーカーが複数のときだけ共有する。1ワーカーでは書き込みの分だけ遅くなる)
+SHARED_CACHE_URL = os.getenv(
+    "SHARED_CACHE_URL",
+    "sqlite:///" + os.path.join(_DATA_DIR, "shared_cache.db") if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "",
+)
+# リースの有効期限 (秒)。プロバイダ呼び出しの最大の所要時間より長くする
+SHARED_LEASE_TTL = float(os.getenv("SHARED_LEASE_TTL", "30"))
+# 取得結果が None (銘柄が存在しない等) だったことを覚えておく秒数。待っていたワーカーが
+# それぞれ取得し直さないように、短い期間だけ「値なし」を共有する
+SHARED_NEGATIVE_TTL = float(os.getenv("SHARED_NEGATIVE_TTL", "10"))
+# 他のワーカーの取得完了を確かめる間隔 (秒)
+SHARED_POLL_INTERVAL = float(os.getenv("SHARED_POLL_INTERVAL", "0.02"))
+# スケジューラ等を1つのワーカーだけで動かすためのロックファイルの置き場所
+SHARED_LOCK_DIR = os.getenv("SHARED_LOCK_DIR", _DATA_DIR)
+
+metadata = MetaData()
+
+entries = Table(
+    "entries", metadata,
+    Column("key", String, primary_key=True),
+    Column("value", LargeBinary, nullable=False),  # pickle
+    Column("expires_at", Float, nullable=False),
+)
+
+leases = Table(
+    "leases", metadata,
+    Column("key", String, primary_key=True),
+    Column("owner", String, nullable=False),
+    Column("expires_at", Float, nullable=False),
+)
+
+
+class _Missing:
+    """取得結果が None だったことを表す印"""
+
+
+def create_tables(engine, metadata: MetaData):
+    """テーブルと索引を作成する (既にあれば何もしない)
+
+    metadata.create_all は存在確認と作成が別の文なので、複数のワーカーが同時に起動すると
+    後から作成した側が失敗する。IF NOT EXISTS を付けて1つのトランザクションで作成する。
+    """
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            conn.execute(CreateTable(table, if_not_exists=True))
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _sqlite_pragmas(dbapi_conn, _):
+    # 読み取りが書き込みを待たないように WAL にする
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+class SharedCache:
+    """キーごとに TTL を持つプロセス間共有のキャッシュと、プロセス間の single-flight"""
+
+    # 期限切れのエントリを消す間隔 (書き込み回数)
+    PURGE_EVERY = 1000
+
+    def __init__(self, url: str = SHARED_CACHE_URL, lease_ttl: float = SHARED_LEASE_TTL,
+                 poll_interval: float = SHARED_POLL_INTERVAL, negative_ttl: float = SHARED_NEGATIVE_TTL):
+        self.url = url
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.negative_ttl = negative_ttl
+        self._engine = None
+        self._writes = 0
+        self.stats_counts = {"hit": 0, "miss": 0, "fill": 0, "waited": 0}
+        self._reset()
+
+    def _reset(self):
+        # リースの名義はプロセスごとに分ける
+        self._pid = os.getpid()
+        self._owner = f"{self._pid}-{uuid.uuid4().hex[:8]}"
+        self._engine_lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._local_locks = {}
+
+    def _check_fork(self):
+        # fork した子プロセスは親の接続・ロック・リースの名義を引き継がない
+        if self._pid != os.getpid():
+            if self._engine is not None:
+                self._engine.dispose(close=False)
+                self._engine = None
+            self._reset()
+
+    @property
+    def owner(self) -> str:
+        self._check_fork()
+        return self._owner
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    @property
+    def engine(self):
+        self._check_fork()
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    if self.url.startswith("sqlite:///"):
+                        path = self.url[len("sqlite:///"):]
+                        if path and path != ":memory:":
+                            os.makedirs(os.path.dirname(path), exist_ok=True)
+                    engine = create_engine(self.url, connect_args={"timeout": 30})
+                    event.listen(engine, "connect", _sqlite_pragmas)
+                    create_tables(engine, metadata)
+                    self._engine = engine
+        return self._engine
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats_counts[name] += n
+
+    def get(self, key: str):
+        """値を返す (ないか期限切れなら None)"""
+        value = self._lookup(key)
+        return None if isinstance(value, _Missing) else value
+
+    def _lookup(self, key: str):
+        """保存された値を返す (「値なし」の印はそのまま返す)"""
+        if not self.enabled:
+            return None
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(entries.c.value).where(entries.c.key == key, entries.c.expires_at > time.time())
+            ).first()
+        return pickle.loads(row.value) if row is not None else None
+
+    def get_many(self, keys: list) -> dict:
+        """見つかったキーだけの {キー: 値}"""
+        if not self.enabled or not keys:
+            return {}
+        found = {}
+        now = time.time()
+        with self.engine.connect() as conn:
+            # SQLite の変数の上限を超えないように分けて問い合わせる
+            for i in range(0, len(keys), 500):
+                rows = conn.execute(
+                    select(entries.c.key, entries.c.value)
+                    .where(entries.c.key.in_(keys[i:i + 500]), entries.c.expires_at > now)
+                )
+                found.update((row.key, pickle.loads(row.value)) for row in rows)
+        return {key: value for key, value in found.items() if not isinstance(value, _Missing)}
+
+    def set(self, key: str, value, ttl: float):
+        """値を ttl 秒間保存する (None は保存しない)"""
+        if value is not None:
+            self.set_many({key: value}, ttl)
+
+    def set_many(self, values: dict, ttl: float):
+        if not self.enabled:
+            return
+        expires_at = time.time() + ttl
+        rows = [
+            {"key": key, "value": pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), "expires_at": expires_at}
+            for key, value in values.items() if value is not None
+        ]
+        if not rows:
+            return
+        stmt = sqlite_insert(entries)
+        with self.engine.begin() as conn:
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=["key"],
+                set_={"value": stmt.excluded.value, "expires_at": stmt.excluded.expires_at},
+            ), rows)
+        with self._lock:
+            before = self._writes
+            self._writes += len(rows)
+            purge = self._writes // self.PURGE_EVERY != before // self.PURGE_EVERY
+        if purge:
+            self.purge()
+
+    def delete(self, key: str):
+        if not self.enabled:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(delete(entries).where(entries.c.key == key))
+
+    def purge(self):
+        """期限切れのエントリとリースを削除"""
+        now = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(delete(entries).where(entries.c.expires_at <= now))
+            conn.execute(delete(leases).where(leases.c.expires_at <= now))
+
+    def _acquire(self, key: str) -> bool:
+        """リースを取る (他のワーカーの有効なリースがあれば False)"""
+        now = time.time()
+        stmt = sqlite_insert(leases).values(key=key, owner=self.owner, expires_at=now + self.lease_ttl)
+        with self.engine.begin() as conn:
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=["key"],
+                set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+                where=leases.c.expires_at <= now,
+            ))
+            owner = conn.execute(select(leases.c.owner).where(leases.c.key == key)).scalar()
+        return owner == self.owner
+
+    def _release(self, key: str):
+        with self.engine.begin() as conn:
+            conn.execute(delete(leases).where(leases.c.key == key, leases.c.owner == self.owner))
+
+    @contextmanager
+    def lock(self, key: str):
+        """key ごとのプロセス間の排他 (共有しない設定ではプロセス内だけ)
+
+        リースの名義はプロセス単位なので、同じプロセスのスレッド同士はプロセス内のロックで待たせる。
+        """
+        self._check_fork()
+        with self._lock:
+            local = self._local_locks.setdefault(key, threading.Lock())
+        with local:
+            if not self.enabled:
+                yield
+                return
+            while not self._acquire(key):
+                time.sleep(self.poll_interval)
+            try:
+                yield
+            finally:
+                self._release(key)
+
+    def single_flight(self, key: str, fn, ttl: float):
+        """key の値を返す。どのワーカーにもなければ1つのワーカーだけが fn() を実行して保存する
+
+        fn() が None を返した場合は negative_ttl 秒の間だけ「値なし」として共有する。
+        """
+        value = self._lookup(key)
+        if value is not None:
+            self._count("hit")
+            metrics.CACHE_LOOKUPS.inc("shared", "hit")
+            return None if isinstance(value, _Missing) else value
+        self._count("miss")
+        metrics.CACHE_LOOKUPS.inc("shared", "miss")
+        self._check_fork()
+        # 同じプロセス内のスレッドはリースを取り合わず、先行する呼び出しの結果を待つ
+        return self._flight.do(("value", key), lambda: self._fill(key, fn, ttl))[0]
+
+    def _fill(self, key: str, fn, ttl: float):
+        if not self.enabled:
+            self._count("fill")
+            return fn()
+        while True:
+            if self._acquire(key):
+                try:
+                    # リースを待っている間に他のワーカーが書き込んだ場合はそれを使う
+                    value = self._lookup(key)
+                    if value is None:
+                        self._count("fill")
+                        value = fn()
+                        if value is None:
+                            self.set(key, _Missing(), self.negative_ttl)
+                        else:
+                            self.set(key, value, ttl)
+                    return None if isinstance(value, _Missing) else value
+                finally:
+                    self._release(key)
+            time.sleep(self.poll_interval)
+            value = self._lookup(key)
+            if value is not None:
+                self._count("waited")
+                return None if isinstance(value, _Missing) else value
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self.stats_counts)
+        result = {"enabled": self.enabled, "owner": self.owner, **counts}
+        if self.enabled:
+            now = time.time()
+            with self.engine.connect() as conn:
+                for name, table in (("entries", entries), ("leases", leases)):
+                    result[name] = conn.execute(
+                        select(func.count()).select_from(table).where(table.c.expires_at > now)
+                    ).scalar()
+        return result
+
+
+cache = SharedCache()
+
+_leader_files = {}
+
+
+def acquire_leader(name: str) -> bool:
+    """ホスト上のワーカーのうち最初に呼んだ1つだけが True を得る
+
+    ファイルロックはプロセスが終わると外れるため、落ちたワーカーの代わりに起動した
+    ワーカーが引き継げる。
+    """
+    if name in _leader_files:
+        return True
+    os.makedirs(SHARED_LOCK_DIR, exist_ok=True)
+    f = open(os.path.join(SHARED_LOCK_DIR, f"{name}.lock"), "w")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _leader_files[name] = f
+    return True
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import analysis
+from streaming_indicators import IndicatorState
+
+logger = logging.getLogger(__name__)
+
+# 価格と指標の配信
+#
+# 購読されている銘柄の価格は全クライアント共通で1周期に1回だけ (全銘柄まとめて) 取得し、
+# 銘柄ごとのストリーミング指標を当日足の更新として反映して、変化した値だけを配信する。
+# 各クライアントの未送信メッセージは銘柄ごとに1件へまとめるため、遅いクライアントが
+# いても溜まるのは最大で購読銘柄数ぶんだけ。
+
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "15"))
+# 指標の初期化に使う日足の期間と、日足を取り直す間隔 (秒)
+STREAM_HISTORY_PERIOD = os.getenv("STREAM_HISTORY_PERIOD", "6mo")
+STREAM_HISTORY_REFRESH = float(os.getenv("STREAM_HISTORY_REFRESH", "300"))
+STREAM_MAX_SYMBOLS = int(os.getenv("STREAM_MAX_SYMBOLS", "50"))
+
+
+def _clean(value):
+    return None if value is None or (isinstance(value, float) and math.isnan(value)) else round(float(value), 4)
+
+
+class Subscription:
+    """1クライアント分の購読 (銘柄ごとに未送信のメッセージを1件にまとめて保持する)"""
+
+    def __init__(self):
+        self.symbols = set()
+        self.coalesced = 0
+        self._pending = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def push(self, symbol: str, message: dict):
+        pending = self._pending.get(symbol)
+        if pending is not None:
+            # 送信前に次の更新が来た場合は差分を重ねる (スナップショットは全体を保つ)
+            self.coalesced += 1
+            message = {
+                **pending, **message,
+                "type": "snapshot" if pending["type"] == "snapshot" else message["type"],
+                "indicators": {**pending.get("indicators", {}), **message.get("indicators", {})},
+            }
+        self._pending[symbol] = message
+        self._ready.set()
+
+    async def get(self) -> list:
+        """未送信のメッセージが来るまで待ち、まとめて取り出す"""
+        await self._ready.wait()
+        self._ready.clear()
+        messages = list(self._pending.values())
+        self._pending.clear()
+        return messages
+
+
+class SymbolFeed:
+    """1銘柄分の指標状態と購読者"""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.subscribers = set()
+        self.state = None
+        self.history_loaded_at = 0.0
+        self.price = None
+        self.indicators = {}
+        self.signals = []
+        self.updated_at = None
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "snapshot",
+            "symbol": self.symbol,
+            "price": self.price,
+            "time": self.updated_at,
+            "indicators": dict(self.indicators),
+            "signals": self.signals,
+        }
+
+
+class StreamHub:
+    """購読中の銘柄の価格を一括取得し、指標の差分を購読者へ配る"""
+
+    def __init__(self, fetch_quotes, load_history, run_io, run_cpu, interval: float = STREAM_POLL_INTERVAL):
+        self.fetch_quotes = fetch_quotes
+        self.load_history = load_history
+        self.run_io = run_io
+        self.run_cpu = run_cpu
+        self.interval = interval
+        self.feeds = {}
+        self._task = None
+        self.polls = 0
+        self.messages = 0
+
+    def subscribe(self, subscription: Subscription, symbols: list):
+        for symbol in symbols:
+            if symbol in subscription.symbols:
+                continue
+            feed = self.feeds.get(symbol)
+            if feed is None:
+                feed = self.feeds[symbol] = SymbolFeed(symbol)
+            feed.subscribers.add(subscription)
+            subscription.symbols.add(symbol)
+            if feed.updated_at is not None:
+                subscription.push(symbol, feed.snapshot())
+        if self.feeds and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    def unsubscribe(self, subscription: Subscription, symbols: list = None):
+        for symbol in list(subscription.symbols if symbols is None else symbols):
+            subscription.symbols.discard(symbol)
+            feed = self.feeds.get(symbol)
+            if feed is None:
+                continue
+            feed.subscribers.discard(subscription)
+            if not feed.subscribers:
+                del self.feeds[symbol]
+        if not self.feeds and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while self.feeds:
+            start = time.monotonic()
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("stream polling failed: %s", e)
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - start)))
+
+    async def poll(self):
+        """全購読銘柄の価格を1回で取得して各銘柄の状態を更新"""
+        symbols = list(self.feeds)
+        if not symbols:
+            return
+        quotes = await self.run_io(self.fetch_quotes, symbols)
+        self.polls += 1
+        now = time.time()
+        await asyncio.gather(*(
+            self._refresh_history(self.feeds[symbol], now)
+            for symbol in quotes
+            if symbol in self.feeds and now - self.feeds[symbol].history_loaded_at > STREAM_HISTORY_REFRESH
+        ), return_exceptions=True)
+        for symbol, price in quotes.items():
+            feed = self.feeds.get(symbol)
+            if feed is not None and feed.state is not None:
+                self._apply(feed, price, now)
+
+    async def _refresh_history(self, feed: SymbolFeed, now: float):
+        """日足を取り直し、未反映のバーだけを指標へ反映する"""
+        df = await self.run_io(self.load_history, feed.symbol, STREAM_HISTORY_PERIOD)
+        if df.empty:
+            return
+        if feed.state is None or not feed.state.apply_history(df):
+            feed.state = await self.run_cpu(IndicatorState.from_history, df)
+        feed.history_loaded_at = now
+
+    def _apply(self, feed: SymbolFeed, price: float, now: float):
+        state = feed.state
+        last = pd.Timestamp(state.last_timestamp)
+        # 当日足がある場合だけ価格で更新する (新しい日の足は日足の取り直しで追加される)
+        if pd.Timestamp.now(tz=last.tz).normalize() == last.normalize():
+            high, low, _ = state.last_bar
+            state.revise(max(high, price), min(low, price), price)
+
+        indicators = {key: _clean(value) for key, value in state.latest.items()}
+        changed = {key: value for key, value in indicators.items() if feed.indicators.get(key, ...) != value}
+        signals = analysis.build_technical_result(feed.symbol, state.latest, state.previous)["signals"]
+        first = feed.updated_at is None
+        signals_changed = signals != feed.signals
+        if not (first or changed or signals_changed or price != feed.price):
+            return
+        feed.price, feed.indicators, feed.signals, feed.updated_at = price, indicators, signals, now
+
+        if first:
+            message = feed.snapshot()
+        else:
+            message = {"type": "delta", "symbol": feed.symbol, "price": price, "time": now, "indicators": changed}
+            if signals_changed:
+                message["signals"] = signals
+        for subscription in feed.subscribers:
+            subscription.push(feed.symbol, message)
+            self.messages += 1
+
+    def stats(self) -> dict:
+        subscriptions = {s for feed in self.feeds.values() for s in feed.subscribers}
+        return {
+            "symbols": len(self.feeds),
+            "subscriptions": len(subscriptions),
+            "polls": self.polls,
+            "messages": self.messages,
+            "coalesced": sum(s.coalesced for s in subscriptions),
+            "interval_seconds": self.interval,
+        }
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,458 @@
+import math
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+
+import indicators
+
+# 新しいバーごとに O(1) で更新できるテクニカル指標
+#
+# 各指標は seed() で過去データ (numpy 配列) から状態を一括で初期化し、以降は
+# update() で確定バーを追加、revise() で最新バー (未確定の当日足など) を差し替える。
+# 値の定義は indicators.py (ta ライブラリ互換) と同じ。
+
+# 累積和の誤差を抑えるため、この回数ごとにバッファから合計を再計算する
+_RESYNC_INTERVAL = 1000
+
+
+class StreamingSMA:
+    """リングバッファと累積和による単純移動平均"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._buf = deque(maxlen=window)
+        self._sum = 0.0
+        self._updates = 0
+
+    def seed(self, x: np.ndarray):
+        self._buf = deque((float(v) for v in x[-self.window:]), maxlen=self.window)
+        self._sum = math.fsum(self._buf)
+
+    def update(self, x: float) -> float:
+        if len(self._buf) == self.window:
+            self._sum -= self._buf[0]
+        self._buf.append(x)
+        self._sum += x
+        self._updates += 1
+        if self._updates % _RESYNC_INTERVAL == 0:
+            self._sum = math.fsum(self._buf)
+        return self.value
+
+    def revise(self, x: float) -> float:
+        if not self._buf:
+            return self.update(x)
+        self._sum += x - self._buf[-1]
+        self._buf[-1] = x
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if len(self._buf) < self.window:
+            return math.nan
+        return self._sum / self.window
+
+
+class StreamingEMA:
+    """再帰式による指数移動平均 (ewm(adjust=False) 互換)"""
+
+    def __init__(self, span: int = None, alpha: float = None, min_periods: int = 1):
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1)
+        self.min_periods = max(min_periods, 1)
+        self._value = None
+        self._prev = None
+        self._count = 0
+
+    def seed(self, x: np.ndarray):
+        x = np.asarray(x, dtype=float)
+        self._count = int(np.isfinite(x).sum())
+        self._value = float(indicators.ema(x, alpha=self.alpha)[-1]) if self._count else None
+        self._prev = None
+
+    def update(self, x: float) -> float:
+        self._prev = self._value
+        self._value = x if self._value is None else self.alpha * x + (1 - self.alpha) * self._value
+        self._count += 1
+        return self.value
+
+    def revise(self, x: float) -> float:
+        if self._count == 0:
+            return self.update(x)
+        self._value = x if self._prev is None else self.alpha * x + (1 - self.alpha) * self._prev
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if self._count < self.min_periods:
+            return math.nan
+        return self._value
+
+
+class StreamingMACD:
+    """MACD (短期・長期EMAの差とそのシグナル線)"""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = StreamingEMA(span=fast, min_periods=fast)
+        self.slow = StreamingEMA(span=slow, min_periods=slow)
+        self.signal = StreamingEMA(span=signal, min_periods=signal)
+        self._fed_signal = False
+
+    def seed(self, x: np.ndarray):
+        self.fast.seed(x)
+        self.slow.seed(x)
+        macd_line, _, _ = indicators.macd(x, self.fast_span, self.slow_span)
+        self.signal.seed(macd_line)
+        self._fed_signal = False
+
+    @property
+    def fast_span(self) -> int:
+        return self.fast.min_periods
+
+    @property
+    def slow_span(self) -> int:
+        return self.slow.min_periods
+
+    def update(self, x: float):
+        line = self.fast.update(x) - self.slow.update(x)
+        # シグナル線は MACD が有効になってから計算を始める
+        self._fed_signal = not math.isnan(line)
+        if self._fed_signal:
+            self.signal.update(line)
+        return self.value
+
+    def revise(self, x: float):
+        line = self.fast.revise(x) - self.slow.revise(x)
+        if self._fed_signal and not math.isnan(line):
+            self.signal.revise(line)
+        return self.value
+
+    @property
+    def value(self):
+        line = self.fast.value - self.slow.value
+        signal = self.signal.value if not math.isnan(line) else math.nan
+        return line, signal, line - signal
+
+
+class StreamingRSI:
+    """Wilder 平滑化による RSI"""
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.avg_up = StreamingEMA(alpha=1.0 / window, min_periods=window)
+        self.avg_down = StreamingEMA(alpha=1.0 / window, min_periods=window)
+        self._last_close = None
+        self._prev_close = None
+
+    def seed(self, x: np.ndarray):
+        x = np.asarray(x, dtype=float)
+        diff = np.diff(x, prepend=x[:1])
+        self.avg_up.seed(np.where(diff > 0, diff, 0.0))
+        self.avg_down.seed(np.where(diff < 0, -diff, 0.0))
+        self._last_close = float(x[-1]) if len(x) else None
+        self._prev_close = None
+
+    def _diff(self, x: float, base) -> float:
+        return 0.0 if base is None else x - base
+
+    def update(self, x: float) -> float:
+        diff = self._diff(x, self._last_close)
+        self.avg_up.update(max(diff, 0.0))
+        self.avg_down.update(max(-diff, 0.0))
+        self._prev_close, self._last_close = self._last_close, x
+        return self.value
+
+    def revise(self, x: float) -> float:
+        diff = self._diff(x, self._prev_close)
+        self.avg_up.revise(max(diff, 0.0))
+        self.avg_down.revise(max(-diff, 0.0))
+        self._last_close = x
+        return self.value
+
+    @property
+    def value(self) -> float:
+        up, down = self.avg_up.value, self.avg_down.value
+        if math.isnan(down):
+            return math.nan
+        if down == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + up / down)
+
+
+class StreamingBollinger:
+    """移動分散をリングバッファの和と二乗和で保持するボリンジャーバンド"""
+
+    def __init__(self, window: int = 20, k: float = 2.0):
+        self.window = window
+        self.k = k
+        self._buf = deque(maxlen=window)
+        self._shift = 0.0  # 桁落ちを避けるための中心化オフセット
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._updates = 0
+
+    def _resync(self):
+        d = [v - self._shift for v in self._buf]
+        self._sum = math.fsum(d)
+        self._sumsq = math.fsum(v * v for v in d)
+
+    def seed(self, x: np.ndarray):
+        self._buf = deque((float(v) for v in x[-self.window:]), maxlen=self.window)
+        self._shift = self._buf[-1] if self._buf else 0.0
+        self._resync()
+
+    def update(self, x: float):
+        if not self._buf:
+            self._shift = x
+        if len(self._buf) == self.window:
+            old = self._buf[0] - self._shift
+            self._sum -= old
+            self._sumsq -= old * old
+        self._buf.append(x)
+        d = x - self._shift
+        self._sum += d
+        self._sumsq += d * d
+        self._updates += 1
+        if self._updates % _RESYNC_INTERVAL == 0:
+            self._resync()
+        return self.value
+
+    def revise(self, x: float):
+        if not self._buf:
+            return self.update(x)
+        old = self._buf[-1] - self._shift
+        d = x - self._shift
+        self._sum += d - old
+        self._sumsq += d * d - old * old
+        self._buf[-1] = x
+        return self.value
+
+    @property
+    def value(self):
+        if len(self._buf) < self.window:
+            return math.nan, math.nan, math.nan
+        mean = self._sum / self.window
+        std = math.sqrt(max(self._sumsq / self.window - mean * mean, 0.0))
+        middle = mean + self._shift
+        return middle + self.k * std, middle, middle - self.k * std
+
+
+class StreamingStochastic:
+    """単調デックで期間内の最高値・最安値を保持するストキャスティクス"""
+
+    def __init__(self, window: int = 14, smooth: int = 3):
+        self.window = window
+        self._highs = deque(maxlen=window)
+        self._lows = deque(maxlen=window)
+        self._max = deque()  # (位置, 高値) 高値の降順
+        self._min = deque()  # (位置, 安値) 安値の昇順
+        self._index = -1
+        self._close = math.nan
+        self._k = StreamingSMA(smooth)
+        self._fed_k = False
+
+    def _push(self, high: float, low: float):
+        i = self._index
+        while self._max and self._max[-1][1] <= high:
+            self._max.pop()
+        self._max.append((i, high))
+        while self._min and self._min[-1][1] >= low:
+            self._min.pop()
+        self._min.append((i, low))
+        while self._max[0][0] <= i - self.window:
+            self._max.popleft()
+        while self._min[0][0] <= i - self.window:
+            self._min.popleft()
+
+    def _rebuild(self):
+        """バッファからデックを作り直す (最新バーの差し替え時のみ、O(期間))"""
+        self._max.clear()
+        self._min.clear()
+        start = self._index - len(self._highs) + 1
+        for offset, (high, low) in enumerate(zip(self._highs, self._lows)):
+            i = start + offset
+            while self._max and self._max[-1][1] <= high:
+                self._max.pop()
+            self._max.append((i, high))
+            while self._min and self._min[-1][1] >= low:
+                self._min.pop()
+            self._min.append((i, low))
+
+    def seed(self, high: np.ndarray, low: np.ndarray, close: np.ndarray):
+        self._highs = deque((float(v) for v in high[-self.window:]), maxlen=self.window)
+        self._lows = deque((float(v) for v in low[-self.window:]), maxlen=self.window)
+        self._index = len(close) - 1
+        self._close = float(close[-1]) if len(close) else math.nan
+        self._rebuild()
+        k, _ = indicators.stochastic(high, low, close, self.window, self._k.window)
+        self._k.seed(k[np.isfinite(k)])
+        self._fed_k = False
+
+    def _raw_k(self) -> float:
+        if len(self._highs) < self.window:
+            return math.nan
+        highest, lowest = self._max[0][1], self._min[0][1]
+        if highest == lowest:
+            return math.nan
+        return 100.0 * (self._close - lowest) / (highest - lowest)
+
+    def update(self, high: float, low: float, close: float):
+        self._index += 1
+        self._highs.append(high)
+        self._lows.append(low)
+        self._close = close
+        self._push(high, low)
+        k = self._raw_k()
+        self._fed_k = not math.isnan(k)
+        if self._fed_k:
+            self._k.update(k)
+        return self.value
+
+    def revise(self, high: float, low: float, close: float):
+        if not self._highs:
+            return self.update(high, low, close)
+        self._highs[-1] = high
+        self._lows[-1] = low
+        self._close = close
+        self._rebuild()
+        k = self._raw_k()
+        if self._fed_k and not math.isnan(k):
+            self._k.revise(k)
+        return self.value
+
+    @property
+    def value(self):
+        k = self._raw_k()
+        return k, self._k.value if not math.isnan(k) else math.nan
+
+
+class IndicatorState:
+    """1銘柄分のストリーミング指標一式 (technical_analysis と calculate_trading_signals で使う値)"""
+
+    def __init__(self):
+        self.sma_5 = StreamingSMA(5)
+        self.sma_20 = StreamingSMA(20)
+        self.sma_50 = StreamingSMA(50)
+        self.ema_12 = StreamingEMA(span=12, min_periods=12)
+        self.ema_26 = StreamingEMA(span=26, min_periods=26)
+        self.macd = StreamingMACD()
+        self.rsi = StreamingRSI()
+        self.bollinger = StreamingBollinger()
+        self.stochastic = StreamingStochastic()
+        self.first_timestamp = None  # 初期化に使った履歴の先頭のバー
+        self.last_timestamp = None
+        self.last_bar = None
+        self.latest = None
+        self.previous = None
+
+    @classmethod
+    def from_history(cls, df: pd.DataFrame) -> "IndicatorState":
+        """過去データから状態を初期化 (最終バー以外を一括計算し、最終バーは通常の更新で反映)"""
+        if len(df) < 2:
+            raise ValueError("指標の初期化には2本以上のバーが必要です")
+        state = cls()
+        high = df['High'].to_numpy(dtype=float)
+        low = df['Low'].to_numpy(dtype=float)
+        close = df['Close'].to_numpy(dtype=float)
+        for indicator in (state.sma_5, state.sma_20, state.sma_50, state.ema_12, state.ema_26,
+                          state.macd, state.rsi, state.bollinger):
+            indicator.seed(close[:-1])
+        state.stochastic.seed(high[:-1], low[:-1], close[:-1])
+        state.first_timestamp = df.index[0]
+        state.latest = state._snapshot(close[-2]) if len(close) >= 2 else None
+        state.update(df.index[-1], high[-1], low[-1], close[-1])
+        return state
+
+    def _snapshot(self, close: float) -> dict:
+        macd_line, signal_line, histogram = self.macd.value
+        bb_upper, bb_middle, bb_lower = self.bollinger.value
+        stoch_k, stoch_d = self.stochastic.value
+        return {
+            "Close": close,
+            "SMA_5": self.sma_5.value,
+            "SMA_20": self.sma_20.value,
+            "SMA_50": self.sma_50.value,
+            "EMA_12": self.ema_12.value,
+            "EMA_26": self.ema_26.value,
+            "MACD": macd_line,
+            "MACD_signal": signal_line,
+            "MACD_diff": histogram,
+            "RSI": self.rsi.value,
+            "BB_upper": bb_upper,
+            "BB_middle": bb_middle,
+            "BB_lower": bb_lower,
+            "Stoch_K": stoch_k,
+            "Stoch_D": stoch_d,
+        }
+
+    def update(self, timestamp, high: float, low: float, close: float) -> dict:
+        """確定した新しいバーを追加"""
+        for indicator in (self.sma_5, self.sma_20, self.sma_50, self.ema_12, self.ema_26,
+                          self.macd, self.rsi, self.bollinger):
+            indicator.update(close)
+        self.stochastic.update(high, low, close)
+        self.previous = self.latest
+        self.latest = self._snapshot(close)
+        self.last_timestamp = timestamp
+        self.last_bar = (high, low, close)
+        return self.latest
+
+    def revise(self, high: float, low: float, close: float) -> dict:
+        """最新バーの値を差し替える (ティックごとの当日足の更新)"""
+        for indicator in (self.sma_5, self.sma_20, self.sma_50, self.ema_12, self.ema_26,
+                          self.macd, self.rsi, self.bollinger):
+            indicator.revise(close)
+        self.stochastic.revise(high, low, close)
+        self.latest = self._snapshot(close)
+        self.last_bar = (high, low, close)
+        return self.latest
+
+    def apply_history(self, df: pd.DataFrame) -> bool:
+        """取得した履歴のうち未反映のバーだけを反映 (反映できない場合は False)
+
+        期間の先頭が初期化時から動いた場合も False を返す。バーを足し続けると期間より長い履歴で
+        計算することになり、EMA・RSI や期間より長い SMA が同じ期間の一括計算と一致しなくなるため。
+        """
+        index = df.index
+        # 最終バーが含まれない場合は間のバーが欠けている可能性があるため作り直す
+        if self.last_timestamp is None or self.last_timestamp not in index:
+            return False
+        if index[0] != self.first_timestamp:
+            return False
+        high = df['High'].to_numpy(dtype=float)
+        low = df['Low'].to_numpy(dtype=float)
+        close = df['Close'].to_numpy(dtype=float)
+        start = index.get_loc(self.last_timestamp)
+        bar = (high[start], low[start], close[start])
+        if bar != self.last_bar:
+            self.revise(*bar)
+        start += 1
+        for i in range(start, len(index)):
+            self.update(index[i], high[i], low[i], close[i])
+        return True
+
+
+class IndicatorRegistry:
+    """(銘柄, 期間) ごとのストリーミング指標状態を保持する LRU"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+            return state
+
+    def put(self, key, state: IndicatorState):
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.maxsize:
+                self._states.popitem(last=False)
+
+    def __len__(self):
+        return len(self._states)
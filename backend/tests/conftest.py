@@ -0,0 +1,45 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# backend のモジュールはパッケージではなく直下に並んでいるので、どこから pytest を実行しても import できるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def synthetic_ohlc(n_symbols: int, n_bars: int, seed: int = 0):
+    """幾何ブラウン運動による擬似的な高値・安値・終値 (銘柄 × 時点)"""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.02, size=(n_symbols, n_bars))
+    close = 100 * np.exp(np.cumsum(returns, axis=1))
+    spread = np.abs(rng.normal(0, 0.01, size=close.shape)) * close
+    return close + spread, close - spread, close
+
+
+def synthetic_ohlcv(n_bars: int, seed: int = 0) -> pd.DataFrame:
+    """幾何ブラウン運動による擬似的な日足の OHLCV"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n_bars)))
+    open_ = close * (1 + rng.normal(0, 0.005, n_bars))
+    spread = np.abs(rng.normal(0, 0.01, n_bars)) * close
+    return pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) + spread,
+        "Low": np.minimum(open_, close) - spread,
+        "Close": close,
+        "Volume": rng.integers(100_000, 1_000_000, n_bars).astype(float),
+    }, index=pd.date_range("2020-01-01", periods=n_bars, freq="B", name="Date"))
+
+
+@pytest.fixture(scope="session")
+def ohlc_panel():
+    """synthetic_ohlc (銘柄 × 時点の配列を作る関数)"""
+    return synthetic_ohlc
+
+
+@pytest.fixture(scope="session")
+def ohlcv():
+    """synthetic_ohlcv (1銘柄の DataFrame を作る関数)"""
+    return synthetic_ohlcv
@@ -0,0 +1,113 @@
+"""アラートの板 (AlertBook) と AlertEngine の確認"""
+import numpy as np
+import pytest
+
+from alerts import AlertBook, AlertEngine
+
+
+def synthetic_alerts(n_alerts: int, n_symbols: int, seed: int = 0):
+    """現在値の前後 ±20% に閾値を置いたアラート"""
+    rng = np.random.default_rng(seed)
+    prices = rng.uniform(10, 500, n_symbols)
+    symbol_idx = rng.integers(0, n_symbols, n_alerts)
+    targets = prices[symbol_idx] * rng.uniform(0.8, 1.2, n_alerts)
+    conditions = np.where(targets >= prices[symbol_idx], "above", "below")
+    symbols = [f"SYM{i}" for i in range(n_symbols)]
+    alerts = [
+        (i, symbols[s], float(t), str(c))
+        for i, (s, t, c) in enumerate(zip(symbol_idx, targets, conditions))
+    ]
+    return symbols, prices, alerts
+
+
+def scan(alerts: list, active: set, symbol: str, price: float) -> list:
+    """全アラートを走査する素朴な方法 (照合用)"""
+    hit = [
+        alert_id for alert_id, s, target, condition in alerts
+        if alert_id in active and s == symbol
+        and (price >= target if condition == "above" else price <= target)
+    ]
+    active.difference_update(hit)
+    return hit
+
+
+def test_book_matches_full_scan():
+    symbols, prices, alerts = synthetic_alerts(2000, 20, seed=2)
+    book = AlertBook()
+    for alert in alerts:
+        book.add(*alert)
+    active = {alert[0] for alert in alerts}
+    rng = np.random.default_rng(4)
+    for s, r in zip(rng.integers(0, len(symbols), 500), rng.normal(0, 0.02, 500)):
+        prices[s] *= 1 + r
+        expected = scan(alerts, active, symbols[s], prices[s])
+        assert sorted(book.evaluate(symbols[s], prices[s])) == sorted(expected)
+    assert len(book) == len(active)
+
+
+def test_book_thresholds_are_inclusive_and_removable():
+    book = AlertBook()
+    book.add(1, "AAA", 100.0, "above")
+    book.add(2, "AAA", 100.0, "above")
+    book.add(3, "AAA", 90.0, "below")
+    assert book.remove(2, "AAA", 100.0, "above")
+    assert not book.remove(2, "AAA", 100.0, "above")
+    assert book.evaluate("AAA", 99.0) == []
+    assert book.evaluate("AAA", 100.0) == [1]
+    assert book.evaluate("AAA", 90.0) == [3]
+    assert book.symbols() == []
+
+
+@pytest.fixture
+def store_url(tmp_path):
+    return f"sqlite:///{tmp_path}/alerts.db"
+
+
+def test_engine_records_triggered_alerts(store_url):
+    engine = AlertEngine(store_url)
+    above = engine.create("AAA", 100.0, "above")
+    engine.create("AAA", 120.0, "above")
+    below = engine.create("BBB", 50.0, "below")
+    with pytest.raises(ValueError):
+        engine.create("AAA", 1.0, "sideways")
+
+    fired = engine.evaluate({"AAA": 105.0, "BBB": 49.0})
+    assert sorted(a["id"] for a in fired) == [above["id"], below["id"]]
+    assert engine.evaluate({"AAA": 105.0, "BBB": 49.0}) == []
+    assert engine.symbols() == ["AAA"]
+    stored = {a["id"]: a for a in engine.list(active=False)}
+    assert stored[above["id"]]["triggered_price"] == 105.0
+    assert stored[below["id"]]["triggered_price"] == 49.0
+
+
+def test_engines_sharing_a_store_fire_once(store_url):
+    """複数のワーカーが同じアラートを評価しても、発火として返すのは先に記録した1つだけ"""
+    first, second = AlertEngine(store_url), AlertEngine(store_url)
+    ids = [first.create("AAA", target, "above")["id"] for target in (100.0, 90.0)]
+    second.refresh()
+    assert sorted(a["id"] for a in second.evaluate({"AAA": 101.0})) == sorted(ids)
+    assert first.evaluate({"AAA": 101.0}) == []
+
+    # 他のワーカーで削除したアラートは refresh 後に評価されない
+    created = first.create("BBB", 10.0, "below")
+    second.refresh()
+    assert first.delete(created["id"])
+    second.refresh()
+    assert second.evaluate({"BBB": 5.0}) == []
+
+
+def test_failed_write_keeps_alerts_in_book(store_url, monkeypatch):
+    """発火の記録に失敗したアラートは板に残り、次の評価で発火する"""
+    engine = AlertEngine(store_url)
+    created = engine.create("AAA", 100.0, "above")
+
+    def fail():
+        raise RuntimeError("store unavailable")
+
+    with monkeypatch.context() as m:
+        m.setattr(engine.engine, "begin", fail)
+        with pytest.raises(RuntimeError):
+            engine.evaluate({"AAA": 105.0})
+    assert engine.symbols() == ["AAA"] and len(engine) == 1
+    assert [a["id"] for a in engine.evaluate({"AAA": 105.0})] == [created["id"]]
+    assert len(engine) == 0
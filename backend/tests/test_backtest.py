@@ -0,0 +1,80 @@
+"""ベクトル化したバックテストと、1バーずつ進める素朴な実装の一致の確認"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+
+
+@pytest.fixture(scope="module")
+def ind(ohlc_panel):
+    return backtest.prepare_indicators(*ohlc_panel(8, 400, seed=5))
+
+
+def scores_by_row(ind: dict, symbol: int, n_bars: int) -> np.ndarray:
+    """従来の calculate_trading_signals を各バーに適用したスコア (照合用)"""
+    from ml_models import calculate_trading_signals
+
+    df = pd.DataFrame({name: values[symbol] for name, values in ind.items()})
+    scores = np.zeros(n_bars, dtype=int)
+    for t in range(1, n_bars):
+        signals = calculate_trading_signals(df.iloc[t - 1:t + 1])
+        scores[t] = signals['buy_score'] - signals['sell_score']
+    return scores
+
+
+def loop_backtest(close: np.ndarray, pos: np.ndarray, cost: float):
+    """1銘柄をバーごとに進めて (総リターン, 取引ごとの損益) を返す (照合用)"""
+    equity, held = 1.0, 0.0
+    trades, trade = [], None
+    for t in range(len(close)):
+        r = close[t] / close[t - 1] - 1 if t else 0.0
+        equity *= 1 + max(held * r - cost * abs(pos[t] - held), -1.0)
+        if trade is not None:
+            trade *= max(1 + held * r, 0.0)
+        if pos[t] != held:
+            if held != 0:
+                trades.append(trade * (1 - cost * abs(held)) - 1)
+                trade = None
+            if pos[t] != 0:
+                trade = 1 - cost * abs(pos[t])
+        held = pos[t]
+    if trade is not None:
+        trades.append(trade - 1)
+    return equity - 1, trades
+
+
+def test_signal_scores_match_calculate_trading_signals(ind):
+    n_bars = 120
+    head = {name: values[:, :n_bars] for name, values in ind.items()}
+    expected = scores_by_row(head, 0, n_bars)
+    np.testing.assert_array_equal(backtest.signal_scores(head)[0][1:], expected[1:])
+
+
+@pytest.mark.parametrize("allow_short", [False, True])
+@pytest.mark.parametrize("cost", [0.0, 0.002])
+def test_run_backtest_matches_loop(ind, allow_short, cost):
+    result = backtest.run_backtest(ind, allow_short=allow_short, cost=cost)
+    pos = backtest.positions(backtest.signal_scores(ind), allow_short=allow_short)
+    for i in range(pos.shape[0]):
+        total, trades = loop_backtest(ind["Close"][i], pos[i], cost)
+        assert result["total_return"][i] == pytest.approx(total, rel=1e-9)
+        assert result["trades"][i] == len(trades)
+        if trades:
+            assert result["hit_rate"][i] == pytest.approx(np.mean(np.array(trades) > 0))
+        else:
+            assert np.isnan(result["hit_rate"][i])
+
+
+def test_trade_returns_include_costs_and_total_loss():
+    """空売りで 100% 以上損をしても NaN にならず、取引の損益は -1 で止まる"""
+    close = np.array([[100.0, 100.0, 100.0, 100.0, 250.0, 260.0, 100.0, 90.0]])
+    pos = np.array([[0.0, 0.0, -1.0, -1.0, -1.0, 0.0, 1.0, 1.0]])
+    held = np.concatenate([[[0.0]], pos[:, :-1]], axis=1)
+    returns = np.concatenate([[[0.0]], close[:, 1:] / close[:, :-1] - 1], axis=1)
+    with np.errstate(all="raise"):
+        rows, pnl = backtest._trade_returns(pos, held * returns, 0.01)
+    np.testing.assert_array_equal(rows, [0, 0])
+    # 最終バーで保有中の取引は建てたときのコストだけを含む
+    np.testing.assert_allclose(pnl, [-1.0, 0.99 * 0.9 - 1])
+    assert loop_backtest(close[0], pos[0], 0.01)[1] == pytest.approx(list(pnl))
@@ -0,0 +1,91 @@
+"""OHLCV のバーストア (取得済みの履歴と末尾だけの再取得) の確認"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import market_data
+from bar_store import BarStore
+
+
+class Provider:
+    """期間指定は全期間、start 指定はその日以降を返し、呼び出しを記録する"""
+
+    def __init__(self, full: pd.DataFrame, latency: float = 0.0):
+        self.full = full
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol, interval, period=None, start=None):
+        with self._lock:
+            self.calls.append((period, start))
+        time.sleep(self.latency)
+        if start:
+            return self.full[self.full.index >= start].copy()
+        return market_data.slice_period(self.full, period).copy()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BarStore(f"sqlite:///{tmp_path}/bars.db", refresh=60)
+
+
+@pytest.fixture
+def full(ohlcv):
+    return ohlcv(600).tz_localize("America/New_York")
+
+
+def test_round_trip_keeps_values_and_timezone(store, full):
+    provider = Provider(full)
+    fetched = store.read_through("AAA", "1y", "1d", provider)
+    stored = store.read_through("AAA", "1y", "1d", provider)
+    assert provider.calls == [("1y", None)]
+    assert str(stored.index.tz) == "America/New_York"
+    pd.testing.assert_frame_equal(stored, fetched, check_freq=False, check_names=False)
+
+
+def test_shorter_periods_are_read_from_the_store(store, full):
+    provider = Provider(full)
+    store.read_through("AAA", "2y", "1d", provider)
+    store.read_through("AAA", "6mo", "1d", provider)
+    assert provider.calls == [("2y", None)]
+    store.read_through("AAA", "5y", "1d", provider)
+    assert provider.calls == [("2y", None), ("5y", None)]
+
+
+def test_only_the_tail_is_fetched_after_refresh(store, full):
+    provider = Provider(full.iloc[:-5])
+    store.read_through("AAA", "1y", "1d", provider)
+    # 5本増え、最終バー (未確定だったもの) の終値も変わった
+    revised = full.copy()
+    revised.iloc[-6, revised.columns.get_loc("Close")] += 1.0
+    provider.full = revised
+    store.refresh = 0
+    df = store.read_through("AAA", "1y", "1d", provider)
+    assert provider.calls[-1] == (None, full.index[-6].strftime("%Y-%m-%d"))
+    assert df.index[-1] == full.index[-1]
+    np.testing.assert_allclose(df["Close"].iloc[-6:], revised["Close"].iloc[-6:])
+    assert not df.index.duplicated().any()
+
+
+def test_concurrent_identical_reads_fetch_once(store, full):
+    provider = Provider(full, latency=0.1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.read_through("AAA", "1y", "1d", provider)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert provider.calls == [("1y", None)]
+    assert len({id(df) for df in results}) == 4  # 呼び出し元ごとに別の DataFrame
+
+
+def test_empty_fetch_is_not_recorded(store, full):
+    provider = Provider(full.iloc[:0])
+    assert store.read_through("AAA", "1y", "1d", provider).empty
+    store.read_through("AAA", "1y", "1d", provider)
+    assert provider.calls == [("1y", None), ("1y", None)]
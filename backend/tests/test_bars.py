@@ -0,0 +1,41 @@
+"""bars.BarFrame / FeatureFrame の変換の確認"""
+import numpy as np
+import pandas as pd
+
+import bars
+
+
+def test_bar_frame_round_trip_float64(ohlcv):
+    df = ohlcv(50)
+    frame = bars.BarFrame.from_frame(df, np.float64)
+    pd.testing.assert_frame_equal(frame.to_frame(), df, check_freq=False)
+    pd.testing.assert_frame_equal(frame.to_frame(10), df.iloc[10:], check_freq=False)
+
+
+def test_bar_frame_float32_is_upcast_on_read(ohlcv):
+    df = ohlcv(50)
+    frame = bars.BarFrame.from_frame(df, np.float32)
+    restored = frame.to_frame()
+    assert frame.prices.dtype == np.float32
+    assert all(dtype == np.float64 for dtype in restored.dtypes)
+    np.testing.assert_allclose(restored[list(bars.PRICE_COLUMNS)], df[list(bars.PRICE_COLUMNS)], rtol=1e-7)
+    # 出来高は丸めない
+    np.testing.assert_array_equal(restored["Volume"], df["Volume"])
+
+
+def test_timezone_is_kept(ohlcv):
+    df = ohlcv(5).tz_localize("America/New_York")
+    assert bars.BarFrame.from_frame(df).index.equals(df.index)
+
+
+def test_feature_frame_dropna_leading_rows_is_a_view():
+    frame = bars.FeatureFrame(np.arange(6, dtype=np.int64), None, ["a", "b"])
+    frame["a"] = [np.nan, np.nan, 1, 2, 3, 4]
+    frame["b"] = [np.nan, 0, 1, 2, 3, 4]
+    kept = frame.dropna()
+    assert np.shares_memory(kept.values, frame.values)
+    np.testing.assert_array_equal(kept.ts, [2, 3, 4, 5])
+    frame["b"] = [np.nan, 0, 1, np.nan, 3, 4]
+    kept = frame.dropna()
+    np.testing.assert_array_equal(kept.ts, [2, 4, 5])
+    np.testing.assert_array_equal(kept["a"], [1, 3, 4])
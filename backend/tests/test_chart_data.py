@@ -0,0 +1,115 @@
+"""/api/stock/historical のエンコード・間引き・形式の判定の確認"""
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import chart_data
+
+
+@pytest.fixture
+def columns(ohlcv):
+    return chart_data.history_columns(ohlcv(300, seed=4))
+
+
+def test_rows_and_columnar_hold_the_same_values(columns):
+    rows = json.loads(chart_data.encode("SYN", "1y", columns, "rows"))["data"]
+    columnar = json.loads(chart_data.encode("SYN", "1y", columns, "columnar"))["columns"]
+    assert len(rows) == len(columns["close"])
+    assert [row["close"] for row in rows] == columnar["close"]
+    assert rows[0]["date"] == str(columns["date"][0])
+    assert isinstance(rows[0]["volume"], int)
+
+
+def test_downsample_ohlc_aggregates_each_bucket(columns):
+    result = chart_data.downsample(columns, 30, "ohlc")
+    assert len(result["close"]) == 30
+    # 300本を30本にまとめると10本ずつになる
+    assert result["high"][0] == columns["high"][:10].max()
+    assert result["low"][0] == columns["low"][:10].min()
+    assert result["close"][0] == columns["close"][9]
+    assert result["volume"].sum() == columns["volume"].sum()
+
+
+def lttb_reference(y: np.ndarray, points: int) -> list:
+    """三角形の面積をバケットごとに numpy で求める素朴な LTTB (照合用)"""
+    n = len(y)
+    bounds = 1 + chart_data._buckets(n - 2, points - 2)
+    selected = [0]
+    for i in range(points - 2):
+        start, end = bounds[i], bounds[i + 1]
+        if i < points - 3:
+            next_x = np.arange(end, bounds[i + 2])
+        else:
+            next_x = np.array([n - 1])
+        avg_x, avg_y = next_x.mean(), y[next_x].mean()
+        a = selected[-1]
+        j = np.arange(start, end)
+        area = np.abs((a - avg_x) * (y[j] - y[a]) - (a - j) * (avg_y - y[a]))
+        selected.append(int(j[np.argmax(area)]))
+    return selected + [n - 1]
+
+
+@pytest.mark.parametrize("points", [3, 4, 50, 299])
+def test_lttb_matches_reference(columns, points):
+    close = columns["close"]
+    assert chart_data.lttb_indices(close, points).tolist() == lttb_reference(close, points)
+
+
+def test_lttb_keeps_endpoints_and_order(columns):
+    idx = chart_data.lttb_indices(columns["close"], 50)
+    assert len(idx) == 50
+    assert idx[0] == 0 and idx[-1] == len(columns["close"]) - 1
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_negotiate_format():
+    assert chart_data.negotiate_format(None, "application/x-msgpack") == "msgpack"
+    assert chart_data.negotiate_format(None, "*/*") == "rows"
+    with pytest.raises(ValueError):
+        chart_data.negotiate_format("xml", None)
+
+
+def test_arrow_is_not_negotiated_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(chart_data, "ARROW_AVAILABLE", False)
+    assert chart_data.negotiate_format(None, chart_data.MEDIA_TYPES["arrow"]) == "rows"
+    with pytest.raises(ValueError):
+        chart_data.negotiate_format("arrow", None)
+
+
+def test_msgpack_round_trip(columns):
+    import msgpack
+
+    payload = msgpack.unpackb(chart_data.encode("SYN", "1y", columns, "msgpack"))
+    assert payload["symbol"] == "SYN"
+    assert payload["columns"]["close"] == columns["close"].tolist()
+    assert payload["columns"]["volume"] == columns["volume"].tolist()
+
+
+@pytest.mark.skipif(not chart_data.ARROW_AVAILABLE, reason="pyarrow がインストールされていない")
+def test_arrow_round_trip(columns):
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(chart_data.encode("SYN", "1y", columns, "arrow")).read_all()
+    np.testing.assert_array_equal(table.column("close").to_numpy(), columns["close"])
+
+
+def test_compress(columns):
+    body = chart_data.encode("SYN", "1y", columns, "rows")
+    compressed, encoding = chart_data.compress(body, "gzip")
+    assert encoding == "gzip" and gzip.decompress(compressed) == body
+    assert chart_data.compress(b"{}", "gzip") == (b"{}", None)
+    _, encoding = chart_data.compress(body, "br, gzip")
+    assert encoding == ("br" if chart_data.BROTLI_AVAILABLE else "gzip")
+
+
+def test_render_downsamples_and_compresses(ohlcv):
+    df = ohlcv(500, seed=5)
+    body, encoding = chart_data.render("SYN", "2y", df, "columnar", points=100, accept_encoding="gzip")
+    assert encoding == "gzip"
+    payload = json.loads(gzip.decompress(body))
+    assert len(payload["columns"]["close"]) == 100
+    assert payload["columns"]["close"][-1] == df["Close"].iloc[-1]
+    with pytest.raises(ValueError):
+        chart_data.render("SYN", "2y", df, "rows", points=100, method="median")
@@ -0,0 +1,103 @@
+"""indicators.py と ta ライブラリの一致の確認"""
+import numpy as np
+import pandas as pd
+import pytest
+import ta
+
+import indicators
+
+
+@pytest.fixture(scope="module")
+def ohlc(ohlc_panel):
+    return ohlc_panel(3, 400, seed=7)
+
+
+def assert_matches(actual, expected: pd.Series):
+    np.testing.assert_allclose(actual, expected.to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("window", [5, 20, 50])
+def test_sma(ohlc, window):
+    close = ohlc[2][0]
+    assert_matches(indicators.sma(close, window), ta.trend.sma_indicator(pd.Series(close), window=window))
+
+
+@pytest.mark.parametrize("window", [12, 26])
+def test_ema(ohlc, window):
+    close = ohlc[2][0]
+    assert_matches(indicators.ema(close, span=window, min_periods=window),
+                   ta.trend.ema_indicator(pd.Series(close), window=window))
+
+
+def test_rsi(ohlc):
+    close = ohlc[2][0]
+    assert_matches(indicators.rsi(close, 14), ta.momentum.rsi(pd.Series(close), window=14))
+
+
+def test_macd(ohlc):
+    close = ohlc[2][0]
+    expected = ta.trend.MACD(pd.Series(close))
+    macd_line, signal_line, histogram = indicators.macd(close)
+    assert_matches(macd_line, expected.macd())
+    assert_matches(signal_line, expected.macd_signal())
+    assert_matches(histogram, expected.macd_diff())
+
+
+def test_bollinger(ohlc):
+    close = ohlc[2][0]
+    expected = ta.volatility.BollingerBands(pd.Series(close))
+    upper, middle, lower = indicators.bollinger(close)
+    assert_matches(upper, expected.bollinger_hband())
+    assert_matches(middle, expected.bollinger_mavg())
+    assert_matches(lower, expected.bollinger_lband())
+
+
+def test_stochastic(ohlc):
+    high, low, close = (a[0] for a in ohlc)
+    expected = ta.momentum.StochasticOscillator(pd.Series(high), pd.Series(low), pd.Series(close))
+    k, d = indicators.stochastic(high, low, close)
+    assert_matches(k, expected.stoch())
+    assert_matches(d, expected.stoch_signal())
+
+
+def test_panel_rows_match_single_series(ohlc):
+    """2次元 (銘柄 × 時点) で計算しても各行を1銘柄ずつ計算した値と一致する"""
+    high, low, close = ohlc
+    panel = indicators.compute_indicators(high, low, close)
+    for i in range(close.shape[0]):
+        single = indicators.compute_indicators(high[i], low[i], close[i])
+        for name, values in single.items():
+            np.testing.assert_allclose(panel[name][i], values, rtol=1e-12, atol=1e-12, err_msg=name)
+
+
+def test_leading_nan_is_skipped(ohlc):
+    """先頭が NaN の系列は、NaN を除いた系列で計算した値と一致する"""
+    close = ohlc[2][0]
+    padded = np.concatenate([np.full(30, np.nan), close[30:]])
+    assert np.isnan(indicators.rsi(padded)[:30]).all()
+    np.testing.assert_allclose(indicators.rsi(padded)[30:], indicators.rsi(close[30:]), rtol=1e-12)
+    np.testing.assert_allclose(indicators.sma(padded, 20)[30:], indicators.sma(close[30:], 20), rtol=1e-12,
+                               equal_nan=True)
+
+
+@pytest.mark.parametrize("span", [9, 12, 26])
+def test_ema_adjust_matches_pandas(ohlc, span):
+    close = ohlc[2][0]
+    assert_matches(indicators.ema(close, span=span, adjust=True), pd.Series(close).ewm(span=span).mean())
+    padded = np.concatenate([np.full(10, np.nan), close[10:]])
+    assert_matches(indicators.ema(padded, span=span, adjust=True), pd.Series(padded).ewm(span=span).mean())
+
+
+def test_rolling_std_ddof(ohlc):
+    close = ohlc[2][0]
+    for ddof in (0, 1):
+        assert_matches(indicators.rolling_std(close, 20, ddof=ddof), pd.Series(close).rolling(20).std(ddof=ddof))
+
+
+def test_out_writes_into_given_buffer(ohlc):
+    close = ohlc[2]
+    for fn, kwargs in ((indicators.sma, {"window": 20}), (indicators.ema, {"span": 12}),
+                       (indicators.ema, {"span": 12, "adjust": True}), (indicators.rolling_std, {"window": 20, "ddof": 1})):
+        out = np.empty_like(close)
+        assert fn(close, out=out, **kwargs) is out
+        np.testing.assert_array_equal(out, fn(close, **kwargs))
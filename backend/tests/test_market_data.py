@@ -0,0 +1,94 @@
+"""OHLCV のメモリキャッシュ (BarCache) と期間の切り出しの確認"""
+import time
+
+import pandas as pd
+import pytest
+
+import market_data
+import shared_cache
+from bar_store import BarStore
+from market_data import BarCache
+
+
+def test_period_start(ohlcv):
+    index = ohlcv(600).index  # 2020-01-01 から営業日
+    last = index[-1]
+    assert market_data.period_start(index, "max") == 0
+    start = market_data.period_start(index, "1mo")
+    assert index[start] > last - pd.DateOffset(months=1) >= index[start - 1]
+    assert len(index[market_data.period_start(index, "5d"):]) == 5
+    assert index[market_data.period_start(index, "ytd")] == index[index >= f"{last.year}-01-01"][0]
+    with pytest.raises(ValueError):
+        market_data.period_start(index, "7w")
+
+
+def test_longer_period_entry_serves_shorter_periods(ohlcv):
+    cache = BarCache()
+    df = ohlcv(300)
+    cache.put("AAA", "1y", "1d", df)
+    month = cache.get("AAA", "1mo")
+    pd.testing.assert_frame_equal(month, market_data.slice_period(cache.get("AAA", "1y"), "1mo"))
+    assert cache.get("AAA", "2y") is None
+    assert cache.get("AAA", "1mo", interval="1h") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 2, 1)
+
+
+def test_ytd_is_served_only_from_year_or_longer_entries(ohlcv):
+    cache = BarCache()
+    cache.put("AAA", "6mo", "1d", ohlcv(120))
+    assert cache.get("AAA", "ytd") is None
+    cache.put("AAA", "2y", "1d", ohlcv(500))
+    assert cache.get("AAA", "ytd").index[0].year == cache.get("AAA", "2y").index[-1].year
+
+
+def test_entries_expire_and_evict_least_recently_used(ohlcv):
+    cache = BarCache(maxsize=2, ttl=0.1)
+    df = ohlcv(30)
+    for symbol in ("AAA", "BBB"):
+        cache.put(symbol, "1mo", "1d", df)
+    assert cache.get("AAA", "1mo") is not None
+    cache.put("CCC", "1mo", "1d", df)  # 最も使われていない BBB が外れる
+    assert cache.get("BBB", "1mo") is None and cache.stats()["evictions"] == 1
+    time.sleep(0.15)
+    assert cache.get("AAA", "1mo") is None and cache.stats()["expirations"] == 1
+
+
+def test_put_returns_what_later_gets_return(ohlcv):
+    cache = BarCache()
+    first = cache.put("AAA", "1y", "1d", ohlcv(252))
+    pd.testing.assert_frame_equal(first, cache.get("AAA", "1y"))
+    # 返した DataFrame を書き換えてもキャッシュの中身は変わらない
+    first.iloc[0, 0] = -1.0
+    assert cache.get("AAA", "1y").iloc[0, 0] != -1.0
+
+
+@pytest.fixture
+def provider(ohlcv, tmp_path, monkeypatch):
+    """プロバイダの呼び出しを記録する (期間指定は全期間、start 指定はその日以降を返す)"""
+    full = ohlcv(600)
+    calls = []
+
+    def fetch(symbol, interval, period=None, start=None):
+        calls.append((symbol, period, start))
+        df = full[full.index >= start] if start else market_data.slice_period(full, period)
+        return df.copy()
+
+    monkeypatch.setattr(market_data, "_fetch", fetch)
+    monkeypatch.setattr(market_data, "bar_cache", BarCache())
+    monkeypatch.setattr(market_data, "bar_store", BarStore(f"sqlite:///{tmp_path}/bars.db"))
+    monkeypatch.setattr(shared_cache, "cache", shared_cache.SharedCache(""))
+    return full, calls
+
+
+def test_get_history_reuses_longer_periods(provider):
+    full, calls = provider
+    year = market_data.get_history("AAA", "1y")
+    month = market_data.get_history("AAA", "1mo")
+    assert calls == [("AAA", "1y", None)]
+    assert len(year) == len(market_data.slice_period(full, "1y"))
+    pd.testing.assert_index_equal(month.index, market_data.slice_period(full, "1mo").index)
+    # メモリキャッシュが空でもバーストアから読む
+    market_data.bar_cache.clear()
+    market_data.get_history("AAA", "3mo")
+    assert len(calls) == 1
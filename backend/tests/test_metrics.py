@@ -0,0 +1,35 @@
+"""metrics の出力の確認"""
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def collectors(monkeypatch):
+    registered = []
+    monkeypatch.setattr(metrics, "_collectors", registered)
+    return registered
+
+
+def test_render_counts_failing_collectors(collectors):
+    def broken():
+        raise RuntimeError("boom")
+
+    collectors.append(broken)
+    collectors.append(lambda: [("stock_api_test_gauge", "gauge", "Test gauge", [({"kind": "a"}, 1.5)])])
+    before = metrics.COLLECTOR_ERRORS.value("broken")
+    text = metrics.render()
+    assert metrics.COLLECTOR_ERRORS.value("broken") == before + 1
+    assert f'stock_api_metrics_collector_errors_total{{collector="broken"}} {before + 1}' in text
+    assert 'stock_api_test_gauge{kind="a"} 1.5' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("h", "test", ("endpoint",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "/x")
+    lines = histogram.render()
+    assert 'h_bucket{endpoint="/x",le="0.1"} 1' in lines
+    assert 'h_bucket{endpoint="/x",le="1.0"} 2' in lines
+    assert 'h_bucket{endpoint="/x",le="+Inf"} 3' in lines
+    assert 'h_count{endpoint="/x"} 3' in lines
@@ -0,0 +1,48 @@
+"""StockPricePredictor.prepare_data が従来の pandas による特徴量と一致することの確認
+
+訓練済みのモデルは従来の定義の特徴量で学習しているため、値が変わると入力の分布がずれる。
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from ml_models import StockPricePredictor
+
+
+def pandas_prepare(data: pd.DataFrame) -> pd.DataFrame:
+    """従来の prepare_data"""
+    data = data.fillna(method='ffill').fillna(method='bfill')
+    data['Returns'] = data['Close'].pct_change()
+    data['Volume_Change'] = data['Volume'].pct_change()
+    data['High_Low_Diff'] = data['High'] - data['Low']
+    data['Close_Open_Diff'] = data['Close'] - data['Open']
+    data['SMA_5'] = data['Close'].rolling(window=5).mean()
+    data['SMA_20'] = data['Close'].rolling(window=20).mean()
+    data['SMA_50'] = data['Close'].rolling(window=50).mean()
+    data['EMA_12'] = data['Close'].ewm(span=12).mean()
+    data['EMA_26'] = data['Close'].ewm(span=26).mean()
+    delta = data['Close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    data['RSI'] = 100 - (100 / (1 + gain / loss))
+    data['MACD'] = data['EMA_12'] - data['EMA_26']
+    data['MACD_Signal'] = data['MACD'].ewm(span=9).mean()
+    data['BB_Middle'] = data['Close'].rolling(window=20).mean()
+    data['BB_Std'] = data['Close'].rolling(window=20).std()
+    data['BB_Upper'] = data['BB_Middle'] + (data['BB_Std'] * 2)
+    data['BB_Lower'] = data['BB_Middle'] - (data['BB_Std'] * 2)
+    return data.dropna()
+
+
+def test_prepare_data_matches_pandas(ohlcv):
+    df = ohlcv(400, seed=2)
+    df.iloc[[10, 40], df.columns.get_loc("Close")] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        expected = pandas_prepare(df.copy())
+    actual = StockPricePredictor("SYN").prepare_data(df)
+    assert list(actual.index) == list(expected.index)
+    assert list(actual.columns) == list(expected.columns)
+    for column in actual.columns:
+        np.testing.assert_allclose(actual[column], expected[column], rtol=1e-9, atol=1e-9, err_msg=column)
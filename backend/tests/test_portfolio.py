@@ -0,0 +1,78 @@
+"""portfolio のリスク指標と pandas による計算の一致の確認"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import portfolio
+
+
+@pytest.fixture(scope="module")
+def frames(ohlcv):
+    """途中から上場した銘柄と、休場日が欠けた銘柄を含む終値"""
+    frames = {f"SYM{i}": ohlcv(300, seed=i) for i in range(6)}
+    frames["SYM1"] = frames["SYM1"].iloc[120:]
+    frames["SYM2"] = frames["SYM2"].drop(frames["SYM2"].index[::17])
+    frames["SYM3"] = frames["SYM3"].iloc[:298]  # 最後の2日がない
+    return frames
+
+
+def pandas_returns(frames: dict) -> pd.DataFrame:
+    closes = pd.DataFrame({s: df["Close"] for s, df in frames.items()}).ffill()
+    return closes.pct_change(fill_method=None).iloc[1:]
+
+
+def test_pairwise_covariance_matches_pandas(frames):
+    returns = pandas_returns(frames)
+    cov = portfolio.covariance_from_moments(*portfolio.pairwise_moments(returns.to_numpy()))
+    np.testing.assert_allclose(cov, returns.cov().to_numpy(), rtol=1e-8, atol=1e-12)
+
+
+def test_covariance_is_nan_for_pairs_without_overlap():
+    returns = np.array([[0.01, np.nan], [0.02, np.nan], [np.nan, 0.03], [np.nan, -0.01]])
+    cov = portfolio.covariance_from_moments(*portfolio.pairwise_moments(returns))
+    expected = pd.DataFrame(returns).cov().to_numpy()
+    np.testing.assert_allclose(cov, expected, equal_nan=True)
+    assert np.isnan(cov[0, 1])
+
+
+def test_align_closes_fills_missing_days(frames):
+    dates, symbols, closes = portfolio.align_closes(frames)
+    assert symbols == list(frames)
+    assert len(dates) == 300
+    reference = pd.DataFrame({s: df["Close"] for s, df in frames.items()}).ffill()
+    np.testing.assert_allclose(closes, reference.to_numpy(), equal_nan=True)
+
+
+def test_analyze_matches_pandas(frames):
+    assets = {s: df for s, df in frames.items() if s != "SYM5"}
+    weights = np.full(len(assets), 1.0 / len(assets))
+    dates, symbols, closes = portfolio.align_closes({**assets, "BENCH": frames["SYM5"]})
+    window = 40
+    result = portfolio.analyze(dates, symbols[:-1], closes[:, :-1], weights, closes[:, -1], window=window)
+
+    returns = pandas_returns(assets)
+    assert result["observations"] == len(returns)
+    np.testing.assert_allclose(np.array(result["covariance"], dtype=float) / portfolio.TRADING_DAYS,
+                               returns.cov().to_numpy(), rtol=1e-8, atol=1e-12)
+    rp = returns.fillna(0.0) @ weights
+    rolling = rp.rolling(window).std() * np.sqrt(portfolio.TRADING_DAYS)
+    np.testing.assert_allclose([p["value"] for p in result["rolling"]["volatility"]],
+                               rolling.to_numpy()[window - 1:], rtol=1e-6)
+
+    rb = frames["SYM5"]["Close"].pct_change().iloc[1:]
+    for asset, symbol in zip(result["assets"], symbols):
+        pair = pd.concat([returns[symbol], rb], axis=1).dropna()
+        assert asset["beta"] == pytest.approx(pair.cov().iloc[0, 1] / pair.iloc[:, 1].var(), rel=1e-8)
+
+
+def test_value_at_risk():
+    returns = np.linspace(-0.05, 0.05, 101)
+    var, cvar = portfolio.value_at_risk(returns, 0.95)
+    assert var == pytest.approx(-np.quantile(returns, 0.05))
+    assert cvar == pytest.approx(-returns[returns <= -var].mean())
+    assert portfolio.value_at_risk(np.array([np.nan]), 0.95) == (None, None)
+
+
+def test_analyze_requires_two_returns():
+    with pytest.raises(ValueError):
+        portfolio.analyze(np.arange(2), ["A"], np.array([[1.0], [1.1]]), np.ones(1))
@@ -0,0 +1,107 @@
+"""価格予測モデルの差分更新と、毎回当てはめる従来の方法 (scikit-learn) の一致の確認"""
+import numpy as np
+import pytest
+
+import indicators
+import prediction_models
+from prediction_models import PredictionModelCache, PredictionModelStore
+
+
+def sklearn_prediction(df) -> float:
+    """従来の実装の予測値 (照合用)"""
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import StandardScaler
+
+    df = df.copy()
+    df['Returns'] = df['Close'].pct_change()
+    close = df['Close'].to_numpy(dtype=float)
+    df['SMA_5'] = indicators.sma(close, 5)
+    df['SMA_20'] = indicators.sma(close, 20)
+    df['RSI'] = indicators.rsi(close, 14)
+    df['Volume_Change'] = df['Volume'].pct_change()
+    df = df.dropna()
+    X = df[['Returns', 'SMA_5', 'SMA_20', 'RSI', 'Volume_Change']].values
+    y = df['Close'].values
+    train_size = int(len(X) * 0.8)
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X[:train_size])
+    model = LinearRegression().fit(X_train, y[:train_size])
+    return float(model.predict(scaler.transform(X[-1:]))[0])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PredictionModelCache(PredictionModelStore(f"sqlite:///{tmp_path}/predictions.db"))
+
+
+def predict(cache: PredictionModelCache, df, symbol: str = "SYN", period: str = "1y"):
+    state, features, source = cache.get(symbol, period, df)
+    return state.predict(features), source
+
+
+def test_fit_matches_sklearn(cache, ohlcv):
+    df = ohlcv(252, seed=1)
+    value, source = predict(cache, df)
+    assert source == "fit"
+    assert value == pytest.approx(sklearn_prediction(df), rel=1e-9)
+    assert predict(cache, df) == (value, "hit")
+
+
+def test_incremental_updates_match_full_refit(cache, ohlcv):
+    full = ohlcv(272, seed=2)
+    predict(cache, full.iloc[:252])
+    for end in range(253, 273):
+        value, source = predict(cache, full.iloc[:end])
+        assert source == "incremental"
+        assert value == pytest.approx(sklearn_prediction(full.iloc[:end]), rel=1e-8)
+
+
+def test_changed_rows_are_swapped_out(cache, ohlcv):
+    """期間の先頭が動いて残る行の特徴量が変わっても、全行で当てはめた結果と一致する"""
+    full = ohlcv(300, seed=3)
+    predict(cache, full.iloc[:250])
+    # 過去の終値が訂正された場合は、値の変わった訓練行 (訂正以降の行) だけを入れ替える
+    revised = full.iloc[:251].copy()
+    revised.iloc[-60, revised.columns.get_loc("Close")] *= 1.05
+    value, source = predict(cache, revised)
+    assert source == "incremental"
+    assert value == pytest.approx(sklearn_prediction(revised), rel=1e-8)
+    shifted = full.iloc[1:252]
+    value, source = predict(cache, shifted)
+    assert source == "fit"
+    assert value == pytest.approx(sklearn_prediction(shifted), rel=1e-9)
+
+
+def test_full_refit_after_many_increments(cache, ohlcv, monkeypatch):
+    monkeypatch.setattr(prediction_models, "PREDICTION_FULL_REFIT_EVERY", 2)
+    full = ohlcv(260, seed=4)
+    sources = [predict(cache, full.iloc[:end])[1] for end in range(252, 257)]
+    assert sources == ["fit", "incremental", "incremental", "fit", "incremental"]
+
+
+def test_store_is_shared_between_workers(tmp_path, ohlcv):
+    store_url = f"sqlite:///{tmp_path}/predictions.db"
+    first, second = (PredictionModelCache(PredictionModelStore(store_url)) for _ in range(2))
+    full = ohlcv(253, seed=5)
+    value, _ = predict(first, full.iloc[:252])
+    assert predict(second, full.iloc[:252]) == (value, "store_hit")
+    predict(first, full)
+    # 他のワーカーが更新した状態をストアから読む
+    assert predict(second, full)[1] == "store_hit"
+    assert second.stats()["store_hit"] == 2
+
+
+def test_revised_latest_bar_recomputes_features(cache, ohlcv):
+    df = ohlcv(252, seed=6)
+    predict(cache, df)
+    revised = df.copy()
+    revised.iloc[-1, revised.columns.get_loc("Close")] *= 1.02
+    state, features, source = cache.get("SYN", "1y", revised)
+    assert source == "hit"
+    X, _, _ = prediction_models.build_features(revised)
+    np.testing.assert_array_equal(features, X[-1])
+
+
+def test_insufficient_data(cache, ohlcv):
+    with pytest.raises(ValueError):
+        cache.get("SYN", "5d", ohlcv(40))
@@ -0,0 +1,67 @@
+"""リクエスト単位のサンプリングプロファイラの確認"""
+import os
+import sys
+import threading
+import time
+
+import profiling
+from profiling import ProfileStore, StackSampler
+
+
+def busy_loop(stop: threading.Event):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_sampler_records_busy_threads_only():
+    stop = threading.Event()
+    idle = threading.Event()
+    workers = [threading.Thread(target=busy_loop, args=(stop,)), threading.Thread(target=idle.wait)]
+    for thread in workers:
+        thread.start()
+    try:
+        sampler = StackSampler(interval=0.002).start()
+        time.sleep(0.1)
+        sampler.stop()
+    finally:
+        stop.set()
+        idle.set()
+        for thread in workers:
+            thread.join()
+    assert sampler.duration >= 0.1
+    stacks = dict(line.rsplit(" ", 1) for line in sampler.collapsed().splitlines())
+    assert any("busy_loop (test_profiling.py:" in stack for stack in stacks)
+    # 待機中のスレッド (先頭フレームが threading.Event.wait) は含めない
+    assert not any(stack.split(";")[-1].startswith("wait (threading.py:") for stack in stacks)
+    assert all(int(count) > 0 for count in stacks.values())
+
+
+def test_collapsed_orders_stacks_outermost_first():
+    def inner():
+        return profiling._collapse(sys._getframe())
+
+    def outer():
+        return inner()
+
+    names = [frame.split(" ")[0] for frame in outer().split(";")]
+    assert names[-2:] == ["outer", "inner"]
+
+
+def finished_sampler(samples: dict) -> StackSampler:
+    sampler = StackSampler()
+    sampler.samples.update(samples)
+    sampler.duration = 0.05
+    return sampler
+
+
+def test_store_keeps_latest_profiles(tmp_path):
+    store = ProfileStore(keep=2, directory=str(tmp_path))
+    ids = [store.add(f"/api/{i}", finished_sampler({"main;handler": i + 1, "main;io": 1})) for i in range(3)]
+    assert store.get(ids[0]) is None
+    assert [p["id"] for p in store.list()] == ids[:0:-1]
+    assert all("collapsed" not in p for p in store.list())
+    profile = store.get(ids[2])
+    assert profile["path"] == "/api/2" and profile["samples"] == 4 and profile["duration_ms"] == 50.0
+    assert profile["collapsed"] == "main;handler 3\nmain;io 1\n"
+    with open(os.path.join(tmp_path, f"{ids[2]}.folded")) as f:
+        assert f.read() == profile["collapsed"]
@@ -0,0 +1,118 @@
+"""プロバイダ呼び出し層 (single-flight・レート制限・再試行) の確認"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import providers
+from providers import ProviderClient, ProviderError, SingleFlight, SyntheticProvider, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(providers, "backoff_delay", lambda attempt: 0.0)
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        return "value"
+
+    with ThreadPoolExecutor(5) as pool:
+        results = list(pool.map(lambda _: flight.do("k", fn), range(5)))
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert {value for value, _ in results} == {"value"}
+    assert flight.inflight() == 0
+
+
+def test_single_flight_raises_the_error_in_every_caller():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def fn():
+        started.set()
+        time.sleep(0.05)
+        raise ProviderError("down")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("k", fn)
+        except ProviderError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=call)
+    follower.start()
+    leader.join()
+    follower.join()
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert flight.inflight() == 0
+
+
+def test_token_bucket_waits_after_burst():
+    assert TokenBucket(rate=0).acquire() == 0.0
+    bucket = TokenBucket(rate=20, burst=2)
+    assert bucket.acquire() == 0.0 and bucket.acquire() == 0.0
+    start = time.monotonic()
+    waited = bucket.acquire()
+    assert 0.04 <= waited <= time.monotonic() - start + 1e-3  # 1トークンの補充はおよそ 1/20 秒
+
+
+class FlakyProvider(SyntheticProvider):
+    """最初の failures 回の呼び出しだけ失敗する擬似プロバイダ"""
+
+    def __init__(self, failures: int):
+        super().__init__(latency=0)
+        self.failures = failures
+
+    def _respond(self):
+        super()._respond()
+        if self.calls <= self.failures:
+            raise ProviderError("temporary failure")
+
+
+def test_client_retries_failed_calls():
+    client = ProviderClient(FlakyProvider(failures=2), TokenBucket(rate=0), retries=2)
+    assert not client.history("AAA", "1d", period="1mo").empty
+    assert client.provider.calls == 3
+
+    client = ProviderClient(FlakyProvider(failures=3), TokenBucket(rate=0), retries=2)
+    with pytest.raises(ProviderError):
+        client.history("AAA", "1d", period="1mo")
+    assert client.provider.calls == 3
+
+
+def test_client_coalesces_identical_calls():
+    client = ProviderClient(SyntheticProvider(latency=0.1), TokenBucket(rate=0))
+    with ThreadPoolExecutor(4) as pool:
+        frames = list(pool.map(lambda _: client.history("AAA", "1d", period="1y"), range(4)))
+    assert client.provider.calls == 1
+    # 共有した結果は複製して返すので、呼び出し元が書き換えても他に影響しない
+    assert len({id(df) for df in frames}) == 4
+    for df in frames[1:]:
+        pd.testing.assert_frame_equal(df, frames[0])
+    client.history("BBB", "1d", period="1y")
+    assert client.provider.calls == 2
+
+
+def test_synthetic_provider_is_deterministic():
+    provider = SyntheticProvider(latency=0)
+    year = provider.history("AAA", "1d", period="1y")
+    assert len(year) == 252
+    pd.testing.assert_frame_equal(year, SyntheticProvider(latency=0).history("AAA", "1d", period="1y"))
+    start = year.index[-10].strftime("%Y-%m-%d")
+    pd.testing.assert_frame_equal(provider.history("AAA", "1d", start=start), year.iloc[-10:])
+    batch = provider.download(["AAA", "BBB"], "1mo", "1d")
+    assert set(batch.columns.get_level_values(0)) == {"AAA", "BBB"}
+    pd.testing.assert_frame_equal(batch["AAA"], year.iloc[-21:])
@@ -0,0 +1,137 @@
+"""スクリーナーの絞り込み・スナップショットの保存と読み込み・再構築の確認"""
+import numpy as np
+import pytest
+
+import market_data
+import screener
+
+
+def random_snapshot(n: int, seed: int = 0) -> screener.Snapshot:
+    rng = np.random.default_rng(seed)
+    columns = {name: rng.normal(50, 20, n) for name in screener.VALUE_COLUMNS}
+    for name in ("RSI", "SMA_50"):
+        columns[name][rng.random(n) < 0.1] = np.nan  # 履歴が足りない銘柄
+    buy = rng.integers(0, 9, n).astype(np.int8)
+    sell = rng.integers(0, 9, n).astype(np.int8)
+    columns.update(buy_score=buy, sell_score=sell, score=(buy - sell).astype(np.int8))
+    symbols = np.array([f"SYM{i}" for i in range(n)])
+    as_of = np.full(n, np.datetime64("2024-01-02", "D").astype(np.int64))
+    return screener.Snapshot(symbols, columns, as_of, 1.0)
+
+
+def test_parse_conditions():
+    assert screener.parse_conditions("RSI < 30 AND SMA_20 > SMA_50") == [
+        ("RSI", "<", 30.0), ("SMA_20", ">", "SMA_50"),
+    ]
+    assert screener.parse_conditions("  ") == []
+    for where in ("RSI <", "Volume > 1", "RSI < 30 or RSI > 70"):
+        with pytest.raises(ValueError):
+            screener.parse_conditions(where)
+
+
+@pytest.mark.parametrize("where", [
+    "RSI < 30", "RSI <= 50 and score >= 2", "Close > 60 and SMA_20 > SMA_50",
+    "score == 0", "score != 0 and RSI > 40", "SMA_50 >= 55 and Stoch_K < 70 and MACD_diff > 45",
+])
+def test_filter_matches_full_scan(where):
+    snapshot = random_snapshot(500)
+    mask = np.ones(len(snapshot), dtype=bool)
+    for column, op, rhs in screener.parse_conditions(where):
+        rhs = snapshot.columns[rhs] if isinstance(rhs, str) else rhs
+        mask &= screener._OPS[op](snapshot.columns[column], rhs)
+    assert sorted(snapshot.filter(screener.parse_conditions(where))) == list(np.flatnonzero(mask))
+
+
+def ranked_by(snapshot: screener.Snapshot, where: str, sort: str) -> np.ndarray:
+    rows = snapshot.filter(screener.parse_conditions(where))
+    return rows[np.argsort(snapshot.columns[sort][rows], kind="stable")]
+
+
+def test_rank_puts_missing_values_last():
+    snapshot = random_snapshot(200)
+    rows = snapshot.filter([])
+    ranked = snapshot.rank(rows, "RSI", True, len(rows))
+    values = snapshot.columns["RSI"][ranked]
+    n_valid = np.count_nonzero(~np.isnan(values))
+    assert np.all(np.diff(values[:n_valid]) <= 0)
+    assert np.isnan(values[n_valid:]).all()
+    top = snapshot.rank(snapshot.filter(screener.parse_conditions("score > 0")), "Close", False, 5)
+    assert list(top) == list(ranked_by(snapshot, "score > 0", "Close")[:5])
+
+
+def test_snapshot_save_load_round_trip(tmp_path):
+    snapshot = random_snapshot(300)
+    path = str(tmp_path / "screener.npz")
+    snapshot.save(path)
+    loaded = screener.Snapshot.load(path)
+    np.testing.assert_array_equal(loaded.symbols, snapshot.symbols)
+    np.testing.assert_array_equal(loaded.as_of, snapshot.as_of)
+    assert loaded.built_at == snapshot.built_at
+    for name in screener.COLUMNS:
+        assert loaded.columns[name].dtype == snapshot.columns[name].dtype
+        np.testing.assert_array_equal(loaded.columns[name], snapshot.columns[name])
+    for where in ("", "RSI < 40 and score >= 1"):
+        expected, got = snapshot.query(where, limit=20), loaded.query(where, limit=20)
+        assert got["matched"] == expected["matched"]
+        assert got["results"] == expected["results"]
+
+
+@pytest.fixture
+def history(ohlcv, monkeypatch):
+    """get_history_batch を差し替え、返す履歴を銘柄ごとに切り替えられるようにする"""
+    frames = {f"SYM{i}": ohlcv(120, seed=i) for i in range(6)}
+    source = {s: df.iloc[:-1] for s, df in frames.items()}
+    monkeypatch.setattr(market_data, "get_history_batch",
+                        lambda chunk, period: {s: source[s] for s in chunk if s in source})
+    return frames, source
+
+
+def rows_by_symbol(snapshot: screener.Snapshot) -> dict:
+    return {str(s): snapshot.columns["Close"][i] for i, s in enumerate(snapshot.symbols)}
+
+
+def test_rebuild_merge_updates_only_given_symbols(tmp_path, history):
+    frames, source = history
+    builder = screener.ScreenerBuilder(path=str(tmp_path / "screener.npz"), chunk_size=4)
+    stats = builder.rebuild(list(frames))
+    assert stats["full"] == len(frames) and stats["rows"] == len(frames)
+    before = rows_by_symbol(builder.snapshot)
+
+    source["SYM1"] = frames["SYM1"]
+    source["SYM4"] = frames["SYM4"]
+    stats = builder.rebuild(["SYM1", "SYM4"], merge=True)
+    assert stats["incremental"] == 2 and stats["rows"] == len(frames)
+    after = rows_by_symbol(builder.snapshot)
+    assert sorted(after) == sorted(before)
+    for symbol in frames:
+        expected = frames[symbol]["Close"].iloc[-1] if symbol in ("SYM1", "SYM4") else before[symbol]
+        assert after[symbol] == pytest.approx(expected)
+
+    # 読み直したスナップショットも同じ行を持つ
+    assert rows_by_symbol(screener.ScreenerBuilder(path=builder.path).snapshot) == after
+
+    # merge=False では指定した銘柄だけのスナップショットになる
+    builder.rebuild(["SYM0", "SYM2"])
+    assert sorted(rows_by_symbol(builder.snapshot)) == ["SYM0", "SYM2"]
+
+
+def test_rebuild_merge_keeps_rows_of_failed_symbols(tmp_path, history):
+    frames, source = history
+    builder = screener.ScreenerBuilder(path=str(tmp_path / "screener.npz"))
+    builder.rebuild(list(frames))
+    before = rows_by_symbol(builder.snapshot)
+    del source["SYM3"]
+    stats = builder.rebuild(["SYM3", "SYM5"], merge=True)
+    assert [f["symbol"] for f in stats["failed"]] == ["SYM3"]
+    assert rows_by_symbol(builder.snapshot)["SYM3"] == before["SYM3"]
+
+
+def test_rebuild_with_no_symbols_built_keeps_snapshot(tmp_path, history):
+    frames, source = history
+    builder = screener.ScreenerBuilder(path=str(tmp_path / "screener.npz"))
+    builder.rebuild(list(frames))
+    built_at = builder.snapshot.built_at
+    source.clear()
+    stats = builder.rebuild(list(frames))
+    assert stats["symbols"] == 0 and stats["built_at"] is None
+    assert builder.snapshot.built_at == built_at and len(builder.snapshot) == len(frames)
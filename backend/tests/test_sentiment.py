@@ -0,0 +1,75 @@
+"""見出しセンチメントのキャッシュとスコアラーの確認"""
+import time
+
+import numpy as np
+import pytest
+
+from sentiment import LexiconScorer, SentimentCache, SentimentPipeline, TextBlobScorer, headline_key
+from shared_cache import SharedCache
+
+
+class CountingScorer:
+    """見出しの長さをスコアにし、スコアリングした見出しを記録する"""
+
+    name = "counting"
+
+    def __init__(self):
+        self.scored = []
+
+    def score(self, titles: list) -> np.ndarray:
+        self.scored.extend(titles)
+        return np.array([len(title) / 100 for title in titles], dtype=float)
+
+
+def test_headline_key_prefers_provider_id():
+    assert headline_key({"uuid": "abc", "title": "Shares rally"}) == "abc"
+    assert headline_key({"title": "Shares rally"}) == headline_key({"title": "Shares rally", "uuid": ""})
+    assert headline_key({"title": "Shares rally"}) != headline_key({"title": "Shares slump"})
+
+
+def test_cache_evicts_least_recently_used_and_expired():
+    cache = SentimentCache(maxsize=2, ttl=0.1)
+    cache.put_many({"a": 0.1, "b": 0.2})
+    assert cache.get_many(["a"]) == {"a": 0.1}
+    cache.put_many({"c": 0.3})  # 最も使われていない b が外れる
+    assert cache.get_many(["a", "b", "c"]) == {"a": 0.1, "c": 0.3}
+    time.sleep(0.15)
+    assert cache.get_many(["a", "c"]) == {}
+    assert cache.stats() == {"entries": 0, "hits": 3, "misses": 3, "hit_ratio": 0.5}
+
+
+def test_pipeline_scores_each_headline_once():
+    scorer = CountingScorer()
+    pipeline = SentimentPipeline(scorer, SentimentCache(), SharedCache(""))
+    items = [{"title": "Shares rally"}, {"title": "Earnings miss"}, {"title": "Shares rally"},
+             {"uuid": "id-1", "title": "Shares rally"}]
+    scores = pipeline.score(items)
+    assert scores == [0.12, 0.13, 0.12, 0.12]
+    assert sorted(scorer.scored) == ["Earnings miss", "Shares rally", "Shares rally"]
+    assert pipeline.score(items[::-1]) == scores[::-1]
+    assert len(scorer.scored) == 3
+    assert pipeline.score([]) == []
+
+
+def test_pipeline_reuses_scores_from_other_workers(tmp_path):
+    shared_url = f"sqlite:///{tmp_path}/shared_cache.db"
+    first = SentimentPipeline(CountingScorer(), SentimentCache(), SharedCache(shared_url))
+    second = SentimentPipeline(CountingScorer(), SentimentCache(), SharedCache(shared_url))
+    first.score([{"title": "Shares rally"}])
+    assert second.score([{"title": "Shares rally"}, {"title": "Guidance cut"}]) == [0.12, 0.12]
+    assert second.scorer.scored == ["Guidance cut"]
+
+
+def test_lexicon_scorer_agrees_in_sign_with_textblob():
+    titles = ["Excellent quarter with great growth", "Terrible results and worst slump", "Company files report"]
+    lexicon = LexiconScorer().score(titles)
+    textblob = TextBlobScorer().score(titles)
+    assert lexicon[0] > 0 and lexicon[1] < 0 and lexicon[2] == 0
+    np.testing.assert_array_equal(np.sign(lexicon), np.sign(textblob))
+    assert LexiconScorer().score([]).shape == (0,)
+    assert np.all(np.abs(lexicon) <= 1)
+
+
+@pytest.mark.parametrize("scorer", [TextBlobScorer, LexiconScorer])
+def test_scorers_return_one_score_per_title(scorer):
+    assert scorer().score(["Stock rises", "Stock falls", ""]).shape == (3,)
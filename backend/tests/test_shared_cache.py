@@ -0,0 +1,120 @@
+"""ワーカー間の共有キャッシュ (SharedCache) の確認
+
+ワーカーごとに別のインスタンス (リースの名義が別) を作り、スレッドから同時に呼んで確かめる。
+"""
+import fcntl
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import shared_cache
+from shared_cache import SharedCache
+
+
+@pytest.fixture
+def url(tmp_path):
+    return f"sqlite:///{tmp_path}/shared_cache.db"
+
+
+def slow_counter(latency: float = 0.1, value="value"):
+    calls = []
+    lock = threading.Lock()
+
+    def fetch():
+        with lock:
+            calls.append(1)
+        time.sleep(latency)
+        return value
+
+    return fetch, calls
+
+
+def test_set_get_and_expiry(url):
+    cache = SharedCache(url)
+    cache.set("a", {"x": 1}, ttl=60)
+    cache.set_many({"b": [1, 2], "c": None, "d": "expired"}, ttl=60)
+    cache.set("d", "expired", ttl=-1)
+    assert cache.get("a") == {"x": 1}
+    assert cache.get("c") is None and cache.get("d") is None
+    assert cache.get_many(["a", "b", "c", "d", "e"]) == {"a": {"x": 1}, "b": [1, 2]}
+    cache.delete("a")
+    assert cache.get("a") is None
+    cache.purge()
+    assert cache.stats()["entries"] == 1
+
+
+def test_single_flight_calls_once_across_workers(url):
+    workers = [SharedCache(url, poll_interval=0.005) for _ in range(3)]
+    fetch, calls = slow_counter()
+    with ThreadPoolExecutor(12) as pool:
+        results = list(pool.map(lambda i: workers[i % 3].single_flight("k", fetch, 60), range(12)))
+    assert results == ["value"] * 12
+    assert len(calls) == 1
+    assert sum(w.stats_counts["fill"] for w in workers) == 1
+    # 値が揃った後はどのワーカーからも呼ばずに返す
+    assert workers[2].single_flight("k", fetch, 60) == "value" and len(calls) == 1
+
+
+def test_none_is_shared_for_negative_ttl(url):
+    workers = [SharedCache(url, poll_interval=0.005, negative_ttl=0.3) for _ in range(2)]
+    fetch, calls = slow_counter(latency=0.05, value=None)
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(lambda i: workers[i % 2].single_flight("k", fetch, 60), range(4))) == [None] * 4
+    assert len(calls) == 1
+    # 「値なし」の印は get / get_many には見せない
+    assert workers[0].get("k") is None and workers[0].get_many(["k"]) == {}
+    time.sleep(0.35)
+    assert workers[1].single_flight("k", fetch, 60) is None
+    assert len(calls) == 2
+
+
+def test_expired_lease_is_taken_over(url):
+    crashed = SharedCache(url, lease_ttl=0.2)
+    assert crashed._acquire("k")  # 取得中に落ちたワーカー (リースを解放しない)
+    other = SharedCache(url, lease_ttl=0.2, poll_interval=0.01)
+    start = time.perf_counter()
+    assert other.single_flight("k", lambda: "value", 60) == "value"
+    assert time.perf_counter() - start >= 0.15
+
+
+def test_lock_excludes_other_workers(url):
+    workers = [SharedCache(url, poll_interval=0.005) for _ in range(2)]
+    inside, overlaps = [], []
+
+    def critical(i):
+        with workers[i % 2].lock("job"):
+            if inside:
+                overlaps.append(i)
+            inside.append(i)
+            time.sleep(0.01)
+            inside.remove(i)
+
+    with ThreadPoolExecutor(6) as pool:
+        list(pool.map(critical, range(12)))
+    assert overlaps == []
+
+
+def test_disabled_cache_only_coalesces_within_process():
+    cache = SharedCache("")
+    fetch, calls = slow_counter()
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(lambda _: cache.single_flight("k", fetch, 60), range(4))) == ["value"] * 4
+    assert len(calls) == 1
+    cache.set("k", "value", 60)
+    assert cache.get("k") is None and cache.get_many(["k"]) == {}
+    assert cache.single_flight("k", fetch, 60) == "value" and len(calls) == 2
+
+
+def test_acquire_leader(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_cache, "SHARED_LOCK_DIR", str(tmp_path))
+    monkeypatch.setattr(shared_cache, "_leader_files", {})
+    assert shared_cache.acquire_leader("scheduler")
+    assert shared_cache.acquire_leader("scheduler")
+    # 他のワーカー (別に開いたファイル) はロックを取れない
+    with open(os.path.join(tmp_path, "scheduler.lock"), "w") as f:
+        with pytest.raises(OSError):
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    shared_cache._leader_files["scheduler"].close()
@@ -0,0 +1,85 @@
+"""streaming_indicators.IndicatorState と一括計算 (indicators.compute_indicators) の一致の確認"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+from streaming_indicators import IndicatorState
+
+COLUMNS = ["SMA_5", "SMA_20", "SMA_50", "EMA_12", "EMA_26", "MACD", "MACD_signal", "MACD_diff",
+           "RSI", "BB_upper", "BB_middle", "BB_lower", "Stoch_K", "Stoch_D"]
+
+
+@pytest.fixture(scope="module")
+def history(ohlc_panel):
+    high, low, close = (a[0] for a in ohlc_panel(1, 300, seed=3))
+    return pd.DataFrame({"High": high, "Low": low, "Close": close},
+                        index=pd.date_range("2020-01-01", periods=len(close), freq="D"))
+
+
+def batch(df: pd.DataFrame) -> dict:
+    """一括計算の最終バーの値"""
+    close = df["Close"].to_numpy()
+    result = indicators.compute_indicators(df["High"].to_numpy(), df["Low"].to_numpy(), close)
+    result["SMA_5"] = indicators.sma(close, 5)
+    return {name: result[name][-1] for name in COLUMNS}
+
+
+def assert_latest(state: IndicatorState, df: pd.DataFrame):
+    expected = batch(df)
+    for name in COLUMNS:
+        np.testing.assert_allclose(state.latest[name], expected[name], rtol=1e-9, atol=1e-9, err_msg=name)
+
+
+def test_from_history(history):
+    assert_latest(IndicatorState.from_history(history), history)
+
+
+def test_update_matches_batch(history):
+    state = IndicatorState.from_history(history.iloc[:100])
+    for i in range(100, len(history)):
+        bar = history.iloc[i]
+        state.update(history.index[i], bar["High"], bar["Low"], bar["Close"])
+        if i % 25 == 0 or i == len(history) - 1:
+            assert_latest(state, history.iloc[:i + 1])
+
+
+def test_revise_replaces_latest_bar(history):
+    """最新バーを差し替えると、差し替え後の値で一括計算した結果と一致する"""
+    state = IndicatorState.from_history(history)
+    revised = history.copy()
+    revised.iloc[-1, revised.columns.get_loc("Close")] *= 1.03
+    revised.iloc[-1, revised.columns.get_loc("High")] = revised["Close"].iloc[-1] * 1.01
+    bar = revised.iloc[-1]
+    for close in (bar["Close"] * 0.98, bar["Close"]):  # 当日足が何度も更新される場合
+        state.revise(bar["High"], bar["Low"], close)
+    assert_latest(state, revised)
+
+
+def test_apply_history_adds_only_new_bars(history):
+    state = IndicatorState.from_history(history.iloc[:200])
+    assert state.apply_history(history)
+    assert state.last_timestamp == history.index[-1]
+    assert_latest(state, history)
+    # 最終バーを含まない履歴は反映できない
+    assert not IndicatorState.from_history(history.iloc[:50]).apply_history(history.iloc[100:])
+
+
+def test_sliding_window_matches_batch_over_same_window(history):
+    """期間 (1mo ≒ 21本) の先頭が動いたら作り直し、同じ期間の一括計算と一致し続ける"""
+    window = 21
+    state = None
+    for end in range(window, window + 60):
+        df = history.iloc[end - window:end]
+        if state is None or not state.apply_history(df):
+            state = IndicatorState.from_history(df)
+        expected = batch(df)
+        for name in COLUMNS:
+            np.testing.assert_allclose(state.latest[name], expected[name], rtol=1e-9, atol=1e-9, err_msg=name)
+    assert np.isnan(state.latest["SMA_50"])
+
+
+def test_apply_history_rejects_moved_window_start(history):
+    state = IndicatorState.from_history(history.iloc[:100])
+    assert not state.apply_history(history.iloc[1:101])
+    assert state.apply_history(history.iloc[:101])
@@ -0,0 +1,154 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import market_data
+
+logger = logging.getLogger(__name__)
+
+# 同時に訓練するプロセス数 (各プロセスの TensorFlow スレッド数はコア数を等分する)
+TRAIN_WORKERS = int(os.getenv("TRAIN_WORKERS", str(max(1, (os.cpu_count() or 1) // 2))))
+TRAIN_PERIOD = os.getenv("TRAIN_PERIOD", "2y")
+TRAIN_EPOCHS = int(os.getenv("TRAIN_EPOCHS", "50"))
+TRAIN_MODEL_TYPE = os.getenv("TRAIN_MODEL_TYPE", "lstm")
+# 夜間の再訓練 (APScheduler の cron 形式の時・分)
+TRAIN_SCHEDULE_ENABLED = os.getenv("TRAIN_SCHEDULE_ENABLED", "0") == "1"
+TRAIN_CRON_HOUR = os.getenv("TRAIN_CRON_HOUR", "2")
+TRAIN_CRON_MINUTE = os.getenv("TRAIN_CRON_MINUTE", "0")
+# 対象銘柄 (カンマ区切り、または1行1銘柄のファイルパス)
+TRAIN_UNIVERSE = os.getenv("TRAIN_UNIVERSE", "")
+
+
+def load_universe(spec: str = TRAIN_UNIVERSE) -> list:
+    """対象銘柄の一覧を読み込む"""
+    if spec and os.path.isfile(spec):
+        with open(spec) as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return [s.strip() for s in spec.split(",") if s.strip()]
+
+
+def _init_worker(threads: int):
+    """訓練プロセスの初期化 (プロセス間で CPU コアを取り合わないようにする)"""
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def train_symbol(symbol: str, df: pd.DataFrame, model_type: str, epochs: int) -> dict:
+    """1銘柄を訓練してレジストリに登録 (訓練プロセス内で実行)"""
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    from ml_models import StockPricePredictor
+    from model_registry import registry
+
+    start = time.perf_counter()
+    predictor = StockPricePredictor(symbol, model_type)
+    history = predictor.train(
+        epochs=epochs, verbose=0, df=df,
+        callbacks=[EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)],
+    )
+    metrics = {
+        "loss": float(history.history["loss"][-1]),
+        "val_loss": float(min(history.history["val_loss"])),
+        "epochs": len(history.history["loss"]),
+    }
+    version = registry.register(predictor, metrics)
+    return {"symbol": symbol, "version": version.id, "seconds": round(time.perf_counter() - start, 2), **metrics}
+
+
+def _is_up_to_date(symbol: str, model_type: str, df: pd.DataFrame) -> bool:
+    """最後に登録したモデルの訓練データ以降に新しいバーがないか"""
+    from model_registry import registry
+
+    latest = registry.latest(symbol, model_type)
+    return latest is not None and latest.data_end == df.index[-1].strftime("%Y-%m-%d")
+
+
+def run_training(symbols: list, model_type: str = TRAIN_MODEL_TYPE, period: str = TRAIN_PERIOD,
+                 epochs: int = TRAIN_EPOCHS, workers: int = TRAIN_WORKERS, chunk_size: int = 50) -> dict:
+    """銘柄群を並列に訓練する
+
+    バーはまとめてダウンロードして各訓練プロセスへ渡し、前回の登録以降にデータが
+    変わっていない銘柄はスキップする。
+    """
+    start = time.perf_counter()
+    trained, skipped, failed = [], [], []
+
+    frames = {}
+    for i in range(0, len(symbols), chunk_size):
+        frames.update(market_data.get_history_batch(symbols[i:i + chunk_size], period))
+    failed.extend({"symbol": s, "error": "No data found"} for s in symbols if s not in frames)
+
+    jobs = {}
+    for symbol, df in frames.items():
+        if _is_up_to_date(symbol, model_type, df):
+            skipped.append(symbol)
+        else:
+            jobs[symbol] = df
+
+    if jobs:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # TensorFlow は fork 後の利用が安全でないため spawn で起動する
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(threads,)) as pool:
+            futures = {
+                pool.submit(train_symbol, symbol, df, model_type, epochs): symbol
+                for symbol, df in jobs.items()
+            }
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    result = future.result()
+                    trained.append(result)
+                    logger.info("trained %s in %.1fs", symbol, result["seconds"])
+                except Exception as e:
+                    failed.append({"symbol": symbol, "error": str(e)})
+                    logger.warning("training failed for %s: %s", symbol, e)
+
+    return {
+        "trained": trained,
+        "skipped": skipped,
+        "failed": failed,
+        "elapsed_seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def start_scheduler(symbols: list = None):
+    """夜間の再訓練ジョブを APScheduler に登録して開始"""
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+
+    symbols = symbols if symbols is not None else load_universe()
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(
+        run_training, CronTrigger(hour=TRAIN_CRON_HOUR, minute=TRAIN_CRON_MINUTE),
+        args=[symbols], id="nightly_training", max_instances=1, coalesce=True,
+    )
+    scheduler.start()
+    return scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LSTM/GRU モデルの一括訓練")
+    parser.add_argument("--symbols", default=TRAIN_UNIVERSE, help="カンマ区切りの銘柄、またはファイルパス")
+    parser.add_argument("--model-type", default=TRAIN_MODEL_TYPE)
+    parser.add_argument("--period", default=TRAIN_PERIOD)
+    parser.add_argument("--epochs", type=int, default=TRAIN_EPOCHS)
+    parser.add_argument("--workers", type=int, default=TRAIN_WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = run_training(load_universe(args.symbols), args.model_type, args.period, args.epochs, args.workers)
+    print(f"trained={len(result['trained'])} skipped={len(result['skipped'])} "
+          f"failed={len(result['failed'])} elapsed={result['elapsed_seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
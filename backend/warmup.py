@@ -0,0 +1,92 @@
+import importlib
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 起動直後の準備 (重いライブラリとモデルの事前読み込み)
+#
+# アプリ本体は重いライブラリを使う処理の中で初めて import するため、ワーカーはすぐに起動する。
+# その後ここで読み込みを済ませてからレディネスを返すことで、最初のリクエストが
+# import やモデルの読み込み待ちにならないようにする。
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+WARMUP_TENSORFLOW = os.getenv("WARMUP_TENSORFLOW", "1") == "1"
+# 事前にメモリへ載せる訓練済みモデル (例: "AAPL:lstm,MSFT:gru"、種別省略時は lstm)
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "")
+
+# API プロセスで使う重いモジュール
+API_MODULES = ["yfinance", "scipy.signal", "textblob", "sklearn.feature_extraction.text"]
+# CPU プロセスプールのワーカーで使う重いモジュール
+WORKER_MODULES = ["scipy.signal", "sqlalchemy", "prediction_models"]
+
+
+def import_modules(modules: list) -> dict:
+    """モジュールを読み込み、それぞれの所要時間 (ミリ秒) を返す"""
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    return timings
+
+
+def warm_worker(delay: float = 0.2) -> int:
+    """CPU ワーカーでの準備 (他のワーカーにも仕事が回るよう少し待つ)"""
+    import_modules(WORKER_MODULES)
+    # 価格予測で最初に通る経路 (特徴量の計算・当てはめ・共有ストアへの接続) を一度実行しておく
+    import pandas as pd
+
+    import prediction_models
+
+    close = 100 + np.sin(np.arange(60))
+    df = pd.DataFrame({"Close": close, "Volume": 1000 + np.arange(60.0)},
+                      index=pd.date_range("2000-01-01", periods=60))
+    X, y, ts = prediction_models.build_features(df)
+    prediction_models.LinearModelState.fit(X, y, ts)
+    prediction_models.model_cache.warm()
+    time.sleep(delay)
+    return os.getpid()
+
+
+def parse_models(spec: str = WARMUP_MODELS) -> list:
+    models = []
+    for item in spec.split(","):
+        item = item.strip()
+        if item:
+            symbol, _, model_type = item.partition(":")
+            models.append((symbol.upper(), (model_type or "lstm").lower()))
+    return models
+
+
+def warm_models(models: list) -> dict:
+    """訓練済みモデルをプールへ読み込み、推論関数のトレースまで済ませる"""
+    from model_registry import model_pool, registry
+
+    loaded = {}
+    for symbol, model_type in models:
+        version = registry.latest(symbol, model_type)
+        if version is None:
+            logger.warning("warm-up: no registered %s model for %s", model_type, symbol)
+            continue
+        predictor, _, seconds = model_pool.get(version)
+        dummy = np.zeros((1, predictor.sequence_length, len(predictor.feature_columns)), dtype=np.float32)
+        predictor.forecast(dummy, 1)
+        loaded[version.id] = round(seconds * 1000, 1)
+    return loaded
+
+
+def warm_api_process(tensorflow: bool = WARMUP_TENSORFLOW, models: list = None) -> dict:
+    """API プロセスでの準備 (import とモデルの読み込み)"""
+    modules = API_MODULES + (["tensorflow"] if tensorflow or models else [])
+    result = {"imports_ms": import_modules(modules)}
+    # 辞書やコーパスの読み込みを済ませる
+    import sentiment
+
+    sentiment.get_pipeline().scorer.score(["warm up"])
+    if models:
+        result["models_ms"] = warm_models(models)
+    return result